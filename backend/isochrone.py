@@ -1,114 +1,179 @@
 from searoute.searoute import setup_M
-from searoute.utils import distance
-from shapely.geometry import MultiPoint, Point, Polygon
+import shapely
+from shapely.geometry import MultiPoint, Point, Polygon, box, mapping
 from shapely.ops import unary_union
-import networkx as nx
+from bisect import bisect_left
 import math
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Union
 
-# Ensure we have the loaded Marnet graph
-M = setup_M()
+# Map zooms polygons are simplified for, a request takes the closest one below its
+# zoom so a few levels of detail cover all zooms and can be cached
+LOD_ZOOMS = (2, 4, 6, 8)
+# Gaps narrower than twice this many degrees between reached lines are filled
+FILL_DEGREES = 1.0
+WORLD = box(-180, -90, 180, 90)
 
-def calculate_isochrones(origin_lon: float, origin_lat: float, speed_knots: float, max_days: int) -> Dict[str, Any]:
+def lod_zoom(zoom: Optional[float]) -> int:
+    return max([z for z in LOD_ZOOMS if zoom is not None and z <= zoom], default=LOD_ZOOMS[0])
+
+def lod_tolerance(zoom: Optional[float]) -> float:
+    # One screen pixel in degrees at the level of detail of a zoom, 256 px tiles
+    return 360.0 / (256 * 2 ** lod_zoom(zoom))
+
+def reach_polygon(lines: List[list], tolerance: float, fill: float = FILL_DEGREES):
+    # The reached network buffered by fill + tolerance then shrunk by fill, which
+    # closes the gaps between its lines (the sea between two fanning routes) but
+    # keeps its outline, then simplified to the tolerance
+    # segments buffered one by one and merged pairwise, far faster than the
+    # buffer of the whole overlapping network at once
+    # edges joining -180 to 180 have no length but would be buffered around the globe
+    lines = [line for line in lines if abs(line[0][0] - line[-1][0]) <= 180]
+    segments = shapely.linestrings(lines) if lines else []
+    area = shapely.union_all(shapely.buffer(segments, fill + tolerance, quad_segs=4))
+    area = area.buffer(-fill, quad_segs=4)
+    # lines are cut at the antimeridian, so is their buffer
+    area = area.intersection(WORLD).simplify(tolerance, preserve_topology=True)
+    # coordinates on a decimal grid finer than the tolerance, short in JSON
+    decimals = max(0, math.ceil(-math.log10(tolerance / 4)))
+    area = shapely.set_precision(area, 10 ** -decimals)
+    return round_coordinates(mapping(area), decimals)
+
+def round_coordinates(geometry: Dict[str, Any], decimals: int) -> Dict[str, Any]:
+    def rounded(coords):
+        if isinstance(coords[0], (int, float)):
+            return [round(c, decimals) for c in coords]
+        return [rounded(c) for c in coords]
+    return {"type": geometry["type"], "coordinates": rounded(geometry["coordinates"])}
+
+def split_antimeridian(lon1: float, lat1: float, lon2: float, lat2: float) -> List[list]:
+    # A segment crossing the antimeridian is cut in two, one on each side
+    if abs(lon1 - lon2) > 180:
+        lon2_adj = lon2 + 360 if lon2 < lon1 else lon2 - 360
+        # Protect against division by zero
+        denom = abs(lon2_adj - lon1)
+        if denom == 0:
+            return [[(lon1, lat1), (lon2, lat2)]]
+
+        fraction = abs((180 if lon1 > 0 else -180) - lon1) / denom
+        if fraction <= 1.0:
+            mid_lat = lat1 + (lat2 - lat1) * fraction
+            return [[(lon1, lat1), (180 if lon1 > 0 else -180, mid_lat)],
+                    [(-180 if lon1 > 0 else 180, mid_lat), (lon2, lat2)]]
+    return [[(lon1, lat1), (lon2, lat2)]]
+
+def interpolate(lon_u: float, lat_u: float, lon_v: float, lat_v: float, fraction: float):
+    # Point at a fraction of a segment, over the antimeridian if it is shorter
+    lon_v_adj = lon_v + 360 if (lon_v - lon_u) < -180 else (lon_v - 360 if (lon_v - lon_u) > 180 else lon_v)
+
+    interp_lon = lon_u + (lon_v_adj - lon_u) * fraction
+    interp_lat = lat_u + (lat_v - lat_u) * fraction
+
+    if interp_lon > 180: interp_lon -= 360
+    if interp_lon < -180: interp_lon += 360
+    return interp_lon, interp_lat
+
+def reachable_lines(profile, lengths: Dict[int, float], limits: List[float]) -> List[List[list]]:
+    # Lines of the network reachable within each of the sorted distance limits, in
+    # one sweep over the edges from the nearest node: an edge is whole in the
+    # limits past its far node, and cut in the limits between its two nodes
+    offsets, targets, weights = profile.lists()
+    nodes = profile.nodes
+    lines = [[] for _ in limits]
+    # lengths are in the order nodes were settled, by distance
+    settled = dict(zip(lengths, range(len(lengths))))
+    unsettled = len(settled)
+
+    for u, dist_u in lengths.items():
+        first = bisect_left(limits, dist_u)
+        if first == len(limits):
+            break
+        lon_u, lat_u = nodes[u]
+        rank_u = settled[u]
+
+        for k in range(offsets[u], offsets[u + 1]):
+            v = targets[k]
+            # every edge once, from the node settled first, so nodes at the
+            # same distance draw it the same way as a search per day
+            if settled.get(v, unsettled) < rank_u:
+                continue
+            dist_v = lengths.get(v, float('inf'))
+            lon_v, lat_v = nodes[v]
+
+            # Both nodes are reachable, the same segments for all these limits
+            whole = bisect_left(limits, dist_v)
+            if whole < len(limits):
+                segments = split_antimeridian(lon_u, lat_u, lon_v, lat_v)
+                for i in range(whole, len(limits)):
+                    lines[i].extend(segments)
+
+            # u is reachable, v is not. We find the interpolation point.
+            weight = weights[k]
+            if weight > 0:
+                for i in range(first, whole):
+                    fraction = max(0.0, min(1.0, (limits[i] - dist_u) / weight))
+                    interp_lon, interp_lat = interpolate(lon_u, lat_u, lon_v, lat_v, fraction)
+                    lines[i].extend(split_antimeridian(lon_u, lat_u, interp_lon, interp_lat))
+    return lines
+
+def calculate_isochrones(origin_lon: float, origin_lat: float, speed_knots: Union[float, List[float]], max_days: int,
+                         polygons: bool = False, zoom: Optional[float] = None,
+                         tolerance: Optional[float] = None) -> Dict[str, Any]:
+    # Contours are the reached lines of the network, or with polygons filled areas
+    # simplified to tolerance degrees, by default one pixel at the level of detail of zoom
     origin = (origin_lon, origin_lat)
-    
-    # Locate closest node on the maritime network
-    try:
-        closest_node = M.kdtree.query(origin)
-    except AttributeError:
-        # Fallback if M.kdtree isn't initialized standardly
-        # Simple Euclidean search among all nodes
-        nodes = list(M.nodes())
-        closest_node = min(nodes, key=lambda n: (n[0]-origin_lon)**2 + (n[1]-origin_lat)**2)
-
-    # 1 Knot = 1 Nautical mile per hour = 1.852 km per hour
-    speed_kmh = speed_knots * 1.852
-    
-    # We want to find nodes reachable in K kilometers.
-    # searoute edge weights by default are lengths in km (or approximately so based on their utils distance()).
-    # Let's ensure weight is treated as km
-    
-    # Run Dijkstra from the closest node to find all distances
-    # weight='weight' uses the graph's pre-calculated edge distances
-    lengths = nx.single_source_dijkstra_path_length(M, closest_node, weight=lambda u, v, d: d.get('weight', distance(u,v)))
-    
+    # shared with the routing, loaded on first use
+    M = setup_M()
+
+    # Locate closest node on the maritime network, by great-circle distance
+    closest_node = M.snap(origin, restrictions=[])[0]
+
+    # Reachability ignores passage restrictions, searches run on the CSR arrays
+    profile = M.profile([])
+
+    # 1 Knot = 1 Nautical mile per hour = 1.852 km per hour, edge weights are in km.
+    # Every day of every speed is a distance limit, the same limits share their lines
+    speeds = speed_knots if isinstance(speed_knots, (list, tuple)) else [speed_knots]
+    contours = [(speed, day, speed * 1.852 * 24 * day) for speed in speeds for day in range(1, max_days + 1)]
+    limits = sorted({limit for _, _, limit in contours})
+    if not limits or limits[-1] <= 0:
+        return {"type": "FeatureCollection", "features": []}
+
+    # One Dijkstra from the closest node, no farther than the largest limit
+    lengths = profile.distances(profile.index[closest_node], cutoff=limits[-1])
+    lines = reachable_lines(profile, lengths, limits)
+    areas = [None] * len(limits)
+    if polygons and tolerance is None:
+        tolerance = lod_tolerance(zoom)
+
     features = []
-    
-    for day in range(1, max_days + 1):
-        target_dist_km = speed_kmh * 24 * day
-        
-        lines = []
-        visited_edges = set()
-        
-        def add_line(lon1, lat1, lon2, lat2):
-            if abs(lon1 - lon2) > 180:
-                lon2_adj = lon2 + 360 if lon2 < lon1 else lon2 - 360
-                # Protect against division by zero
-                denom = abs(lon2_adj - lon1)
-                if denom == 0:
-                    lines.append([(lon1, lat1), (lon2, lat2)])
-                    return
-                    
-                fraction = abs((180 if lon1 > 0 else -180) - lon1) / denom
-                if fraction <= 1.0:
-                    mid_lat = lat1 + (lat2 - lat1) * fraction
-                    lines.append([(lon1, lat1), (180 if lon1 > 0 else -180, mid_lat)])
-                    lines.append([(-180 if lon1 > 0 else 180, mid_lat), (lon2, lat2)])
-                else:
-                    lines.append([(lon1, lat1), (lon2, lat2)])
-            else:
-                lines.append([(lon1, lat1), (lon2, lat2)])
-        
-        for u in lengths:
-            dist_u = lengths[u]
-            if dist_u > target_dist_km:
-                continue
-                
-            for v in M.neighbors(u):
-                edge_id = tuple(sorted((u, v)))
-                if edge_id in visited_edges:
-                    continue
-                visited_edges.add(edge_id)
-                
-                dist_v = lengths.get(v, float('inf'))
-                lon_u, lat_u = u[0], u[1]
-                lon_v, lat_v = v[0], v[1]
-                
-                if dist_v <= target_dist_km:
-                    # Both nodes are reachable
-                    add_line(lon_u, lat_u, lon_v, lat_v)
-                else:
-                    # u is reachable, v is not. We find the interpolation point.
-                    d = M.get_edge_data(u, v, default={}) if hasattr(M, 'get_edge_data') else M[u][v]
-                    weight = d.get('weight', distance(u, v))
-                    if weight > 0:
-                        fraction = max(0.0, min(1.0, (target_dist_km - dist_u) / weight))
-                        lon_v_adj = lon_v + 360 if (lon_v - lon_u) < -180 else (lon_v - 360 if (lon_v - lon_u) > 180 else lon_v)
-                        
-                        interp_lon = lon_u + (lon_v_adj - lon_u) * fraction
-                        interp_lat = lat_u + (lat_v - lat_u) * fraction
-                        
-                        if interp_lon > 180: interp_lon -= 360
-                        if interp_lon < -180: interp_lon += 360
-                        
-                        add_line(lon_u, lat_u, interp_lon, interp_lat)
-                        
-        if lines:
-            features.append({
-                "type": "Feature",
-                "properties": {
-                    "day": day,
-                    "distance_nm": round(target_dist_km / 1.852, 1)
-                },
-                "geometry": {
-                    "type": "MultiLineString",
-                    "coordinates": lines
-                }
-            })
+    for speed, day, target_dist_km in contours:
+        i = bisect_left(limits, target_dist_km)
+        if not lines[i]:
+            continue
+        properties = {
+            "day": day,
+            "speed_knots": speed,
+            "distance_nm": round(target_dist_km / 1.852, 1)
+        }
+        if polygons:
+            if areas[i] is None:
+                areas[i] = reach_polygon(lines[i], tolerance)
+            properties["tolerance"] = tolerance
+            geometry = areas[i]
+        else:
+            geometry = {
+                "type": "MultiLineString",
+                "coordinates": lines[i]
+            }
+        features.append({
+            "type": "Feature",
+            "properties": properties,
+            "geometry": geometry
+        })
 
     # Sort in reverse so larger extents (day N) render below smaller ones (day 1)
-    features.reverse()
-    
+    features.sort(key=lambda f: f["properties"]["distance_nm"], reverse=True)
+
     return {
         "type": "FeatureCollection",
         "features": features
@@ -1,18 +1,60 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, JSONResponse, Response
+from pydantic import BaseModel, Field
+import asyncio
+import base64
+import hashlib
 import logging
 import sys
 import os
+import time
 
 # Add the local searoute library to path
 # (The searoute package folder must be located in the same directory)
-from searoute import searoute
-from isochrone import calculate_isochrones
+from searoute import waypoints, matrix, waypoint_order, fastest_route, snapshot, geodesy, polyline, Route
+from searoute.archive import Archive
+from searoute.cache import RouteCache, SQLiteRouteCache, route_key
+from searoute.utils import validate_lon_lat
+from searoute.workers import PoolBusy, WorkerPool
+from searoute.weather import LocalProvider, OpenMeteoProvider, WeatherService
+from searoute.wavefield import WaveField, speed_factor
+from isochrone import calculate_isochrones, lod_tolerance
 
-app = FastAPI()
+# Shared graph mode: build the binary snapshots once, every worker then maps
+# the same read-only files instead of loading its own copy of the networks
+if os.environ.get("SEAROUTE_SHARED_GRAPH"):
+    snapshot.ensure()
+
+# Routing and isochrones run in worker processes, the event loop stays free for
+# the cheap requests. SEAROUTE_POOL_WORKERS sets the number of processes (0 runs
+# them in threads), SEAROUTE_POOL_MAX_PENDING the number of computations queued
+# before requests are refused with a 503. With SEAROUTE_CH_PATH every worker
+# routes with the contraction hierarchy of the default restrictions, built once
+# and persisted to that file so later starts only load it
+POOL = WorkerPool.from_env()
+
+# Marine forecasts, cached per 0.25 degree cell and forecast run. WEATHER_PROVIDER=local
+# makes up the sea state instead of calling Open-Meteo, for tests and offline use
+WEATHER = WeatherService(
+    LocalProvider() if os.environ.get("WEATHER_PROVIDER") == "local" else OpenMeteoProvider(),
+    ttl=float(os.environ.get("WEATHER_CACHE_TTL", 3600)),
+)
+
+# Optional local wave field (see searoute.wavefield), when set the voyages are
+# sampled from it at once instead of fetching forecasts
+WAVE_FIELD_PATH = os.environ.get("WAVE_FIELD_PATH")
+WAVE_FIELD = WaveField.load(WAVE_FIELD_PATH) if WAVE_FIELD_PATH else None
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    POOL.shutdown()
+    await WEATHER.provider.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -23,8 +65,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-import httpx
-from typing import Optional
+import numpy as np
+from typing import Annotated, Literal, Optional
 
 import json
 import os
@@ -48,6 +90,20 @@ class RouteRequest(BaseModel):
     origin: list[float]  # [longitude, latitude]
     destination: list[float] # [longitude, latitude]
     midpoint: Optional[list[float]] = None
+    waypoints: Optional[list[list[float]]] = None  # stops between origin and destination, replace midpoint
+    optimize: bool = False  # visit the stops in the order of the shortest route
+    speed: float = Field(24, gt=0)  # Knots, for the durations
+    weather_routing: bool = False  # fastest route through the waves of WAVE_FIELD_PATH
+    depart: Optional[float] = None  # Seconds since the epoch, defaults to now
+
+# Units of lengths, the ones of searoute.geodesy
+Units = Literal[tuple(geodesy.conversions)]
+
+class MatrixRequest(BaseModel):
+    origins: list[list[float]]  # [[longitude, latitude], ...]
+    destinations: Optional[list[list[float]]] = None  # defaults to the origins
+    units: Units = "naut"
+    restrictions: Optional[list[str]] = None  # defaults to ["northwest"] like /api/route
 
 class AddPortRequest(BaseModel):
     name: str
@@ -55,74 +111,175 @@ class AddPortRequest(BaseModel):
     lat: float
     lng: float
 
-# In-memory route cache for instant replies
-# Key: f"{o_lng},{o_lat}_{m_lng},{m_lat}_{d_lng},{d_lat}" (midpoint is optional)
-# Value: {"length": ..., "geometry": ...}
-ROUTE_CACHE = {} # [longitude, latitude]
+# Route cache for instant replies, bounded in entries and bytes
+# Key: the Marnet nodes the stops of a route are snapped to, the restrictions and units
+# (see route_key), the reordering and the speed
+# Value: the route Feature with its legs, see searoute.waypoints
+# With ROUTE_CACHE_PATH it is a SQLite file shared by all workers that survives restarts,
+# compact it with `python -m searoute.cache compact <path>`
+ROUTE_CACHE_PATH = os.environ.get("ROUTE_CACHE_PATH")
+if ROUTE_CACHE_PATH:
+    ROUTE_CACHE = SQLiteRouteCache(
+        ROUTE_CACHE_PATH,
+        max_entries=int(os.environ.get("ROUTE_CACHE_MAX_ENTRIES", 100000)),
+        max_bytes=int(os.environ.get("ROUTE_CACHE_MAX_BYTES", 512 * 2 ** 20)),
+        ttl=float(os.environ.get("ROUTE_CACHE_TTL", 30 * 24 * 3600)),
+    )
+else:
+    ROUTE_CACHE = RouteCache(
+        max_entries=int(os.environ.get("ROUTE_CACHE_MAX_ENTRIES", 2048)),
+        max_bytes=int(os.environ.get("ROUTE_CACHE_MAX_BYTES", 64 * 2 ** 20)),
+        ttl=float(os.environ.get("ROUTE_CACHE_TTL", 24 * 3600)),
+    )
+
+# Reachability contours, lines or the polygons of a level of detail, by location,
+# speeds and days. The network does not change while the server runs, they never expire
+REACH_CACHE = RouteCache(
+    max_entries=int(os.environ.get("REACH_CACHE_MAX_ENTRIES", 256)),
+    max_bytes=int(os.environ.get("REACH_CACHE_MAX_BYTES", 128 * 2 ** 20)),
+)
 
 class WeatherRequest(BaseModel):
     route_coords: list # List of [lon, lat] points
     speed: float # Knots
     base_fuel: float # Metric tons per day
     total_distance: float # NM
+    encoding: Literal["json", "typed"] = "json"  # "typed" for the days as base64 little-endian typed arrays
 
 class ReachabilityRequest(BaseModel):
     lat: float
     lng: float
-    speed: float
-    days: int
+    speed: float = Field(gt=0)
+    days: int = Field(gt=0)
+    speeds: Optional[list[Annotated[float, Field(gt=0)]]] = None  # contours of several speeds at once, replace speed
+    shape: Literal["lines", "polygons"] = "lines"  # filled and simplified areas with polygons
+    zoom: Optional[float] = None  # map zoom the polygons are simplified for
+    tolerance: Optional[float] = Field(None, gt=0)  # Degrees, replaces the tolerance of the zoom
+
+async def weather_route(points, order, req):
+    # A leg starts when the previous one arrives, so they are searched one
+    # after the other and not cached, the forecast changes
+    depart = time.time() if req.depart is None else req.depart
+    pairs = list(zip(order[:-1], order[1:]))
+    legs = []
+    for a, b in pairs:
+        leg = await POOL.run(None, fastest_route, points[a], points[b], WAVE_FIELD_PATH,
+                             req.speed, depart, "naut")
+        depart = leg["properties"]["arrival"]
+        legs.append(leg)
+
+    combined_coords = []
+    for leg in legs:
+        coords = leg["geometry"]["coordinates"]
+        if combined_coords and coords and combined_coords[-1] == coords[0]:
+            coords = coords[1:]
+        combined_coords += coords
+
+    return {
+        "type": "Feature",
+        "properties": {
+            "units": "nautical miles",
+            "length": sum(leg["properties"]["length"] for leg in legs),
+            "duration_hours": sum(leg["properties"]["duration_hours"] for leg in legs),
+            "order": order,
+            "legs": [
+                {
+                    "from": a,
+                    "to": b,
+                    "length": leg["properties"]["length"],
+                    "duration_hours": leg["properties"]["duration_hours"],
+                }
+                for (a, b), leg in zip(pairs, legs)
+            ],
+        },
+        "geometry": {
+            "type": "LineString",
+            "coordinates": combined_coords
+        }
+    }
+
+# Most stops of a route, origin and destination included, optimizing searches
+# from every stop and there is a search per leg
+ROUTE_MAX_STOPS = 50
 
 @app.post("/api/route")
 async def calculate_route(req: RouteRequest):
+    stops = req.waypoints if req.waypoints is not None else ([req.midpoint] if req.midpoint else [])
+    points = [req.origin] + stops + [req.destination]
+    if len(points) > ROUTE_MAX_STOPS:
+        raise HTTPException(status_code=422, detail=f"{len(points)} stops, at most {ROUTE_MAX_STOPS} per route")
     try:
-        origin_pt = req.origin
-        dest_pt = req.destination
-        mid_pt = req.midpoint
-        
-        # Build cache key
-        cache_key = f"{origin_pt[0]},{origin_pt[1]}_"
-        if mid_pt:
-            cache_key += f"{mid_pt[0]},{mid_pt[1]}_"
-        cache_key += f"{dest_pt[0]},{dest_pt[1]}"
-        
-        # Check cache
-        if cache_key in ROUTE_CACHE:
+        for point in points:
+            validate_lon_lat(point)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if req.weather_routing and WAVE_FIELD is None:
+        # Not the shortest route in its place, the client asked for the fastest one
+        raise HTTPException(status_code=503, detail="Weather routing needs a wave field, set WAVE_FIELD_PATH")
+
+    try:
+        # Snapping the stops for the cache key searches the network too, it is
+        # done in the pool, the event loop and this process stay light
+        stops_key = await POOL.run("stops|" + json.dumps(points), route_key, None, points, None, "nm")
+
+        if req.weather_routing:
+            # Reordering needs the lengths between all the stops, one search per stop
+            order = list(range(len(points)))
+            if req.optimize and len(points) > 3:
+                order_key = "order|" + stops_key
+                order = ROUTE_CACHE.get(order_key)
+                if order is None:
+                    order = await POOL.run(order_key, waypoint_order, points)
+                    ROUTE_CACHE.set(order_key, order)
+            return await weather_route(points, order, req)
+
+        # The route, its legs and their lengths from searoute.waypoints, cached
+        # on the nodes the stops snap to, the reordering and the speed
+        cache_key = f"route|{stops_key}|{int(req.optimize)}|{req.speed}"
+        cached = ROUTE_CACHE.get(cache_key)
+        if cached is not None:
             print(f"Cache hit for route: {cache_key}")
-            return ROUTE_CACHE[cache_key]
-        
-        # Determine routing logic
-        if mid_pt:
-            route1 = searoute(origin_pt, mid_pt, units="nm")
-            route2 = searoute(mid_pt, dest_pt, units="nm")
-            
-            combined_coords = route1["geometry"]["coordinates"] + route2["geometry"]["coordinates"][1:]
-            
-            result = {
-                "type": "Feature",
-                "properties": {"units": "nautical miles"},
-                "geometry": {
-                    "type": "LineString",
-                    "coordinates": combined_coords
-                }
-            }
-        else:
-            route = searoute(origin_pt, dest_pt, units="nm")
-            result = route
-            
-        # The searoute library calculates distance based on grid-node traversal (taxicab geometry)
-        # which highly overestimates the exact physical route distance. We instead calculate the 
-        # actual Haversine distance of the simplified, smoothed route geometry returned.
-        coords_for_calc = result["geometry"]["coordinates"]
-        true_length = 0
-        for i in range(len(coords_for_calc) - 1):
-            true_length += haversine_distance(coords_for_calc[i], coords_for_calc[i+1])
-            
-        result["properties"]["length"] = true_length
-            
-        # Save to cache
-        ROUTE_CACHE[cache_key] = result
+            return cached
+
+        # Searched in the pool, identical routes in flight are searched once and shared
+        route = await POOL.run(cache_key, waypoints, points, "naut", req.speed, ["northwest"], req.optimize)
+        # copied, the route is shared with the other requests waiting for it
+        result = {
+            "type": "Feature",
+            "properties": dict(route["properties"], units="nautical miles"),
+            "geometry": route["geometry"],
+        }
+        ROUTE_CACHE.set(cache_key, result)
         return result
-        
+
+    except PoolBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Largest matrix of a request, origins times destinations
+MATRIX_MAX_CELLS = 10000
+
+@app.post("/api/matrix")
+async def calculate_matrix(req: MatrixRequest):
+    # One graph search per origin instead of one /api/route call per pair
+    destinations = req.destinations if req.destinations is not None else req.origins
+    if len(req.origins) * len(destinations) > MATRIX_MAX_CELLS:
+        raise HTTPException(status_code=422, detail=f"{len(req.origins)} x {len(destinations)} routes, "
+                                                    f"at most {MATRIX_MAX_CELLS} per request")
+    try:
+        restrictions = req.restrictions if req.restrictions is not None else ["northwest"]
+        # Searched in the pool like the routes, identical matrices in flight are searched once
+        key = "matrix|" + json.dumps([req.origins, req.destinations, req.units, sorted(restrictions)])
+        lengths = await POOL.run(key, matrix, req.origins, req.destinations, req.units, restrictions)
+        return {
+            "units": req.units,
+            "origins": req.origins,
+            "destinations": destinations,
+            "lengths": lengths,
+        }
+    except PoolBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -193,39 +350,11 @@ async def get_all_ports():
 async def get_all_vessels():
     return load_live_vessels()
 
-import math
-def haversine_distance(coord1, coord2):
-    # coord = [lon, lat]
-    lon1, lat1 = math.radians(coord1[0]), math.radians(coord1[1])
-    lon2, lat2 = math.radians(coord2[0]), math.radians(coord2[1])
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    r = 3440.065 # Radius of earth in nautical miles
-    return c * r
-
-@app.post("/api/weather")
-async def check_weather(request: WeatherRequest):
-    coords = request.route_coords
-    base_speed = request.speed
-    base_fuel_per_day = getattr(request, 'base_fuel', 20.0)
-    
-    if not coords or len(coords) < 2:
-        return {"weather_html": "<p>Invalid route for weather check.</p>", "avg_wave_meters": 0, "impact_level": 0}
-        
-    # We will walk the coords array
-    curr_coord_idx = 0
-    curr_point = coords[0]
-    
-    # Pre-calculate measured total distance
-    measured_dist = 0
-    for i in range(len(coords)-1):
-        measured_dist += haversine_distance(coords[i], coords[i+1])
-        
-    if measured_dist == 0:
-        return {"weather_html": "<p>0 NM route.</p>", "avg_wave_meters": 0, "impact_level": 0}
-
+def simulate_voyage(route, base_speed, base_fuel_per_day, wave_at):
+    # Sail the route day by day, slowed down by the wave height at the position
+    # of every morning given by wave_at(point, hour)
+    measured_dist = route.length
+    curr_point = route.position(0.0)
     dist_covered_so_far = 0.0
     day_logs = []
     current_day = 0
@@ -234,171 +363,326 @@ async def check_weather(request: WeatherRequest):
     total_time_days = 0.0
     total_fuel_mt = 0.0
     
-    async with httpx.AsyncClient() as client:
-        while curr_coord_idx < len(coords) - 1:
-            # 1. Fetch weather forecast for the CURRENT projected position, looking ahead to the forecast for current_day
-            lon, lat = curr_point
-            
-            # Forecasts usually go up to 7-14 days. If voyage is > 7 days, we cap the lookahead index.
-            # Open-Meteo provides hourly arrays. 1 day = 24 hours.
-            hour_index = min(current_day * 24, 160) # roughly 6.5 days max lookahead for standard free tier without archival
-            
-            wave_height = 0.0
-            url = f"https://marine-api.open-meteo.com/v1/marine?latitude={lat}&longitude={lon}&hourly=wave_height&timezone=UTC"
-            try:
-                resp = await client.get(url)
-                if resp.status_code == 200:
-                    data = resp.json()
-                    hourly_waves = data.get("hourly", {}).get("wave_height", [])
-                    if hourly_waves and len(hourly_waves) > hour_index and hourly_waves[hour_index] is not None:
-                        wave_height = hourly_waves[hour_index]
-            except Exception as e:
-                pass
-                
-            total_waves += wave_height
-            wave_samples += 1
-            
-            # 2. Apply Speed Penalty based on wave height
-            penalty_pct = 0.0
-            if wave_height > 3.0:
-                penalty_pct = 0.15
-            elif wave_height > 2.0:
-                penalty_pct = 0.05
-                
-            actual_speed = base_speed * (1.0 - penalty_pct)
-            
-            # 3. Calculate how far we can travel in this 24h period (or remaining distance)
-            max_dist_today = actual_speed * 24.0
-            
-            # Walk the generic polygon coords until we exhaust today's distance
-            dist_left_today = max_dist_today
-            hit_destination = False
-            
-            while dist_left_today > 0 and curr_coord_idx < len(coords) - 1:
-                next_point = coords[curr_coord_idx + 1]
-                leg_dist = haversine_distance(curr_point, next_point)
-                
-                if leg_dist <= dist_left_today:
-                    # We consume this leg fully
-                    dist_left_today -= leg_dist
-                    curr_point = next_point
-                    curr_coord_idx += 1
-                    if curr_coord_idx == len(coords) - 1:
-                        hit_destination = True
-                        break
-                else:
-                    # We end the day midway through this leg
-                    fraction = dist_left_today / leg_dist
-                    # Linear interpolation for simplicity (spherical is better but fine for small segments)
-                    new_lon = curr_point[0] + (next_point[0] - curr_point[0]) * fraction
-                    new_lat = curr_point[1] + (next_point[1] - curr_point[1]) * fraction
-                    curr_point = [new_lon, new_lat]
-                    dist_left_today = 0
-                    break
-                    
-            actual_dist_today = max_dist_today - dist_left_today
-            dist_covered_so_far += actual_dist_today
-            time_spent_days = actual_dist_today / (actual_speed * 24.0) if actual_speed > 0 else 0
+    while dist_covered_so_far < measured_dist:
+        # 1. Weather forecast for the CURRENT projected position, looking ahead to the forecast for current_day
+        # Forecasts usually go up to 7-14 days. If voyage is > 7 days, we cap the lookahead index.
+        # Open-Meteo provides hourly arrays. 1 day = 24 hours.
+        hour_index = min(current_day * 24, 160) # roughly 6.5 days max lookahead for standard free tier without archival
+        
+        wave_height = wave_at(curr_point, hour_index)
             
-            total_time_days += time_spent_days
-            total_fuel_mt += time_spent_days * base_fuel_per_day
+        total_waves += wave_height
+        wave_samples += 1
+        
+        # 2. Apply Speed Penalty based on wave height
+        actual_speed = base_speed * float(speed_factor(wave_height))
+        
+        # 3. Calculate how far we can travel in this 24h period (or remaining distance)
+        max_dist_today = actual_speed * 24.0
+        
+        # Sail today's distance along the route, or what is left of it
+        actual_dist_today = min(max_dist_today, measured_dist - dist_covered_so_far)
+        hit_destination = dist_covered_so_far + actual_dist_today >= measured_dist
+        curr_point = route.position(dist_covered_so_far + actual_dist_today)
+        
+        dist_covered_so_far += actual_dist_today
+        time_spent_days = actual_dist_today / (actual_speed * 24.0) if actual_speed > 0 else 0
+        
+        total_time_days += time_spent_days
+        total_fuel_mt += time_spent_days * base_fuel_per_day
+        
+        day_logs.append({
+            "day": current_day + 1,
+            "lat": curr_point[1],
+            "lon": curr_point[0],
+            "wave": wave_height,
+            "speed": actual_speed,
+            "dist": actual_dist_today
+        })
+        
+        current_day += 1
+        if hit_destination or current_day > 30: # Safety break at 30 days
+            break
             
-            day_logs.append({
-                "day": current_day + 1,
-                "lat": curr_point[1],
-                "lon": curr_point[0],
-                "wave": wave_height,
-                "speed": actual_speed,
-                "dist": actual_dist_today
-            })
+    return day_logs, total_waves, wave_samples, total_time_days, total_fuel_mt
+
+async def sail_forecasts(route, base_speed, base_fuel_per_day):
+    # The voyage is simulated on the cached forecasts, the ones it misses are fetched
+    # all at once and it is simulated again, until it misses none. The positions are
+    # first guessed at full speed, then a missing forecast is guessed from the
+    # closest fetched one so the next positions are close to the final ones.
+    # Locations without forecast count as calm sea
+    fetched = set()
+    missing = [route.position(d) for d in np.arange(32) * base_speed * 24.0] if base_speed > 0 else []
+    while True:
+        missing = [p for p in missing if WEATHER.cell(p[1], p[0]) not in fetched]
+        if missing:
+            await WEATHER.forecasts(missing)
+            fetched.update(WEATHER.cell(p[1], p[0]) for p in missing)
+        missing = []
+        
+        def wave_at(point, hour):
+            wave = WEATHER.cached_value(point, hour)
+            if wave is None:
+                missing.append(point)
+                wave = 0.0
+                if fetched:
+                    lat, lon = min(fetched, key=lambda c: (c[0] - point[1]) ** 2 + (c[1] - point[0]) ** 2)
+                    wave = WEATHER.cached_value((lon, lat), hour) or 0.0
+            return wave
+        
+        voyage = simulate_voyage(route, base_speed, base_fuel_per_day, wave_at)
+        if not [p for p in missing if WEATHER.cell(p[1], p[0]) not in fetched]:
+            return voyage
+
+def sail_wave_field(route, base_speed, base_fuel_per_day):
+    # The whole voyage from the local wave field at once, a sample every 10 NM
+    # Departing on the hour, the same voyage for the whole hour (see weather_etag)
+    voyage = WAVE_FIELD.sail(route, base_speed, depart=time.time() // 3600 * 3600, step=10.0)
+    hours, distance = voyage["hours"], voyage["distance"]
+    total_hours = min(hours[-1], 31 * 24.0)  # Safety break at 30 days
+    starts = np.arange(0, total_hours, 24.0)
+    ends = np.minimum(starts + 24.0, total_hours)
+    dists = np.interp(ends, hours, distance) - np.interp(starts, hours, distance)
+    waves = np.nan_to_num(np.interp(starts, hours, voyage["wave"]))
+    positions = route.position(np.interp(ends, hours, distance))
+    
+    day_logs = [
+        {
+            "day": day + 1,
+            "lat": float(lat),
+            "lon": float(lon),
+            "wave": float(wave),
+            "speed": float(dist / (end - start)) if end > start else 0.0,
+            "dist": float(dist)
+        }
+        for day, (start, end, dist, wave, (lon, lat)) in enumerate(zip(starts, ends, dists, waves, positions))
+    ]
+    total_time_days = total_hours / 24.0
+    return day_logs, float(waves.sum()), len(day_logs), total_time_days, total_time_days * base_fuel_per_day
+
+# Columns of the days of a voyage: name, type of the typed arrays and decimals kept in JSON
+WEATHER_COLUMNS = (
+    ("day", "uint16", 0),
+    ("lat", "float32", 4),
+    ("lon", "float32", 4),
+    ("wave", "float32", 2),
+    ("speed", "float32", 2),
+    ("dist", "float32", 1),
+)
+
+def weather_columns(day_logs, encoding="json"):
+    # One array per column instead of one object per day. Typed columns are the
+    # little-endian bytes of the array in base64, read by the client as a TypedArray
+    columns = {}
+    for name, dtype, decimals in WEATHER_COLUMNS:
+        values = np.array([log[name] for log in day_logs], dtype=np.dtype(dtype).newbyteorder("<"))
+        if encoding == "typed":
+            columns[name] = {"dtype": dtype, "data": base64.b64encode(values.tobytes()).decode("ascii")}
+        elif decimals:
+            columns[name] = np.round(values.astype(np.float64), decimals).tolist()
+        else:
+            columns[name] = values.tolist()
+    return columns
+
+def weather_etag(request):
+    # A response only depends on the request and on the forecast it is sailed
+    # through: the wave field file and the hour of departure, or the forecast run
+    if WAVE_FIELD is not None and request.speed > 0:
+        source = [WAVE_FIELD_PATH, os.path.getmtime(WAVE_FIELD_PATH), int(time.time() // 3600)]
+    else:
+        source = [WEATHER.provider.name, WEATHER.run()]
+    key = json.dumps([request.route_coords, request.speed, request.base_fuel, request.encoding, source])
+    # weak, forecasts failing to load count as calm sea
+    return 'W/"' + hashlib.sha1(key.encode()).hexdigest()[:24] + '"'
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+def weather_check_route(request: WeatherRequest):
+    # The route of a weather check, or the reply when there is nothing to sail
+    coords = request.route_coords
+    empty = {"avg_wave_meters": 0, "impact_level": 0, "days": weather_columns([], request.encoding)}
+    if not coords or len(coords) < 2:
+        return None, dict(empty, message="Invalid route for weather check.")
+        
+    # Positions along the route are looked up by distance sailed
+    route = Route(coords, units="naut")
+    if route.length == 0:
+        return None, dict(empty, message="0 NM route.")
+    return route, None
+
+async def sail_weather(request: WeatherRequest, route):
+    base_speed = request.speed
+    base_fuel_per_day = getattr(request, 'base_fuel', 20.0)
+    if WAVE_FIELD is not None and base_speed > 0:
+        voyage = sail_wave_field(route, base_speed, base_fuel_per_day)
+    else:
+        voyage = await sail_forecasts(route, base_speed, base_fuel_per_day)
+    day_logs, total_waves, wave_samples, total_time_days, total_fuel_mt = voyage
             
-            current_day += 1
-            if hit_destination or current_day > 30: # Safety break at 30 days
-                break
-                
     avg_wave = total_waves / wave_samples if wave_samples > 0 else 0
     overall_impact = 3 if avg_wave > 3.0 else (2 if avg_wave > 2.0 else 1)
-    
-    # Build HTML table snippet
-    html = f"""
-    <div style="font-size: 0.8rem; max-height: 200px; overflow-y: auto; text-align: left; margin: 10px 0;">
-        <table style="width: 100%; border-collapse: collapse;">
-            <thead>
-                <tr style="border-bottom: 1px solid var(--border); color: var(--text-secondary);">
-                    <th style="padding: 4px; text-align: left;">Day</div>
-                    <th style="padding: 4px; text-align: right;">Wave</div>
-                    <th style="padding: 4px; text-align: right;">Speed</div>
-                </tr>
-            </thead>
-            <tbody>
-    """
-    for log in day_logs:
-        color = "var(--accent-red)" if log['wave'] > 3.0 else ("#facc15" if log['wave'] > 2.0 else "var(--text-primary)")
-        html += f"""
-                <tr style="border-bottom: 1px dashed rgba(255,255,255,0.1);">
-                    <td style="padding: 4px;">{log['day']}</td>
-                    <td style="padding: 4px; text-align: right; color: {color};">{log['wave']:.1f}m</td>
-                    <td style="padding: 4px; text-align: right;">{log['speed']:.1f}kn</td>
-                </tr>
-        """
-    html += "</tbody></table></div>"
 
     return {
         "avg_wave_meters": round(avg_wave, 2),
         "impact_level": overall_impact,
         "total_days": round(total_time_days, 2),
         "total_fuel": round(total_fuel_mt, 2),
-        "weather_html": html
+        "days": weather_columns(day_logs, request.encoding)
     }
 
+@app.get("/api/weather")
+async def check_weather_get(route: str, speed: float, base_fuel: float, total_distance: float,
+                            encoding: Literal["json", "typed"] = "json",
+                            if_none_match: Optional[str] = Header(None)):
+    # The route as an encoded polyline (see searoute.polyline), a conditional GET
+    # is answered 304 when the client already has the response
+    try:
+        route_coords = polyline.decode(route)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    request = WeatherRequest(route_coords=route_coords, speed=speed, base_fuel=base_fuel,
+                             total_distance=total_distance, encoding=encoding)
+    route, reply = weather_check_route(request)
+    if route is None:
+        return reply
+
+    # The client already has this response, nothing is sailed
+    etag = weather_etag(request)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(await sail_weather(request, route), headers=headers)
+
+@app.post("/api/weather")
+async def check_weather(request: WeatherRequest, if_none_match: Optional[str] = Header(None)):
+    # For routes too long for a URL. A POST is never answered 304, a matching
+    # If-None-Match fails its precondition (RFC 9110), revalidate with the GET
+    route, reply = weather_check_route(request)
+    if route is None:
+        return reply
+
+    etag = weather_etag(request)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=412, headers=headers)
+    return JSONResponse(await sail_weather(request, route), headers=headers)
+
 @app.post("/api/reachability")
 async def generate_reachability(req: ReachabilityRequest):
     try:
-        geojson = calculate_isochrones(req.lng, req.lat, req.speed, req.days)
+        speed = req.speeds if req.speeds else req.speed
+        polygons = req.shape == "polygons"
+        # Zooms of the same level of detail share their polygons, computed once and cached
+        tolerance = (lod_tolerance(req.zoom) if req.tolerance is None else req.tolerance) if polygons else None
+        key = f"isochrones|{req.lng}|{req.lat}|{json.dumps(speed)}|{req.days}|{req.shape}|{tolerance}"
+        geojson = REACH_CACHE.get(key)
+        if geojson is None:
+            geojson = await POOL.run(key, calculate_isochrones, req.lng, req.lat, speed, req.days,
+                                     polygons, None, tolerance)
+            REACH_CACHE.set(key, geojson)
         return geojson
+    except PoolBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Ensure precalc dir exists
 os.makedirs("precalc", exist_ok=True)
 
-import zipfile
-from fastapi.responses import Response
 import glob
 
-# Auto-reconstruct the split ZIP file if downloading from GitHub limits
+# The archive of the precalculated files, or its parts as split to fit the file
+# size limit of GitHub, read in place. Opened once, members are read at their offset
 zip_path = "precalc_data.zip"
-if not os.path.exists(zip_path):
-    parts = sorted(glob.glob("precalc_data_part_*"))
-    if parts:
-        print(f"Reconstructing {zip_path} from {len(parts)} parts...")
-        with open(zip_path, 'wb') as outfile:
-            for part in parts:
-                with open(part, 'rb') as infile:
-                    outfile.write(infile.read())
-        print("Reconstruction complete.")
+
+def open_precalc_archive():
+    paths = [zip_path] if os.path.exists(zip_path) else sorted(glob.glob("precalc_data_part_*"))
+    if not paths:
+        return None
+    archive = Archive(*paths)
+    print(f"Precalc archive: {len(archive)} files in {len(paths)} part(s)")
+    return archive
+
+PRECALC_ARCHIVE = open_precalc_archive()
+
+def accepts_gzip(accept_encoding):
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+def parse_range(range_header, length):
+    # (start, end) of a single "bytes=" range, end excluded. None for the whole
+    # content, ex. several ranges or an invalid one (RFC 9110 ignores it), and
+    # "unsatisfiable" when the range has no byte of the content
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    first, _, last = (part.strip() for part in range_header[len("bytes="):].partition("-"))
+    if not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+    if not first:
+        suffix = int(last)
+        if suffix == 0 or length == 0:
+            return "unsatisfiable"
+        return max(length - suffix, 0), length
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= length:
+        return "unsatisfiable"
+    return start, (min(int(last) + 1, length) if last else length)
+
+def archive_response(request: Request, member):
+    # Deflated members go out as they are stored, gzip encoded, to the clients accepting it
+    encoding = "gzip" if member.encodings and accepts_gzip(request.headers.get("accept-encoding")) else None
+    etag = member.etag(encoding)
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    length = member.length(encoding)
+    byte_range = parse_range(request.headers.get("range"), length)
+    if byte_range == "unsatisfiable":
+        return Response(status_code=416, headers=dict(headers, **{"Content-Range": f"bytes */{length}"}))
+    if byte_range is None:
+        return Response(PRECALC_ARCHIVE.read(member, encoding), media_type="application/json", headers=headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end - 1}/{length}"
+    return Response(PRECALC_ARCHIVE.read(member, encoding, start, end), status_code=206,
+                    media_type="application/json", headers=headers)
+
+def geojson_response(content):
+    # Compact files (see searoute.polyline) expanded for clients without a decoder
+    data = json.loads(content)
+    return JSONResponse(polyline.expand(data) if polyline.is_compact(data) else data)
 
 @app.get("/api/precalc/{filename}")
-async def get_precalc_file(filename: str):
-    if not os.path.exists(zip_path):
+async def get_precalc_file(filename: str, request: Request, format: Optional[Literal["geojson"]] = None):
+    try:
+        if PRECALC_ARCHIVE is not None:
+            # Members zipped with or without the precalc/ folder
+            member = PRECALC_ARCHIVE.get(f"precalc/{filename}") or PRECALC_ARCHIVE.get(filename)
+            if member is not None:
+                if format == "geojson":
+                    return geojson_response(PRECALC_ARCHIVE.read(member))
+                return archive_response(request, member)
+
         # Fallback to direct directory if zip isn't generated
-        file_path = os.path.join("precalc", filename)
-        if os.path.exists(file_path):
+        file_path = os.path.join("precalc", os.path.basename(filename))
+        if os.path.isfile(file_path):
+            if format == "geojson":
+                with open(file_path, "rb") as f:
+                    return geojson_response(f.read())
             return FileResponse(file_path)
         raise HTTPException(status_code=404, detail="File not found")
-        
-    try:
-        with zipfile.ZipFile(zip_path, 'r') as zf:
-            internal_path = f"precalc/{filename}"
-            if internal_path in zf.namelist():
-                content = zf.read(internal_path)
-                return Response(content, media_type="application/json")
-            else:
-                # Try simple filename just in case it was zipped without the precalc/ prefix
-                if filename in zf.namelist():
-                    content = zf.read(filename)
-                    return Response(content, media_type="application/json")
-                raise HTTPException(status_code=404, detail="File not found in archive")
     except HTTPException:
         raise
     except Exception as e:
@@ -0,0 +1,209 @@
+"""
+Precalculated reachability areas of ports, served by /api/precalc.
+
+Writes one GeoJSON per port and speed, named like the frontend asks for them
+(`Port_Name_12.5.json`), and an `index.json` of the ports and their speeds.
+Ports are spread over a process pool, each port runs one Dijkstra and one
+edge sweep for all its speeds (see `isochrone.calculate_isochrones`). With
+`--compact` the files are compact collections (see `searoute.polyline`), a
+fraction of the size, decoded by the frontend.
+
+A `manifest.json` keeps the hash of the inputs of every port: its location,
+the speeds, the days, the options and the signature of the network. A port
+whose inputs did not change and whose files are all there is skipped, so a
+rebuild only calculates what changed.
+
+Precalculate the ports of a country with::
+
+    python precalc.py --country Spain --exclude Ibiza Palma
+
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import multiprocessing
+import os
+
+from isochrone import calculate_isochrones
+from searoute import polyline
+from searoute.searoute import setup_M
+
+# bumped when the output of the same inputs changes
+PRECALC_VERSION = 1
+MANIFEST = 'manifest.json'
+INDEX = 'index.json'
+
+
+def precalc_filename(name, speed):
+    """File of a port and a speed, as the frontend builds it"""
+    return f"{name.replace(' ', '_').replace('/', '_')}_{speed:.1f}.json"
+
+
+def select_ports(locations, countries=None, bbox=None, names=None, exclude=None):
+    """
+    Ports of a location list within a region
+
+    Parameters
+    ----------
+    locations : list of dicts with `name`, `lat`, `lng`, `country` and `type`
+    countries : list of countries to keep, default None which means all
+    bbox : (west, south, east, north) to keep, default None which means the whole world
+    names : list of port names to keep, default None which means all
+    exclude : list of port names to leave out
+
+    Returns
+    -------
+    The ports, one per name, the first one when names repeat
+    """
+    ports = {}
+    for loc in locations:
+        if loc.get('type', 'port') != 'port' or loc['name'] in ports:
+            continue
+        if countries and loc.get('country') not in countries:
+            continue
+        if names and loc['name'] not in names:
+            continue
+        if exclude and loc['name'] in exclude:
+            continue
+        if bbox:
+            west, south, east, north = bbox
+            inside_lon = west <= loc['lng'] <= east if west <= east else (loc['lng'] >= west or loc['lng'] <= east)
+            if not (inside_lon and south <= loc['lat'] <= north):
+                continue
+        ports[loc['name']] = loc
+    return list(ports.values())
+
+
+def inputs_hash(port, speeds, max_days, options, network):
+    """Content hash of everything the files of a port are calculated from"""
+    inputs = [PRECALC_VERSION, port['name'], port['lat'], port['lng'], speeds, max_days, options, network]
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def write_json(path, data, separators=None):
+    # written aside then renamed, an interrupted run never leaves a truncated file
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=separators)
+    os.replace(tmp, path)
+
+
+def build_port(port, speeds, max_days, out_dir, options, compact=False):
+    """Calculate and write the files of a port, in a worker process. Returns the file names"""
+    geojson = calculate_isochrones(port['lng'], port['lat'], speeds, max_days, **options)
+    files = []
+    for speed in speeds:
+        features = [f for f in geojson['features'] if f['properties']['speed_knots'] == speed]
+        collection = {"type": "FeatureCollection", "features": features}
+        filename = precalc_filename(port['name'], speed)
+        if compact:
+            write_json(os.path.join(out_dir, filename), polyline.compact(collection), separators=(',', ':'))
+        else:
+            write_json(os.path.join(out_dir, filename), collection)
+        files.append(filename)
+    return files
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {'version': PRECALC_VERSION, 'ports': {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def precalc(ports, speeds, max_days, out_dir='precalc', workers=None, options=None, force=False, compact=False):
+    """
+    Build the files of ports missing or out of date in a folder
+
+    Parameters
+    ----------
+    ports : list of ports, see `select_ports`
+    speeds : list of speeds in knots
+    max_days : number of daily contours
+    out_dir : output folder, default `precalc`
+    workers : number of processes, default the number of CPUs, 0 to build in this process
+    options : dict of options of `calculate_isochrones`, ex. {'polygons': True}
+    force : rebuild all the ports
+    compact : write compact collections instead of GeoJSON, see `searoute.polyline`
+
+    Returns
+    -------
+    A tuple of (names of the ports built, names of the ports up to date)
+    """
+    options = options or {}
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    network = setup_M().csr.signature()
+
+    todo, current = [], []
+    for port in ports:
+        digest = inputs_hash(port, speeds, max_days, dict(options, compact=True) if compact else options, network)
+        entry = manifest['ports'].get(port['name'])
+        up_to_date = (not force and entry is not None and entry['hash'] == digest
+                      and all(os.path.exists(os.path.join(out_dir, f)) for f in entry['files']))
+        (current if up_to_date else todo).append((port, digest))
+
+    def done(port, digest, files):
+        manifest['ports'][port['name']] = {'hash': digest, 'lat': port['lat'], 'lng': port['lng'],
+                                           'speeds': speeds, 'files': files}
+        # saved after every port, an interrupted run resumes where it stopped
+        write_json(os.path.join(out_dir, MANIFEST), manifest)
+        print(f"[{len(built) + 1}/{len(todo)}] {port['name']}")
+        built.append(port['name'])
+
+    built = []
+    if workers == 0:
+        for port, digest in todo:
+            done(port, digest, build_port(port, speeds, max_days, out_dir, options, compact))
+    elif todo:
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        with concurrent.futures.ProcessPoolExecutor(workers, mp_context=context, initializer=setup_M) as pool:
+            futures = {pool.submit(build_port, port, speeds, max_days, out_dir, options, compact): (port, digest)
+                       for port, digest in todo}
+            for future in concurrent.futures.as_completed(futures):
+                done(*futures[future], future.result())
+
+    # the index lists every port of the folder, built by this run or a previous one
+    index = [{'name': name, 'lat': entry['lat'], 'lng': entry['lng'], 'speeds': entry['speeds']}
+             for name, entry in manifest['ports'].items()]
+    write_json(os.path.join(out_dir, INDEX), index)
+    return built, [port['name'] for port, _ in current]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Precalculate the reachability areas of ports')
+    parser.add_argument('--locations', default='locations.json', help='JSON list of the ports, default locations.json')
+    parser.add_argument('--out', default='precalc', help='output folder, default precalc')
+    parser.add_argument('--country', nargs='*', default=None, help='countries of the ports')
+    parser.add_argument('--bbox', nargs=4, type=float, default=None, metavar=('WEST', 'SOUTH', 'EAST', 'NORTH'),
+                        help='region of the ports')
+    parser.add_argument('--ports', nargs='*', default=None, help='names of the ports')
+    parser.add_argument('--exclude', nargs='*', default=None, help='names of ports to leave out')
+    parser.add_argument('--speeds', nargs=3, type=float, default=(8.0, 17.0, 0.5), metavar=('MIN', 'MAX', 'STEP'),
+                        help='speeds in knots, default 8 17 0.5')
+    parser.add_argument('--days', type=int, default=5, help='number of daily contours, default 5')
+    parser.add_argument('--polygons', action='store_true', help='simplified areas instead of the reached lines')
+    parser.add_argument('--tolerance', type=float, default=None, help='simplification of the areas in degrees')
+    parser.add_argument('--compact', action='store_true', help='compact collections of encoded polylines instead of GeoJSON')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes, default the number of CPUs')
+    parser.add_argument('--force', action='store_true', help='rebuild the ports up to date')
+    args = parser.parse_args(argv)
+
+    with open(args.locations, 'r', encoding='utf-8') as f:
+        locations = json.load(f)
+    ports = select_ports(locations, args.country, args.bbox, args.ports, args.exclude)
+
+    low, high, step = args.speeds
+    speeds = [round(low + i * step, 2) for i in range(int(round((high - low) / step)) + 1)]
+    options = {'polygons': True, 'tolerance': args.tolerance} if args.polygons else {}
+
+    print(f"{len(ports)} ports, {len(speeds)} speeds, {args.days} days")
+    built, current = precalc(ports, speeds, args.days, args.out, args.workers, options, args.force, args.compact)
+    print(f"Built {len(built)} ports, {len(current)} up to date")
+
+
+if __name__ == '__main__':
+    main()
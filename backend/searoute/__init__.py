@@ -1,3 +1,5 @@
-from .searoute import from_nodes_edges_set, searoute, setup_P, setup_M, marnet, ports
+from .searoute import from_nodes_edges_set, searoute, matrix, waypoints, waypoint_order, fastest_route, setup_P, setup_M, marnet, ports
 from .classes.marnet import Marnet
 from .classes.ports import Ports
+from .classes.context import RoutingContext
+from .classes.route import Route
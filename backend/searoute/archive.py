@@ -0,0 +1,221 @@
+"""
+Random access to the members of a ZIP archive, ex. the precalculated isochrones.
+
+`Archive` reads the central directory once and keeps the file open, a member
+is then read with one positional read at its offset, so concurrent requests
+share the handle. Deflated members are served gzip encoded without being
+recompressed: a gzip stream is the same raw deflate data between a 10 byte
+header and a trailer of the CRC-32 and size the archive already stores.
+
+An archive split in parts, ex. to fit the file size limit of GitHub, is read
+as the concatenation of its parts without rebuilding it.
+
+Pack a folder into an archive with::
+
+    python -m searoute.archive <folder> <path>
+
+"""
+import argparse
+import io
+import os
+import struct
+import threading
+import zipfile
+import zlib
+
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x02\xff'
+LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+
+
+class _Parts(io.RawIOBase):
+    """Files read as their concatenation, with positional reads safe across threads"""
+
+    def __init__(self, paths):
+        self.fds = [os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0)) for path in paths]
+        self.sizes = [os.fstat(fd).st_size for fd in self.fds]
+        self.starts = [sum(self.sizes[:k]) for k in range(len(self.sizes))]
+        self.size = sum(self.sizes)
+        self.position = 0
+        self._lock = threading.Lock()
+
+    def _read_part(self, k, size, offset):
+        if hasattr(os, 'pread'):
+            return os.pread(self.fds[k], size, offset)
+        with self._lock:
+            os.lseek(self.fds[k], offset, os.SEEK_SET)
+            return os.read(self.fds[k], size)
+
+    def pread(self, size, offset):
+        """Up to `size` bytes at an offset of the concatenation"""
+        chunks = []
+        for k, (start, length) in enumerate(zip(self.starts, self.sizes)):
+            if size <= 0:
+                break
+            if offset < start + length:
+                chunk = self._read_part(k, min(size, start + length - offset), offset - start)
+                chunks.append(chunk)
+                offset += len(chunk)
+                size -= len(chunk)
+        return b''.join(chunks)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.pread(len(buffer), self.position)
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self.position = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[whence] + offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        if not self.closed:
+            for fd in self.fds:
+                os.close(fd)
+        super().close()
+
+
+class Member:
+    """
+    A member of an archive: where its data is and what the central directory says of it
+    """
+
+    __slots__ = ('name', 'offset', 'compressed_size', 'size', 'crc', 'deflated')
+
+    def __init__(self, name, offset, compressed_size, size, crc, deflated):
+        self.name = name
+        self.offset = offset
+        self.compressed_size = compressed_size
+        self.size = size
+        self.crc = crc
+        self.deflated = deflated
+
+    @property
+    def encodings(self):
+        """Content encodings the member is served in without recompressing, besides identity"""
+        return ('gzip',) if self.deflated else ()
+
+    def length(self, encoding=None):
+        """Length in bytes of the member in an encoding, None for identity"""
+        if encoding == 'gzip':
+            return len(GZIP_HEADER) + self.compressed_size + 8
+        return self.size
+
+    def etag(self, encoding=None):
+        """Strong entity tag of the member in an encoding"""
+        suffix = '-gz' if encoding == 'gzip' else ''
+        return f'"{self.crc:08x}-{self.size:x}{suffix}"'
+
+
+class Archive:
+    """
+    A ZIP archive open for random access to its members.
+
+    Parameters
+    ----------
+    paths : the path of the archive, or the paths of its parts in order
+
+    """
+
+    def __init__(self, *paths):
+        self.paths = paths
+        self._file = _Parts(paths)
+        self.members = {}
+        # a file object passed to ZipFile stays open when it is closed
+        with zipfile.ZipFile(self._file) as zf:
+            for info in zf.infolist():
+                # encrypted members and other compressions are left out
+                if info.is_dir() or info.flag_bits & 0x1 or info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                    continue
+                # the data follows the local header, whose extra field may differ from the central one
+                header = LOCAL_HEADER.unpack(self._file.pread(LOCAL_HEADER.size, info.header_offset))
+                offset = info.header_offset + LOCAL_HEADER.size + header[9] + header[10]
+                self.members[info.filename] = Member(info.filename, offset, info.compress_size, info.file_size,
+                                                     info.CRC, info.compress_type == zipfile.ZIP_DEFLATED)
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, name):
+        return name in self.members
+
+    def get(self, name):
+        """The `Member` of a name, None if there is none"""
+        return self.members.get(name)
+
+    def read(self, member, encoding=None, start=0, end=None):
+        """
+        Bytes of a member
+
+        Parameters
+        ----------
+        member : a `Member` of the archive
+        encoding : 'gzip' for a deflated member, default None which means the content itself
+        start, end : range of the bytes to read in that encoding, default all of them
+
+        Returns
+        -------
+        The bytes from `start` up to `end` excluded
+        """
+        length = member.length(encoding)
+        end = length if end is None else min(end, length)
+        if start >= end:
+            return b''
+        if encoding == 'gzip':
+            trailer = struct.pack('<II', member.crc, member.size & 0xffffffff)
+            head = GZIP_HEADER[start:end]
+            data_start = max(start - len(GZIP_HEADER), 0)
+            data_end = min(end - len(GZIP_HEADER), member.compressed_size)
+            data = self._file.pread(data_end - data_start, member.offset + data_start) if data_end > data_start else b''
+            tail_start = len(GZIP_HEADER) + member.compressed_size
+            tail = trailer[max(start - tail_start, 0):max(end - tail_start, 0)]
+            return head + data + tail
+        if member.deflated:
+            raw = self._file.pread(member.compressed_size, member.offset)
+            return zlib.decompress(raw, -15)[start:end]
+        return self._file.pread(end - start, member.offset + start)
+
+    def close(self):
+        self._file.close()
+
+
+def pack(folder, path, prefix=None):
+    """
+    Write the files of a folder to a deflated archive, named `prefix/<file name>`
+
+    Returns
+    -------
+    The number of files written
+    """
+    prefix = os.path.basename(os.path.normpath(folder)) if prefix is None else prefix
+    names = sorted(name for name in os.listdir(folder) if os.path.isfile(os.path.join(folder, name)))
+    tmp = path + '.tmp'
+    with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+        for name in names:
+            zf.write(os.path.join(folder, name), f'{prefix}/{name}' if prefix else name)
+    os.replace(tmp, path)
+    return len(names)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pack a folder into a deflated archive for random access')
+    parser.add_argument('folder')
+    parser.add_argument('path')
+    parser.add_argument('--prefix', default=None, help='folder of the members in the archive, default the name of the folder')
+    args = parser.parse_args(argv)
+
+    count = pack(args.folder, args.path, args.prefix)
+    print(f'Wrote {count} files to {args.path} ({os.path.getsize(args.path)} bytes)')
+
+
+if __name__ == '__main__':
+    main()
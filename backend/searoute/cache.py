@@ -0,0 +1,287 @@
+"""
+Caching of computed routes.
+
+Keys are built on the Marnet nodes the routes are snapped to, so nearby
+locations snapping to the same nodes share one entry (see `route_key`).
+`RouteCache` keeps them in memory, `SQLiteRouteCache` in a file shared by
+processes that survives restarts.
+
+Compact a persistent cache with::
+
+    python -m searoute.cache compact <path>
+
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+def route_key(M, points, restrictions=None, units='km'):
+    """
+    Cache key of a route through a list of locations
+
+    Parameters
+    ----------
+    M : the Marnet, None for the one of `setup_M`, ex. when called in a worker process
+    points : list of locations as (lon, lat), the route goes through each of them
+    restrictions : list of passages to be restricted
+        by default is None which means the restrictions of the Marnet
+    units : the units of the route
+
+    Returns
+    -------
+    A str key made of a digest of the Marnet, the node indexes every leg starts and ends at,
+    the restrictions and the units
+    """
+    if M is None:
+        from .searoute import setup_M
+        M = setup_M()
+    restrictions = sorted(M.restrictions if restrictions is None else restrictions)
+    index = M.csr.node_index()
+    legs = []
+    for origin, destination in zip(points[:-1], points[1:]):
+        o, d = M.snap_pair(tuple(origin), tuple(destination), restrictions)
+        legs.append(f'{index[o]}-{index[d]}')
+    return f"{M.csr.signature()[:12]}|{'_'.join(legs)}|{','.join(restrictions)}|{units}"
+
+
+class RouteCache:
+    """
+    A thread-safe in-memory LRU cache, bounded by a number of entries and by the
+    JSON size of its values, entries expire after a time to live.
+
+    Parameters
+    ----------
+    max_entries : int, default 2048
+    max_bytes : int, default 64 MB
+    ttl : float, default None
+        time to live in seconds, None keeps entries until they are evicted
+
+    """
+
+    def __init__(self, max_entries=2048, max_bytes=64 * 2 ** 20, ttl=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key):
+        """The value of a key, None if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and entry[2] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, size=None):
+        """
+        Store a value, evicting the least recently used entries to stay within bounds
+
+        Parameters
+        ----------
+        key : a str key, see `route_key`
+        value : a JSON serializable value
+        size : size of the value in bytes, by default the length of its JSON
+        """
+        if size is None:
+            size = len(json.dumps(value))
+        if size > self.max_bytes:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires)
+            self.nbytes += size
+            while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.nbytes -= size
+
+    def compact(self):
+        """Drop the expired entries"""
+        if self.ttl is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for key in [key for key, (_, _, expires) in self._entries.items() if expires < now]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+class SQLiteRouteCache:
+    """
+    A persistent LRU cache in a SQLite file, with the interface of `RouteCache`.
+
+    Processes opening the same file share its entries, ex. uvicorn workers, and
+    they survive restarts. Values are stored as compressed JSON, bounds apply to
+    their compressed size. Bounds are enforced every `check_every` writes and by
+    `compact`, which also reclaims the disk space.
+
+    Parameters
+    ----------
+    path : the SQLite file
+    max_entries : int, default 100000
+    max_bytes : int, default 512 MB
+    ttl : float, default None
+        time to live in seconds, None keeps entries until they are evicted
+    check_every : int, default 64
+
+    """
+
+    # last access times are only written back when older, saves a write per hit
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, path, max_entries=100000, max_bytes=512 * 2 ** 20, ttl=None, check_every=64):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.check_every = check_every
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._local = threading.local()
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with self._connection() as db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS routes ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, '
+                'expires REAL, accessed REAL NOT NULL)')
+            db.execute('CREATE INDEX IF NOT EXISTS routes_accessed ON routes (accessed)')
+
+    def _connection(self):
+        # a connection per thread, sqlite3 connections can not be shared
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM routes').fetchone()[0]
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    @property
+    def nbytes(self):
+        return self._connection().execute('SELECT COALESCE(SUM(size), 0) FROM routes').fetchone()[0]
+
+    def get(self, key):
+        """The value of a key, None if it is missing or expired"""
+        db = self._connection()
+        now = time.time()
+        row = db.execute('SELECT value, expires, accessed FROM routes WHERE key = ?', (key,)).fetchone()
+        if row is not None and row[1] is not None and row[1] < now:
+            with db:
+                db.execute('DELETE FROM routes WHERE key = ?', (key,))
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        if row[2] < now - self.TOUCH_INTERVAL:
+            with db:
+                db.execute('UPDATE routes SET accessed = ? WHERE key = ?', (now, key))
+        self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def set(self, key, value, size=None):
+        """
+        Store a value, see `RouteCache.set`, `size` is ignored since the
+        compressed size is known
+        """
+        blob = zlib.compress(json.dumps(value).encode('utf-8'))
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        expires = now + self.ttl if self.ttl is not None else None
+        db = self._connection()
+        with db:
+            db.execute('INSERT OR REPLACE INTO routes (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)',
+                       (key, blob, len(blob), expires, now))
+        self._writes += 1
+        if self._writes % self.check_every == 0:
+            self._evict()
+
+    def _evict(self):
+        """Drop the expired entries, then the least recently used ones until within bounds"""
+        db = self._connection()
+        with db:
+            db.execute('DELETE FROM routes WHERE expires IS NOT NULL AND expires < ?', (time.time(),))
+            count, nbytes = db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM routes').fetchone()
+            if count <= self.max_entries and nbytes <= self.max_bytes:
+                return
+            evicted = []
+            for key, size in db.execute('SELECT key, size FROM routes ORDER BY accessed'):
+                if count <= self.max_entries and nbytes <= self.max_bytes:
+                    break
+                evicted.append((key,))
+                count -= 1
+                nbytes -= size
+            db.executemany('DELETE FROM routes WHERE key = ?', evicted)
+
+    def compact(self):
+        """Enforce the bounds and give the space of deleted entries back to the file system"""
+        self._evict()
+        db = self._connection()
+        db.execute('VACUUM')
+        db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def clear(self):
+        db = self._connection()
+        with db:
+            db.execute('DELETE FROM routes')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Maintain a persistent route cache')
+    parser.add_argument('command', choices=['compact', 'clear', 'stats'])
+    parser.add_argument('path', help='the SQLite file of the cache')
+    parser.add_argument('--max-entries', type=int, default=100000)
+    parser.add_argument('--max-bytes', type=int, default=512 * 2 ** 20)
+    args = parser.parse_args(argv)
+
+    cache = SQLiteRouteCache(args.path, max_entries=args.max_entries, max_bytes=args.max_bytes)
+    if args.command == 'compact':
+        cache.compact()
+    elif args.command == 'clear':
+        cache.clear()
+        cache.compact()
+    print(f'{args.path}: {len(cache)} entries, {cache.nbytes} bytes, {os.path.getsize(args.path)} bytes on disk')
+
+
+if __name__ == '__main__':
+    main()
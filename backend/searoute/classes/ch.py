@@ -0,0 +1,255 @@
+import hashlib
+import heapq
+import os
+
+import numpy as np
+
+
+class ContractionHierarchy:
+    """
+    A contraction hierarchy over an undirected weighted graph.
+
+    Nodes are identified by their index (0..n-1) in the graph they were built
+    from, the caller keeps the mapping between indexes and (lon, lat) nodes.
+    Every node holds its upward edges only (edges to higher ranked nodes),
+    an edge is `(weight, middle)` where `middle` is the contracted node of a
+    shortcut or -1 for an original edge.
+
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, rank, up, signature=None):
+        self.rank = rank
+        self.up = up
+        self.signature = signature
+
+    def __len__(self):
+        return len(self.rank)
+
+    @staticmethod
+    def signature_of(n, edges):
+        """
+        A digest of an edge list, used to check a stored hierarchy
+        still matches the graph it is loaded for.
+        """
+        h = hashlib.sha1(str(n).encode())
+        for u, v, w in edges:
+            h.update(f"{u},{v},{w};".encode())
+        return h.hexdigest()
+
+    @classmethod
+    def build(cls, n, edges, witness_limit=64):
+        """
+        Contract the graph and build the hierarchy.
+
+        Parameters
+        ----------
+        n : number of nodes
+        edges : iterable of (u, v, weight) with node indexes, both directions
+            are not required since the graph is undirected, self loops are ignored
+        witness_limit : number of settled nodes after which a witness search
+            gives up, a lower value gives a faster build with more shortcuts
+
+        Returns
+        -------
+        A ContractionHierarchy
+        """
+        edges = list(edges)
+        adj = [dict() for _ in range(n)]
+        for u, v, w in edges:
+            if u == v:
+                continue
+            if w < adj[u].get(v, float('inf')):
+                adj[u][v] = (w, -1)
+                adj[v][u] = (w, -1)
+
+        contracted = [False] * n
+        deleted_neighbors = [0] * n
+        rank = [0] * n
+        up = [None] * n
+
+        def witness(source, avoid, max_dist):
+            dist = {source: 0.0}
+            heap = [(0.0, source)]
+            settled = 0
+            while heap:
+                d, x = heapq.heappop(heap)
+                if d > dist.get(x, float('inf')):
+                    continue
+                if d > max_dist or settled >= witness_limit:
+                    break
+                settled += 1
+                for y, (w, _) in adj[x].items():
+                    if y == avoid or contracted[y]:
+                        continue
+                    nd = d + w
+                    if nd < dist.get(y, float('inf')):
+                        dist[y] = nd
+                        heapq.heappush(heap, (nd, y))
+            return dist
+
+        def shortcuts(v):
+            neighbors = [(u, w) for u, (w, _) in adj[v].items() if not contracted[u]]
+            found = []
+            for i, (u, wu) in enumerate(neighbors):
+                targets = neighbors[i + 1:]
+                if not targets:
+                    continue
+                max_dist = wu + max(w for _, w in targets)
+                dist = witness(u, v, max_dist)
+                for x, wx in targets:
+                    if dist.get(x, float('inf')) > wu + wx:
+                        found.append((u, x, wu + wx))
+            return found, len(neighbors)
+
+        def priority(v):
+            found, degree = shortcuts(v)
+            return len(found) - degree + deleted_neighbors[v]
+
+        heap = [(priority(v), v) for v in range(n)]
+        heapq.heapify(heap)
+        order = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            if contracted[v]:
+                continue
+            # lazy update, re-insert when the priority got worse
+            p = priority(v)
+            if heap and p > heap[0][0]:
+                heapq.heappush(heap, (p, v))
+                continue
+
+            found, _ = shortcuts(v)
+            up[v] = {u: e for u, e in adj[v].items() if not contracted[u]}
+            for u in up[v]:
+                deleted_neighbors[u] += 1
+            for u, x, w in found:
+                if w < adj[u].get(x, (float('inf'), -1))[0]:
+                    adj[u][x] = (w, v)
+                    adj[x][u] = (w, v)
+            contracted[v] = True
+            rank[v] = order
+            order += 1
+
+        return cls(rank, up, cls.signature_of(n, edges))
+
+    def _edge(self, a, b):
+        low, high = (a, b) if self.rank[a] < self.rank[b] else (b, a)
+        return self.up[low][high]
+
+    def _unpack(self, a, b):
+        path = [a]
+        stack = [(a, b)]
+        while stack:
+            x, y = stack.pop()
+            _, middle = self._edge(x, y)
+            if middle < 0:
+                path.append(y)
+            else:
+                stack.append((middle, y))
+                stack.append((x, middle))
+        return path
+
+    def query(self, source, target):
+        """
+        Shortest path between two node indexes using a bidirectional upward search.
+
+        The length is the one of Dijkstra, but between paths of the same length
+        the one returned may differ from the path of `RoutingProfile.dijkstra`.
+
+        Returns
+        -------
+        A tuple of (length, list of node indexes) or (inf, None) if there is no path
+        """
+        if source == target:
+            return 0.0, [source]
+
+        inf = float('inf')
+        dist_f, dist_b = {source: 0.0}, {target: 0.0}
+        parent_f, parent_b = {source: None}, {target: None}
+        heap_f, heap_b = [(0.0, source)], [(0.0, target)]
+        best, meeting = inf, None
+
+        while True:
+            top_f = heap_f[0][0] if heap_f else inf
+            top_b = heap_b[0][0] if heap_b else inf
+            if min(top_f, top_b) >= best:
+                break
+            if top_f <= top_b:
+                dist, other, parent, heap = dist_f, dist_b, parent_f, heap_f
+            else:
+                dist, other, parent, heap = dist_b, dist_f, parent_b, heap_b
+
+            d, x = heapq.heappop(heap)
+            if d > dist[x]:
+                continue
+            if x in other and d + other[x] < best:
+                best, meeting = d + other[x], x
+            for y, (w, _) in self.up[x].items():
+                nd = d + w
+                if nd < dist.get(y, inf):
+                    dist[y] = nd
+                    parent[y] = x
+                    heapq.heappush(heap, (nd, y))
+
+        if meeting is None:
+            return float('inf'), None
+
+        forward = []
+        x = meeting
+        while x is not None:
+            forward.append(x)
+            x = parent_f[x]
+        forward.reverse()
+        backward = []
+        x = meeting
+        while x is not None:
+            backward.append(x)
+            x = parent_b[x]
+
+        upward = forward + backward[1:]
+        path = [upward[0]]
+        for a, b in zip(upward[:-1], upward[1:]):
+            path.extend(self._unpack(a, b)[1:])
+        return best, path
+
+    def save(self, path):
+        """Persist the hierarchy as a `.npz` file"""
+        src, dst, weight, middle = [], [], [], []
+        for u, edges in enumerate(self.up):
+            for v, (w, m) in edges.items():
+                src.append(u)
+                dst.append(v)
+                weight.append(w)
+                middle.append(m)
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        # unique per process, several workers may build the same hierarchy
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                version=np.int32(self.FORMAT_VERSION),
+                signature=np.str_(self.signature or ''),
+                rank=np.asarray(self.rank, dtype=np.int32),
+                src=np.asarray(src, dtype=np.int32),
+                dst=np.asarray(dst, dtype=np.int32),
+                weight=np.asarray(weight, dtype=np.float64),
+                middle=np.asarray(middle, dtype=np.int32))
+        # replace atomically, other processes may be loading the previous file
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a hierarchy saved by `save`"""
+        with np.load(path) as data:
+            if int(data['version']) != cls.FORMAT_VERSION:
+                raise ValueError(f'Unsupported contraction hierarchy version in {path}')
+            rank = data['rank'].tolist()
+            up = [dict() for _ in rank]
+            for u, v, w, m in zip(data['src'].tolist(), data['dst'].tolist(),
+                                  data['weight'].tolist(), data['middle'].tolist()):
+                up[u][v] = (w, m)
+            return cls(rank, up, str(data['signature']) or None)
@@ -0,0 +1,62 @@
+class RoutingContext:
+    """
+    Options of one routing request over shared networks.
+
+    A context never copies nor changes the Marnet and Ports it refers to,
+    its restrictions only select a cached routing profile of the Marnet.
+    Contexts are cheap to create, one per request, and safe to use from
+    several threads at the same time.
+
+    Parameters
+    ----------
+    M : the Marnet
+    P : the Ports, default None
+    restrictions : list of passages to be restricted
+        by default is None which means the restrictions of the Marnet
+    method : str, default None
+        shortest path method, see `Marnet.shortest_path`
+
+    """
+
+    def __init__(self, M, P=None, restrictions=None, method=None):
+        self.M = M
+        self.P = P
+        self.restrictions = frozenset(M.restrictions if restrictions is None else restrictions)
+        self.method = method
+
+    @property
+    def profile(self):
+        """The routing profile of the restrictions"""
+        return self.M.profile(self.restrictions)
+
+    def shortest_path(self, origin, destination):
+        """
+        Shortest path between two locations, snapped to their closest nodes
+
+        Returns
+        -------
+        A list of nodes building the shortest path, None if there is no path
+        """
+        return self.M.shortest_path(origin, destination, self.restrictions, self.method)
+
+    def route_lengths(self, origins, destinations):
+        """
+        Lengths in km of the shortest routes between many origins and destinations
+
+        Returns
+        -------
+        An array of shape (len(origins), len(destinations)), inf where there is no route
+        """
+        return self.M.route_lengths(origins, destinations, self.restrictions)
+
+    def closest_port(self, point, terminals=True, cty=None, to_cty=None, strict=False):
+        """
+        Closest port of a location, see `Ports.query` for the filters
+
+        Returns
+        -------
+        The port node
+        """
+        if self.P is None:
+            raise Exception('Ports network must not be None')
+        return self.P.query(terminals=terminals, cty=cty, to_cty=to_cty, strict=strict).kdtree.query(point)
@@ -0,0 +1,166 @@
+import hashlib
+
+import numpy as np
+
+
+class CSRGraph:
+    """
+    Compressed sparse row storage of an undirected graph of (lon, lat) nodes.
+
+    Every undirected edge is stored in both directions: the edges of node `i`
+    are `targets[offsets[i]:offsets[i + 1]]` with their `weights` (NaN when the
+    edge has no weight) and `passages`, a code in `passage_names` where 0 is no passage.
+
+    """
+
+    def __init__(self, coords, offsets, targets, weights, passages, passage_names):
+        self.coords = coords
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.passages = passages
+        self.passage_names = list(passage_names)
+        self._nodes = None
+        self._index = None
+        self._signature = None
+
+    @property
+    def n(self):
+        """Number of nodes"""
+        return len(self.coords)
+
+    @property
+    def m(self):
+        """Number of stored (directed) edges"""
+        return len(self.targets)
+
+    @classmethod
+    def from_dicts(cls, node_set, edge_set):
+        """
+        Build the storage from a dict of nodes and a dict-of-dicts of edges,
+        as found in `searoute.data.marnet_dict`.
+
+        Only the `weight` and `passage` edge attributes are kept.
+
+        Returns
+        -------
+        A CSRGraph
+        """
+        node_set = node_set or {}
+        edge_set = edge_set or {}
+        nodes = list(node_set)
+        index = {n: i for i, n in enumerate(nodes)}
+        for u, nbrs in edge_set.items():
+            for v in (u, *nbrs):
+                if v not in index:
+                    index[v] = len(nodes)
+                    nodes.append(v)
+
+        passage_names = [None]
+        codes = {None: 0}
+        offsets = np.zeros(len(nodes) + 1, dtype=np.int64)
+        targets, weights, passages = [], [], []
+        for u, i in index.items():
+            nbrs = edge_set.get(u, {})
+            offsets[i + 1] = len(nbrs)
+            for v, data in nbrs.items():
+                targets.append(index[v])
+                weight = data.get('weight')
+                weights.append(np.nan if weight is None else weight)
+                passage = data.get('passage')
+                if passage not in codes:
+                    codes[passage] = len(passage_names)
+                    passage_names.append(passage)
+                passages.append(codes[passage])
+
+        return cls(
+            np.asarray(nodes, dtype=np.float64).reshape(-1, 2),
+            np.cumsum(offsets),
+            np.asarray(targets, dtype=np.int32),
+            np.asarray(weights, dtype=np.float32),
+            np.asarray(passages, dtype=np.uint8),
+            passage_names)
+
+    def signature(self):
+        """A digest of the nodes and edges, changes whenever the network does"""
+        if self._signature is None:
+            h = hashlib.sha1()
+            for array in (self.coords, self.offsets, self.targets, self.weights, self.passages):
+                h.update(np.ascontiguousarray(array).tobytes())
+            h.update(repr(self.passage_names).encode())
+            self._signature = h.hexdigest()
+        return self._signature
+
+    def node_list(self):
+        """The nodes as a list of (lon, lat) tuples, indexed like the storage"""
+        if self._nodes is None:
+            self._nodes = [tuple(c) for c in self.coords.tolist()]
+        return self._nodes
+
+    def node_index(self):
+        """A dict of (lon, lat) node to its index"""
+        if self._index is None:
+            self._index = {n: i for i, n in enumerate(self.node_list())}
+        return self._index
+
+    def passage_codes(self, passages):
+        """Codes of the given passage names, unknown names are ignored"""
+        return [code for code, name in enumerate(self.passage_names) if name is not None and name in passages]
+
+    def weights64(self, weights=None):
+        """
+        Weights as float64, with the shortest decimal that round-trips the float32,
+        so 0.1 stays 0.1 when summed in Python
+        """
+        weights = self.weights if weights is None else weights
+        return weights.astype(str).astype(np.float64)
+
+    def edge(self, i, j):
+        """Position of the edge i -> j in the storage, -1 if it does not exist"""
+        start, end = self.offsets[i], self.offsets[i + 1]
+        hits = np.flatnonzero(self.targets[start:end] == j)
+        return int(start + hits[0]) if len(hits) else -1
+
+    def edge_data(self, k):
+        """Attributes of the edge at position `k` as a NetworkX edge data dict"""
+        data = {}
+        passage = self.passage_names[self.passages[k]]
+        if passage is not None:
+            data['passage'] = passage
+        weight = self.weights[k]
+        if not np.isnan(weight):
+            data['weight'] = float(self.weights64(self.weights[k:k + 1])[0])
+        return data
+
+    def to_dicts(self):
+        """
+        The NetworkX dict of nodes and dict-of-dicts of edges, the data dict
+        of an edge is shared by both its directions.
+
+        Returns
+        -------
+        A tuple of (node dict, adjacency dict)
+        """
+        nodes = self.node_list()
+        node_set = {n: {'x': n[0], 'y': n[1]} for n in nodes}
+        adj = {n: {} for n in nodes}
+
+        offsets = self.offsets.tolist()
+        targets = self.targets.tolist()
+        weights = self.weights64().tolist()
+        names = [self.passage_names[p] for p in self.passages.tolist()]
+        for i, u in enumerate(nodes):
+            nbrs = adj[u]
+            for k in range(offsets[i], offsets[i + 1]):
+                v = nodes[targets[k]]
+                if v in nbrs:
+                    continue
+                data = adj[v].get(u)
+                if data is None:
+                    data = {}
+                    if names[k] is not None:
+                        data['passage'] = names[k]
+                    if weights[k] == weights[k]:
+                        data['weight'] = weights[k]
+                nbrs[v] = data
+        return node_set, adj
@@ -1,99 +1,270 @@
-class KDNode:
-    """
-    A KDNode
-    """
-    def __init__(self, point, left=None, right=None):
-        self.point = point
-        self.left = left
-        self.right = right
+import numpy as np
+
+from ..geodesy import avg_earth_radius_km, conversions
 
 
 class KDTree:
     """
-    A KDTree
+    A static KD-tree over arrays, for nearest neighbour queries of many points at once.
+
+    Points are split at the median of their widest dimension until at most
+    `leaf_size` are left, every node keeps the bounding box of its points.
+    Batch queries walk the tree level by level for all points at once with
+    NumPy, a single point query walks it in Python which has less overhead.
 
+    Parameters
+    ----------
+    points : iterable of (lon, lat) tuples, default None
+    metric : str, default `euclidean`
+        `euclidean` on (lon, lat) degrees or `haversine`, the great-circle distance
+        in km, computed from the chord between points on the unit sphere so the
+        antimeridian needs no special case
+    leaf_size : int, default 16
+
+    Points added with `add_point` are indexed on the next query.
 
     """
-    def __init__(self, points=None):
-        self.k = 2
-        self.root = None
-        if points:
-            self.root = self._build_tree(points)
+
+    CHUNK = 4096
+
+    def __init__(self, points=None, metric='euclidean', leaf_size=16):
+        if metric not in ('euclidean', 'haversine'):
+            raise ValueError(f'Unknown metric: {metric}')
+        self.metric = metric
+        self.leaf_size = leaf_size
+        self.points = list(points) if points is not None else []
+        self._tree = None
+        self._lists = None
+
+    def __len__(self):
+        return len(self.points)
 
     def add_point(self, point):
-        if self.root is None:
-            # self.k = len(point)
-            self.root = KDNode(point)
-        else:
-            self._add_point(point, self.root, depth=0)
-
-    def _add_point(self, point, node, depth):
-        axis = depth % self.k
-
-        if point[axis] < node.point[axis]:
-            if node.left is None:
-                node.left = KDNode(point)
-            else:
-                self._add_point(point, node.left, depth + 1)
-        else:
-            if node.right is None:
-                node.right = KDNode(point)
-            else:
-                self._add_point(point, node.right, depth + 1)
+        self.points.append(point)
+        self._tree = None
+        self._lists = None
+
+    def _coords(self, points):
+        coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if self.metric == 'euclidean':
+            return coords
+        lon, lat = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+        return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+    def _to_distance(self, squared):
+        if self.metric == 'euclidean':
+            return np.sqrt(squared)
+        chord = np.minimum(np.sqrt(squared), 2.0)
+        return 2 * np.arcsin(chord / 2) * avg_earth_radius_km * conversions['km']
+
+    def _to_squared(self, distance):
+        if self.metric == 'euclidean':
+            return distance ** 2
+        angle = np.minimum(distance / (avg_earth_radius_km * conversions['km']), np.pi)
+        return (2 * np.sin(angle / 2)) ** 2
+
+    def _build(self):
+        """
+        Build the tree as arrays, node 0 is the root, a leaf has no children
+        and holds the points `order[start:end]`
+        """
+        coords = self._coords(self.points)
+        order = np.arange(len(coords))
+        left, right, dim, split, start, end = [], [], [], [], [], []
 
-    def _build_tree(self, points, depth=0):
-        if not points:
-            return None
+        stack = [(-1, False, 0, len(coords))]
+        while stack:
+            parent, is_right, lo, hi = stack.pop()
+            node = len(start)
+            left.append(-1)
+            right.append(-1)
+            start.append(lo)
+            end.append(hi)
+            if parent >= 0:
+                (right if is_right else left)[parent] = node
 
-        axis = depth % self.k
-        sorted_points = sorted(points, key=lambda x: x[axis])
-        median = len(sorted_points) // 2
+            idx = order[lo:hi]
+            pts = coords[idx]
+            d = int(np.argmax(pts.max(axis=0) - pts.min(axis=0))) if hi > lo else 0
+            dim.append(d)
+            if hi - lo <= self.leaf_size:
+                split.append(0.0)
+                continue
+            half = (hi - lo) // 2
+            idx = idx[np.argpartition(pts[:, d], half)]
+            order[lo:hi] = idx
+            split.append(float(coords[idx[half], d]))
+            stack.append((node, True, lo + half, hi))
+            stack.append((node, False, lo, lo + half))
 
-        return KDNode(
-            sorted_points[median],
-            self._build_tree(sorted_points[:median], depth + 1),
-            self._build_tree(sorted_points[median + 1:], depth + 1),
-        )
+        start, end = np.asarray(start), np.asarray(end)
+        sorted_coords = coords[order]
+        # bounding box of every node, from the boxes of its points
+        low = np.empty((len(start), coords.shape[1]))
+        high = np.empty((len(start), coords.shape[1]))
+        for node in range(len(start)):
+            pts = sorted_coords[start[node]:end[node]]
+            low[node] = pts.min(axis=0) if len(pts) else np.inf
+            high[node] = pts.max(axis=0) if len(pts) else -np.inf
 
-    def _query(self, point, node, depth=0, best=None):
-        if node is None:
-            return best
+        self._tree = (np.asarray(left), np.asarray(right), np.asarray(dim), np.asarray(split),
+                      start, end, low, high, order, sorted_coords)
 
-        current_best = best
-        current_node = node
+    def _get_tree(self):
+        if not self.points:
+            raise Exception('Ports/Marnet network was not initiated, initiate using searoute.utils.from_nodes_edges_set function')
+        if self._tree is None:
+            self._build()
+        return self._tree
+
+    def _leaf_points(self, qi, leaves, q):
+        """Flat (query, point index, squared distance) of the points of the leaves paired with queries"""
+        _, _, _, _, start, end, _, _, order, sorted_coords = self._tree
+        pos = start[leaves][:, None] + np.arange(self.leaf_size)[None]
+        valid = pos < end[leaves][:, None]
+        pos = np.where(valid, pos, 0)
+        diff = sorted_coords[pos] - q[qi][:, None]
+        dist = np.einsum('psd,psd->ps', diff, diff)
+        qi = np.broadcast_to(qi[:, None], pos.shape)
+        return qi[valid], order[pos[valid]], dist[valid]
+
+    def _search(self, q, bound):
+        """Flat (query, point index, squared distance) of the leaves within `bound` of each query"""
+        left, right, _, _, _, _, low, high, _, _ = self._tree
+        qi = np.arange(len(q))
+        node = np.zeros(len(q), dtype=np.int64)
+        leaf_q, leaf_n = [], []
+        while len(qi):
+            gap = np.maximum(np.maximum(low[node] - q[qi], q[qi] - high[node]), 0)
+            near = np.einsum('pd,pd->p', gap, gap) <= bound[qi]
+            qi, node = qi[near], node[near]
+            leaf = left[node] < 0
+            leaf_q.append(qi[leaf])
+            leaf_n.append(node[leaf])
+            qi, node = qi[~leaf], node[~leaf]
+            qi = np.concatenate((qi, qi))
+            node = np.concatenate((left[node], right[node]))
+        return self._leaf_points(np.concatenate(leaf_q), np.concatenate(leaf_n), q)
+
+    def knn(self, points, k=1):
+        """
+        k nearest neighbours of many points
+
+        Parameters
+        ----------
+        points : array-like of (lon, lat)
+        k : number of neighbours
+
+        Returns
+        -------
+        A tuple of (distances, indexes) arrays of shape (len(points), k), indexes refer to
+        `self.points`, missing neighbours have an infinite distance and an index of -1
+        """
+        left, right, dim, split, _, _, _, _, _, _ = self._get_tree()
+        coords = self._coords(points)
+        distances = np.full((len(coords), k), np.inf)
+        indexes = np.full((len(coords), k), -1, dtype=np.int64)
+
+        for chunk in range(0, len(coords), self.CHUNK):
+            q = coords[chunk:chunk + self.CHUNK]
+            m = len(q)
+            # the k-th distance within the leaf of each point bounds the search
+            rows = np.arange(m)
+            node = np.zeros(m, dtype=np.int64)
+            inner = left[node] >= 0
+            while inner.any():
+                n = node[inner]
+                go_left = q[rows[inner], dim[n]] < split[n]
+                node[inner] = np.where(go_left, left[n], right[n])
+                inner = left[node] >= 0
+            qi, _, dist = self._leaf_points(rows, node, q)
+            own = np.full((m, self.leaf_size), np.inf)
+            own[qi, np.arange(len(qi)) - np.searchsorted(qi, rows)[qi]] = dist
+            bound = np.partition(own, k - 1, axis=1)[:, k - 1] if k <= self.leaf_size else np.full(m, np.inf)
 
-        axis = depth % self.k
-        next_best = None
-        next_branch = None
+            qi, index, dist = self._search(q, bound)
+            order = np.lexsort((index, dist, qi))
+            qi, index, dist = qi[order], index[order], dist[order]
+            rank = np.arange(len(qi)) - np.searchsorted(qi, rows)[qi]
+            keep = rank < k
+            distances[chunk + qi[keep], rank[keep]] = dist[keep]
+            indexes[chunk + qi[keep], rank[keep]] = index[keep]
 
-        if point[axis] < node.point[axis]:
-            next_node = node.left
-            opposite_node = node.right
-        else:
-            next_node = node.right
-            opposite_node = node.left
+        return self._to_distance(distances), indexes
 
-        next_best = self._query(point, next_node, depth + 1, current_best)
+    def radius(self, points, r, return_distance=False):
+        """
+        Neighbours within a distance of many points
 
-        if self._distance(point, current_node.point) < self._distance(point, next_best):
-            next_best = current_node.point
+        Parameters
+        ----------
+        points : array-like of (lon, lat)
+        r : distance, in degrees for `euclidean` or km for `haversine`
+        return_distance : boolean, default False
 
-        if abs(point[axis] - node.point[axis]) < self._distance(point, next_best):
-            opposite_best = self._query(
-                point, opposite_node, depth + 1, next_best)
-            if self._distance(point, opposite_best) < self._distance(point, next_best):
-                next_best = opposite_best
+        Returns
+        -------
+        A list of index arrays sorted by distance, one per point, and a list of
+        distance arrays if `return_distance` is True
+        """
+        self._get_tree()
+        coords = self._coords(points)
+        found, found_dist = [], []
 
-        return next_best
+        for chunk in range(0, len(coords), self.CHUNK):
+            q = coords[chunk:chunk + self.CHUNK]
+            m = len(q)
+            bound = np.full(m, self._to_squared(r))
+            qi, index, dist = self._search(q, bound)
+            within = dist <= bound[qi]
+            qi, index, dist = qi[within], index[within], dist[within]
+            order = np.lexsort((index, dist, qi))
+            splits = np.searchsorted(qi[order], np.arange(1, m))
+            found.extend(np.split(index[order], splits))
+            found_dist.extend(np.split(self._to_distance(dist[order]), splits))
+
+        return (found, found_dist) if return_distance else found
+
+    def _nearest(self, p):
+        """Index of the nearest point of a single point, walking the tree in Python"""
+        if self._lists is None:
+            tree = self._get_tree()
+            self._lists = tuple(a.tolist() for a in tree)
+        left, right, dim, split, start, end, low, high, order, sorted_coords = self._lists
+
+        best, best_i = float('inf'), -1
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            box = 0.0
+            for x, lo, hi in zip(p, low[node], high[node]):
+                if x < lo:
+                    box += (lo - x) ** 2
+                elif x > hi:
+                    box += (x - hi) ** 2
+            if box > best:
+                continue
+            if left[node] < 0:
+                for pos in range(start[node], end[node]):
+                    d = sum((x - y) ** 2 for x, y in zip(p, sorted_coords[pos]))
+                    if d < best or (d == best and order[pos] < best_i):
+                        best, best_i = d, order[pos]
+            elif p[dim[node]] < split[node]:
+                stack.append(right[node])
+                stack.append(left[node])
+            else:
+                stack.append(left[node])
+                stack.append(right[node])
+        return best_i
+
+    def query_many(self, points):
+        """Nearest point of each of many points, as a list of points"""
+        _, indexes = self.knn(points, 1)
+        return [self.points[i] for i in indexes[:, 0].tolist()]
 
     def query(self, point):
+        """Nearest point of a point"""
         if point is None:
             raise Exception('There is no nodes in the Graph')
-        try:
-            best = self.root.point
-        except:
-            raise Exception('Ports/Marnet network was not initiated, initiate using searoute.utils.from_nodes_edges_set function')
-        return self._query(point, self.root, 0, best)
-
-    def _distance(self, p1, p2):
-        return sum((x - y) ** 2 for x, y in zip(p1, p2)) ** 0.5
+        self._get_tree()
+        return self.points[self._nearest(self._coords([point])[0].tolist())]
@@ -1,7 +1,42 @@
+import threading
+
 import networkx as nx
+import numpy as np
 from .passages import Passage
 from ..utils import load_from_geojson, distance
+from ..geodesy import distances
 from .kdtree import KDTree
+from .csr import CSRGraph
+from .profile import RoutingProfile
+
+
+class _NetworkXStorage:
+    """
+    Data descriptor for the `_node` and `_adj` dicts of NetworkX.
+
+    A Marnet loaded from a CSR storage builds these dicts only on first access,
+    so the NetworkX API stays available as an adapter. Assigning them (as NetworkX
+    does on init or for views) makes them the storage the CSR is compiled from.
+    """
+
+    def __init__(self, name, cached_properties):
+        self.name = name
+        self.cached_properties = cached_properties
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        od = obj.__dict__
+        if self.name not in od:
+            obj._materialize()
+        return od[self.name]
+
+    def __set__(self, obj, value):
+        od = obj.__dict__
+        od[self.name] = value
+        for prop in self.cached_properties:
+            od.pop(prop, None)
+        obj._invalidate()
 
 
 class Marnet(nx.Graph):
@@ -13,15 +48,75 @@ class Marnet(nx.Graph):
     with (lon, lat) and it's attributes if applied.
     They form maritime routes on water.
 
+    The network is stored as compressed sparse rows (see `CSRGraph`), used by
+    routing and isochrones. The NetworkX dicts are only built when the NetworkX
+    API is used, and changes made through it are compiled back to the CSR storage.
     
     """
 
+    _node = _NetworkXStorage('_node', ['nodes'])
+    _adj = _NetworkXStorage('_adj', ['adj', 'edges', 'degree'])
+    # profiles may be requested from several threads, build each one once
+    _profile_lock = threading.Lock()
+
     def __init__(self):
+        self._csr = None
+        self._profiles = {}
         super().__init__()
         DEFAULT_CRF = 'EPSG:3857'
         self.graph['crs'] = DEFAULT_CRF  # CRS attribute for the graph
         self.restrictions = [Passage.northwest]
-        self.kdtree = KDTree()
+        self.kdtree = KDTree(metric='haversine')
+
+    def _materialize(self):
+        od = self.__dict__
+        if od.get('_csr') is None:
+            node_set, adj = {}, {}
+        else:
+            node_set, adj = od['_csr'].to_dicts()
+        od['_node'], od['_adj'] = node_set, adj
+        for prop in ('nodes', 'adj', 'edges', 'degree'):
+            od.pop(prop, None)
+
+    def _invalidate(self):
+        # the NetworkX dicts changed, routing data is compiled again on next use
+        self.__dict__['_csr'] = None
+        self.__dict__['_profiles'] = {}
+
+    @property
+    def csr(self):
+        """The CSR storage of the network"""
+        if self._csr is None:
+            self._csr = CSRGraph.from_dicts(self._node, self._adj)
+        return self._csr
+
+    def load_csr(self, csr):
+        """
+        Use a CSR storage as the network, replacing nodes and edges
+
+        Parameters
+        ----------
+        csr : a CSRGraph
+        """
+        od = self.__dict__
+        for name in ('_node', '_adj', 'nodes', 'adj', 'edges', 'degree'):
+            od.pop(name, None)
+        self._csr = csr
+        self._profiles = {}
+        self.update_kdtree()
+        return self
+
+    def get_edge_data(self, u, v, default=None):
+        if '_adj' in self.__dict__:
+            return super().get_edge_data(u, v, default)
+
+        # answer from the CSR storage, without building the NetworkX dicts
+        index = self.csr.node_index()
+        i, j = index.get(u), index.get(v)
+        if i is None or j is None:
+            return default
+        k = self.csr.edge(i, j)
+        return self.csr.edge_data(k) if k >= 0 else default
 
     def add_node(self, node, **attr):
         if not isinstance(node, tuple):
@@ -33,6 +128,7 @@ class Marnet(nx.Graph):
 
         self.kdtree.add_point(node)
         super().add_node(node, **attr)
+        self._invalidate()
 
     def add_edge(self, u, v, **attr):
         if not isinstance(u, tuple) or not isinstance(v, tuple):
@@ -49,13 +145,55 @@ class Marnet(nx.Graph):
             length = distance(u, v)
             attr["weight"] = round(length, 1)
         super().add_edge(u, v, **attr)
+        self._invalidate()
+
+    def add_nodes_from(self, nodes_for_adding, **attr):
+        super().add_nodes_from(nodes_for_adding, **attr)
+        self._invalidate()
+
+    def add_edges_from(self, ebunch_to_add, **attr):
+        super().add_edges_from(ebunch_to_add, **attr)
+        self._invalidate()
+
+    def remove_node(self, n):
+        super().remove_node(n)
+        self._invalidate()
+
+    def remove_nodes_from(self, nodes):
+        super().remove_nodes_from(nodes)
+        self._invalidate()
+
+    def remove_edge(self, u, v):
+        super().remove_edge(u, v)
+        self._invalidate()
+
+    def remove_edges_from(self, ebunch):
+        super().remove_edges_from(ebunch)
+        self._invalidate()
+
+    def clear(self):
+        super().clear()
+        self._invalidate()
+
+    def clear_edges(self):
+        super().clear_edges()
+        self._invalidate()
 
     def add_edges_from_list(self, edge_list):
         if not edge_list:
             return
-        
+
+        # lengths of the edges without a weight, computed at once
+        missing = [(u, v) for u, v, args in edge_list if "weight" not in args]
+        weights = {}
+        if missing:
+            lengths = distances([u for u, _ in missing], [v for _, v in missing]).round(1).tolist()
+            weights = dict(zip(missing, lengths))
+
         for edge in edge_list:
             u,v,args = edge
+            if (u, v) in weights:
+                args = dict(args, weight=weights[u, v])
             self.add_edge(u, v, **args)
 
     def add_nodes_from_list(self, node_list):
@@ -70,7 +208,7 @@ class Marnet(nx.Graph):
     def subgraph(self, nodes):
 
         subg = super().subgraph(nodes)
-        subg.kdtree = KDTree(nodes)
+        subg.kdtree = KDTree(nodes, metric='haversine')
 
         return subg
 
@@ -94,14 +232,18 @@ class Marnet(nx.Graph):
 
         Returns
         -------
-        A subgraph of Marnet filtered
+        A subgraph of Marnet filtered, cached with the routing profile of the restrictions
         """
 
         if apply_restrictions:
-            restrictions_ = restrictions or self.restrictions
-            filtered_edges = [(u, v) for u, v, data in self.edges(
-                data=True) if data.get('passage', None) not in restrictions_]
-            return self.subgraph(filtered_edges)
+            profile = self.profile(restrictions or self.restrictions)
+            if profile.graph is None:
+                subg = nx.subgraph_view(
+                    self, filter_edge=lambda u, v: profile.allows(self._adj[u][v]))
+                subg.kdtree = self.kdtree
+                subg.restrictions = list(profile.restrictions)
+                profile.graph = subg
+            return profile.graph
         else:
             return self
 
@@ -128,36 +270,216 @@ class Marnet(nx.Graph):
 
     def update_kdtree(self, nodes = None):
         if nodes:
-            self.kdtree = KDTree(nodes)
+            self.kdtree = KDTree(nodes, metric='haversine')
         else:
-            self.kdtree = KDTree(self._node)
+            self.kdtree = KDTree(self.csr.node_list(), metric='haversine')
+
+    def profile(self, restrictions=None):
+        """
+        Routing profile for a set of restrictions, built on first use and cached.
+
+        Parameters
+        ----------
+        restrictions : list of passages to be restricted
+            A list of str, by default is None which means the restrictions of the Marnet
+
+        Returns
+        -------
+        A RoutingProfile
+        """
+        key = frozenset(self.restrictions if restrictions is None else restrictions)
+        profile = self._profiles.get(key)
+        if profile is None:
+            with self._profile_lock:
+                profiles = self._profiles
+                profile = profiles.get(key)
+                if profile is None:
+                    profile = RoutingProfile.from_csr(self.csr, key)
+                    profiles[key] = profile
+        return profile
+
+    def build_ch(self, restrictions=None, path=None):
+        """
+        Build the contraction hierarchy of the routing profile of a set of restrictions,
+        used by `shortest_path` for these restrictions.
+
+        Parameters
+        ----------
+        restrictions : list of passages to be restricted
+            A list of str, by default is None which means the restrictions of the Marnet
+        path : str, default None
+            A `.npz` file where the hierarchy is persisted. When the file exists and
+            was built from the same edges it is loaded instead of being rebuilt.
+
+        Returns
+        -------
+        The ContractionHierarchy
+        """
+        return self.profile(restrictions).build_ch(path)
+
+    def snap(self, point, restrictions=None, k=1, largest_component=False):
+        """
+        Closest nodes of a location by great-circle distance, across the antimeridian.
+        Nodes left without any edge by the restrictions are never returned.
+
+        Parameters
+        ----------
+        point : a location as (lon, lat)
+        restrictions : list of passages to be restricted
+            A list of str, by default is None which means the restrictions of the Marnet
+        k : number of candidate nodes, default 1
+        largest_component : boolean, default False
+            only returns nodes of the largest connected component of the routing profile
 
-    # Get the shortest route by distance
-    def __custom_w(self, u, v, data):
-        return data.get('weight') if data.get('passage') not in self.restrictions else float('inf')
+        Returns
+        -------
+        A list of up to `k` nodes, closest first
+        """
+        labels, sizes = self.profile(restrictions).components()
+        allowed = sizes[labels] > 1
+        if largest_component:
+            allowed = labels == np.argmax(sizes)
+        if not allowed.any():
+            # no edges at all, any node will do
+            allowed = np.ones(len(labels), dtype=bool)
+        index = self.csr.node_index()
+
+        found = []
+        count = k + 8
+        while True:
+            _, candidates = self.kdtree.knn([point], min(count, len(self.kdtree)))
+            found = []
+            for i in candidates[0].tolist():
+                node = self.kdtree.points[i]
+                j = index.get(node)
+                if j is not None and allowed[j] and node not in found:
+                    found.append(node)
+                    if len(found) == k:
+                        return found
+            if count >= len(self.kdtree):
+                return found
+            count *= 4
+
+    def snap_pair(self, origin, destination, restrictions=None):
+        """
+        Nodes a route between two locations starts and ends at.
+        Both are snapped with `snap`, when the restrictions leave them in different
+        components both are snapped within the largest component instead.
 
-    def shortest_path(self, origin, destination):
+        Returns
+        -------
+        A tuple of (origin node, destination node)
+        """
+        profile = self.profile(restrictions)
+        origin_node = self.snap(origin, restrictions)[0]
+        destination_node = self.snap(destination, restrictions)[0]
+
+        labels, _ = profile.components()
+        if labels[profile.index[origin_node]] != labels[profile.index[destination_node]]:
+            # the restrictions split them apart, route between the closest nodes of the main network
+            origin_node = self.snap(origin, restrictions, largest_component=True)[0]
+            destination_node = self.snap(destination, restrictions, largest_component=True)[0]
+        return origin_node, destination_node
+
+    def route_lengths(self, origins, destinations, restrictions=None):
+        """
+        Lengths of the shortest routes between many origins and destinations,
+        snapped like `shortest_path` does. One search is run per unique origin node.
+
+        Parameters
+        ----------
+        origins : list of locations
+        destinations : list of locations
+        restrictions : list of passages to be restricted
+            A list of str, by default is None which means the restrictions of the Marnet
+
+        Returns
+        -------
+        An array of lengths in km of shape (len(origins), len(destinations)), inf where there is no route
+        """
+        profile = self.profile(restrictions)
+        labels, _ = profile.components()
+        index = profile.index
+
+        def snap_all(points, largest_component=False):
+            return [index[self.snap(p, restrictions, largest_component=largest_component)[0]] for p in points]
+
+        sources, targets = snap_all(origins), snap_all(destinations)
+        main_sources = main_targets = None
+        cells = []
+        needed = {}
+        for i, s in enumerate(sources):
+            for j, t in enumerate(targets):
+                if labels[s] != labels[t]:
+                    # the restrictions split them apart, as in `shortest_path`
+                    if main_sources is None:
+                        main_sources = snap_all(origins, True)
+                        main_targets = snap_all(destinations, True)
+                    s, t = main_sources[i], main_targets[j]
+                cells.append((i, j, s, t))
+                needed.setdefault(s, set()).add(t)
+
+        found = {s: profile.route_lengths(s, t) for s, t in needed.items()}
+        lengths = np.full((len(sources), len(targets)), np.inf)
+        for i, j, s, t in cells:
+            lengths[i, j] = found[s].get(t, np.inf)
+        return lengths
+
+    def shortest_path(self, origin, destination, restrictions=None, method=None):
         """
         Shortest Path between the origin and the destination.
-        Dijkstra algorithm is used to perform the calculation.
+        Dijkstra algorithm is used to perform the calculation on the routing profile
+        of the restrictions, unless a contraction hierarchy was built for it with `build_ch`.
 
         Parameters
         ----------
         origin : origin location, in the graph or not,
-            if origin is not a known node, a closed node search will be performed
+            if origin is not a known node, it is snapped to its closest node (see `snap`)
         destination : destination location in the graph or not
-            if destination is not a known node, a closed node search will be performed
+            if destination is not a known node, it is snapped to its closest node
+        restrictions : list of passages to be restricted
+            A list of str, by default is None which means the restrictions of the Marnet
+        method : str, default None
+            `dijkstra`, `astar` (A* guided by the great-circle distance, same lengths,
+            fewer explored nodes) or `ch` (contraction hierarchy)
 
         Returns
         -------
-        A list of nodes building the shortest path
+        A list of nodes building the shortest path, None if there is no path
         
         """
-        origin_node = self.kdtree.query(origin)
-        destination_node = self.kdtree.query(destination)
+        origin_node, destination_node = self.snap_pair(origin, destination, restrictions)
+        return self.profile(restrictions).shortest_path(origin_node, destination_node, method)
 
-        return nx.shortest_path(
-            self, origin_node, destination_node, weight=self.__custom_w) 
+    def fastest_path(self, origin, destination, field, speed_knot, depart=None, restrictions=None):
+        """
+        Fastest path between the origin and the destination through the waves
+        of a forecast, see `RoutingProfile.fastest_path`.
+
+        Parameters
+        ----------
+        origin : origin location, snapped like `shortest_path` does
+        destination : destination location
+        field : a `WaveField` of the forecast
+        speed_knot : speed of the boat in calm sea
+        depart : time of departure in seconds since the epoch, default the first time of the field
+        restrictions : list of passages to be restricted
+            A list of str, by default is None which means the restrictions of the Marnet
+
+        Returns
+        -------
+        A tuple of (list of nodes, duration in hours), (None, inf) if there is no path
+        """
+        depart = field.time0 if depart is None else depart
+        origin_node, destination_node = self.snap_pair(origin, destination, restrictions)
+        profile = self.profile(restrictions)
+        factors = field.speed_factors(self.csr.coords, key=self.csr.signature())
+        start = (depart - field.time0) / 3600
+        arrival, path = profile.fastest_path(profile.index[origin_node], profile.index[destination_node],
+                                             factors, speed_knot, start, field.dt / 3600)
+        if path is None:
+            return None, float('inf')
+        return [profile.nodes[k] for k in path], arrival - start
 
     @staticmethod
     def from_geojson(*path):
@@ -24,6 +24,7 @@ s
         DEFAULT_CRF = 'EPSG:3857'
         self.graph['crs'] = DEFAULT_CRF  # CRS attribute for the graph
         self.kdtree = KDTree()
+        self._queries = {}
 
     def add_node(self, node, **attr):
         if not isinstance(node, tuple):
@@ -38,6 +39,15 @@ s
 
         self.kdtree.add_point(node)
         super().add_node(node, **attr)
+        self._queries = {}
+
+    def remove_node(self, n):
+        super().remove_node(n)
+        self._queries = {}
+
+    def remove_nodes_from(self, nodes):
+        super().remove_nodes_from(nodes)
+        self._queries = {}
 
 
     def __copy__(self):
@@ -70,12 +80,20 @@ s
 
         Returns
         -------
-        A subgraph of Ports filtered
+        A subgraph of Ports filtered, cached for the same filters
         """
 
         if not terminals and not cty and not to_cty:
             return self
 
+        key = (bool(terminals), cty, to_cty, bool(strict))
+        subg = self._queries.get(key)
+        if subg is None:
+            subg = self._query(terminals, cty, to_cty, strict)
+            self._queries[key] = subg
+        return subg
+
+    def _query(self, terminals, cty, to_cty, strict):
         def cty_filter(data, cty):
             if not cty:
                 return True
@@ -157,6 +175,7 @@ s
             self.kdtree = KDTree(nodes)
         else:
             self.kdtree = KDTree(self._node)
+        self._queries = {}
 
     
 
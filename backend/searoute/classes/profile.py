@@ -0,0 +1,509 @@
+import os
+import warnings
+import zipfile
+from heapq import heappop, heappush
+from itertools import count
+from math import asin, cos, sin, sqrt
+
+import numpy as np
+
+from .ch import ContractionHierarchy
+from ..geodesy import avg_earth_radius_km, conversions, distances
+
+
+class RoutingProfile:
+    """
+    A routing profile is a compact copy of the Marnet edges for one set of
+    restricted passages.
+
+    Restricted edges are removed when the profile is built, so searches run
+    on plain CSR arrays without any weight callback. Nodes are referred to by
+    their index in the CSR storage of the Marnet, which all its profiles share.
+
+    Only a profile keeping every edge uses the arrays of the storage, mapped
+    from a snapshot and shared between processes. A restricted profile, ex.
+    the default `['northwest']`, holds its own filtered copy in every process,
+    and searches walk Python lists of the arrays (see `lists`), built per
+    process for every profile. What processes share is the storage itself:
+    the coordinates, the node index and the snapping.
+
+    """
+
+    # scale of the great-circle heuristic of the A* search
+    ASTAR_FACTOR = 0.99
+
+    def __init__(self, restrictions, csr, offsets, targets, weights):
+        self.restrictions = frozenset(restrictions or [])
+        self.csr = csr
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.ch = None
+        self.graph = None
+        self._lists = None
+        self._astar = None
+        self._components = None
+        self._edge_lengths = None
+
+    @classmethod
+    def from_csr(cls, csr, restrictions):
+        """
+        Build the profile of a CSR storage for the given restrictions
+
+        Parameters
+        ----------
+        csr : the CSRGraph of a Marnet
+        restrictions : list of passages to be restricted
+
+        Returns
+        -------
+        A RoutingProfile
+        """
+        restrictions = frozenset(restrictions or [])
+        keep = ~np.isnan(csr.weights) & ~np.isin(csr.passages, csr.passage_codes(restrictions))
+        if keep.all():
+            # the arrays of the storage, mapped from a snapshot when there is one
+            return cls(restrictions, csr, csr.offsets, csr.targets, csr.weights)
+        rows = np.repeat(np.arange(csr.n), np.diff(csr.offsets))
+        offsets = np.zeros(csr.n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows[keep], minlength=csr.n), out=offsets[1:])
+
+        return cls(restrictions, csr, offsets, csr.targets[keep], csr.weights[keep])
+
+    @property
+    def nodes(self):
+        return self.csr.node_list()
+
+    @property
+    def index(self):
+        return self.csr.node_index()
+
+    def allows(self, data):
+        """Whether an edge with `data` is part of the profile"""
+        return data.get('passage') not in self.restrictions
+
+    def lists(self):
+        """
+        The offsets, targets and weights as Python lists, faster to walk in a
+        search. Built on first use, a private copy of the process
+        """
+        if self._lists is None:
+            self._lists = (self.offsets.tolist(), self.targets.tolist(),
+                           self.csr.weights64(self.weights).tolist())
+        return self._lists
+
+    def edges(self):
+        """Iterate over the undirected edges as (i, j, weight) with i < j"""
+        offsets, targets, weights = self.lists()
+        for i in range(len(offsets) - 1):
+            for k in range(offsets[i], offsets[i + 1]):
+                if i < targets[k]:
+                    yield i, targets[k], weights[k]
+
+    def components(self):
+        """
+        Connected components of the profile, restricted passages can split the network
+
+        Returns
+        -------
+        A tuple of (labels, sizes) arrays, `labels[i]` is the component of the node index `i`
+        """
+        if self._components is None:
+            offsets, targets, _ = self.lists()
+            labels = [-1] * (len(offsets) - 1)
+            sizes = []
+            for source in range(len(labels)):
+                if labels[source] >= 0:
+                    continue
+                label = len(sizes)
+                labels[source] = label
+                stack = [source]
+                size = 0
+                while stack:
+                    v = stack.pop()
+                    size += 1
+                    for k in range(offsets[v], offsets[v + 1]):
+                        w = targets[k]
+                        if labels[w] < 0:
+                            labels[w] = label
+                            stack.append(w)
+                sizes.append(size)
+            self._components = (np.asarray(labels, dtype=np.int32), np.asarray(sizes, dtype=np.int64))
+        return self._components
+
+    def build_ch(self, path=None):
+        """
+        Build the contraction hierarchy of the profile.
+
+        Parameters
+        ----------
+        path : str, default None
+            A `.npz` file where the hierarchy is persisted. When the file exists and
+            was built from the same edges it is loaded instead of being rebuilt.
+
+        Returns
+        -------
+        The ContractionHierarchy
+        """
+        edges = list(self.edges())
+        ch = None
+        if path and os.path.exists(path):
+            try:
+                ch = ContractionHierarchy.load(path)
+            except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile) as e:
+                # another version or a damaged file, rebuilt and saved again
+                warnings.warn(f'Could not load the contraction hierarchy {path}: {e}, rebuilding it')
+            if ch is not None and ch.signature != ContractionHierarchy.signature_of(self.csr.n, edges):
+                ch = None
+        if ch is None:
+            ch = ContractionHierarchy.build(self.csr.n, edges)
+            if path:
+                ch.save(path)
+
+        self.ch = ch
+        return ch
+
+    def dijkstra(self, source, target):
+        """
+        Bidirectional Dijkstra between two node indexes.
+
+        The expansion order follows `networkx.bidirectional_dijkstra`, so ties
+        between paths of the same length are resolved the same way.
+
+        Returns
+        -------
+        A tuple of (length, list of node indexes) or (inf, None) if there is no path
+        """
+        if source == target:
+            return 0, [source]
+
+        offsets, targets, weights = self.lists()
+        dists = [{}, {}]
+        preds = [{source: None}, {target: None}]
+        fringe = [[], []]
+        seen = [{source: 0}, {target: 0}]
+        c = count()
+        heappush(fringe[0], (0, next(c), source))
+        heappush(fringe[1], (0, next(c), target))
+
+        finaldist = None
+        meetnode = None
+        direction = 1
+        while fringe[0] and fringe[1]:
+            direction = 1 - direction
+            dist, _, v = heappop(fringe[direction])
+            if v in dists[direction]:
+                continue
+            dists[direction][v] = dist
+            if v in dists[1 - direction]:
+                break
+
+            done, seen_, other = dists[direction], seen[direction], seen[1 - direction]
+            pred = preds[direction]
+            for k in range(offsets[v], offsets[v + 1]):
+                w = targets[k]
+                length = dist + weights[k]
+                if w in done:
+                    continue
+                if w not in seen_ or length < seen_[w]:
+                    seen_[w] = length
+                    heappush(fringe[direction], (length, next(c), w))
+                    pred[w] = v
+                    if w in other:
+                        total = length + other[w]
+                        if finaldist is None or finaldist > total:
+                            finaldist, meetnode = total, w
+        else:
+            return float('inf'), None
+
+        path = []
+        v = meetnode
+        while v is not None:
+            path.append(v)
+            v = preds[0][v]
+        path.reverse()
+        v = preds[1][meetnode]
+        while v is not None:
+            path.append(v)
+            v = preds[1][v]
+        return finaldist, path
+
+    def distances(self, source, cutoff=None):
+        """
+        Single source Dijkstra from a node index.
+
+        Parameters
+        ----------
+        source : node index
+        cutoff : float, default None
+            nodes farther than `cutoff` are not searched
+
+        Returns
+        -------
+        A dict of node index to its distance, in the order nodes were settled
+        """
+        offsets, targets, weights = self.lists()
+        dist = {}
+        seen = {source: 0}
+        c = count()
+        fringe = [(0, next(c), source)]
+        while fringe:
+            d, _, v = heappop(fringe)
+            if v in dist:
+                continue
+            dist[v] = d
+            for k in range(offsets[v], offsets[v + 1]):
+                w = targets[k]
+                length = d + weights[k]
+                if w in dist or (cutoff is not None and length > cutoff):
+                    continue
+                if w not in seen or length < seen[w]:
+                    seen[w] = length
+                    heappush(fringe, (length, next(c), w))
+        return dist
+
+    def edge_lengths(self):
+        """Great-circle length in km of every edge, as a list indexed like `targets`"""
+        if self._edge_lengths is None:
+            rows = np.repeat(np.arange(self.csr.n), np.diff(self.offsets))
+            coords = self.csr.coords
+            self._edge_lengths = distances(coords[rows], coords[self.targets]).tolist()
+        return self._edge_lengths
+
+    def route_lengths(self, source, targets):
+        """
+        Lengths of the shortest routes from a node index to many node indexes,
+        with one single source Dijkstra that stops once all targets are settled.
+
+        Routes are the shortest by edge weights, their length is measured along
+        their geometry like `searoute` does.
+
+        Parameters
+        ----------
+        source : node index
+        targets : iterable of node indexes
+
+        Returns
+        -------
+        A dict of target node index to the route length in km, unreachable targets are left out
+        """
+        offsets, targets_, weights = self.lists()
+        edge_lengths = self.edge_lengths()
+        remaining = set(targets)
+        found = {}
+        dist = {}
+        seen = {source: 0}
+        geo = {source: 0.0}
+        c = count()
+        fringe = [(0, next(c), source)]
+        while fringe and remaining:
+            d, _, v = heappop(fringe)
+            if v in dist:
+                continue
+            dist[v] = d
+            if v in remaining:
+                remaining.discard(v)
+                found[v] = geo[v]
+            for k in range(offsets[v], offsets[v + 1]):
+                w = targets_[k]
+                length = d + weights[k]
+                if w in dist:
+                    continue
+                if w not in seen or length < seen[w]:
+                    seen[w] = length
+                    geo[w] = geo[v] + edge_lengths[k]
+                    heappush(fringe, (length, next(c), w))
+        return found
+
+    def fastest_path(self, source, target, factors, speed, start=0.0, step=1.0):
+        """
+        Time-dependent A* search between two node indexes, the fastest path of
+        a boat whose speed changes over time, ex. with the waves.
+
+        The speed on an edge is the one when leaving its first node, it only
+        changes at knots `step` hours apart. The boat may wait at a node for a
+        knot with a better speed, so leaving an edge later never means arriving
+        earlier (FIFO) and searching by arrival time is exact. The search is
+        guided by the great-circle distance to the target at the highest speed.
+
+        Parameters
+        ----------
+        source, target : node indexes
+        factors : array of shape (nodes, knots)
+            share of `speed` when leaving each node at each knot, the last knot holds after it
+        speed : speed in knots for a factor of 1, edges are as long as their geometry
+        start : float, default 0
+            departure in hours after the first knot
+        step : float, default 1
+            hours between two knots
+
+        Returns
+        -------
+        A tuple of (arrival in hours after the first knot, list of node indexes),
+        (inf, None) if there is no path
+        """
+        offsets, targets, _ = self.lists()
+        lengths = self.edge_lengths()
+        lon, lat, coslat, scale, _ = self._astar_params()
+        knots = factors.shape[1]
+        top_speed = speed * float(factors.max())
+        # edge lengths are in km, speeds in knots
+        km_hours = conversions['naut'] / conversions['km'] / speed
+        t_lon, t_lat, t_cos = lon[target], lat[target], coslat[target]
+        bound = scale / self.ASTAR_FACTOR * conversions['naut'] / conversions['km'] / top_speed * 0.999
+
+        def heuristic(i):
+            a = sin((t_lat - lat[i]) / 2) ** 2 + coslat[i] * t_cos * sin((t_lon - lon[i]) / 2) ** 2
+            return bound * asin(sqrt(min(1.0, a)))
+
+        arrival = {source: start}
+        preds = {source: None}
+        done = set()
+        c = count()
+        fringe = [(start + heuristic(source), next(c), start, source)]
+        while fringe:
+            _, _, t, v = heappop(fringe)
+            if v in done:
+                continue
+            done.add(v)
+            if v == target:
+                break
+            k = min(max(int(t // step), 0), knots - 1)
+            row = factors[v].tolist()
+            for e in range(offsets[v], offsets[v + 1]):
+                w = targets[e]
+                if w in done:
+                    continue
+                hours = lengths[e] * km_hours
+                arrive = t + hours / row[k]
+                # leaving at a later knot, at best at the highest speed
+                j = k + 1
+                while j < knots and j * step + hours * speed / top_speed < arrive:
+                    arrive = min(arrive, j * step + hours / row[j])
+                    j += 1
+                if arrive < arrival.get(w, float('inf')):
+                    arrival[w] = arrive
+                    preds[w] = v
+                    heappush(fringe, (arrive + heuristic(w), next(c), arrive, w))
+        else:
+            return float('inf'), None
+
+        path = []
+        v = target
+        while v is not None:
+            path.append(v)
+            v = preds[v]
+        path.reverse()
+        return arrival[target], path
+
+    def _astar_params(self):
+        """
+        Node coordinates in radians and the slack of the great-circle heuristic.
+
+        Edge weights are rounded (and a few are 0 between nearly identical nodes),
+        so some edges are shorter than `ASTAR_FACTOR` times their great-circle
+        length. A simple path can not use more than all of them, so removing the
+        sum of these deficits from the heuristic keeps it admissible.
+        """
+        if self._astar is None:
+            lon = np.radians(self.csr.coords[:, 0]).tolist()
+            lat = np.radians(self.csr.coords[:, 1]).tolist()
+            coslat = [cos(y) for y in lat]
+            scale = self.ASTAR_FACTOR * 2 * avg_earth_radius_km * conversions['km']
+
+            slack = 0.0
+            for i, j, weight in self.edges():
+                a = sin((lat[j] - lat[i]) / 2) ** 2 + coslat[i] * coslat[j] * sin((lon[j] - lon[i]) / 2) ** 2
+                bound = scale * asin(sqrt(min(1.0, a)))
+                if bound > weight:
+                    slack += bound - weight
+
+            self._astar = (lon, lat, coslat, scale, slack)
+        return self._astar
+
+    def astar(self, source, target):
+        """
+        A* search between two node indexes, guided by the great-circle distance
+        to the target. The haversine is periodic in longitude, so nodes across
+        the antimeridian are as close as `normalize_linestring` draws them.
+
+        The length is the one of Dijkstra, but between paths of the same length
+        the one returned may differ from the path of `dijkstra`.
+
+        Returns
+        -------
+        A tuple of (length, list of node indexes) or (inf, None) if there is no path
+        """
+        if source == target:
+            return 0, [source]
+
+        lon, lat, coslat, scale, slack = self._astar_params()
+        t_lon, t_lat, t_cos = lon[target], lat[target], coslat[target]
+
+        def heuristic(i):
+            a = sin((t_lat - lat[i]) / 2) ** 2 + coslat[i] * t_cos * sin((t_lon - lon[i]) / 2) ** 2
+            return max(0.0, scale * asin(sqrt(min(1.0, a))) - slack)
+
+        offsets, targets, weights = self.lists()
+        dist = {source: 0}
+        preds = {source: None}
+        c = count()
+        fringe = [(heuristic(source), next(c), 0, source)]
+        h = {}
+        while fringe:
+            _, _, d, v = heappop(fringe)
+            if d > dist[v]:
+                continue
+            if v == target:
+                break
+            # the heuristic is admissible but not consistent, so nodes may be reopened
+            for k in range(offsets[v], offsets[v + 1]):
+                w = targets[k]
+                length = d + weights[k]
+                if length < dist.get(w, float('inf')):
+                    dist[w] = length
+                    preds[w] = v
+                    if w not in h:
+                        h[w] = heuristic(w)
+                    heappush(fringe, (length + h[w], next(c), length, w))
+        else:
+            return float('inf'), None
+
+        path = []
+        v = target
+        while v is not None:
+            path.append(v)
+            v = preds[v]
+        path.reverse()
+        return dist[target], path
+
+    def shortest_path(self, source, target, method=None):
+        """
+        Shortest path between two nodes of the Marnet
+
+        Parameters
+        ----------
+        source, target : nodes of the Marnet
+        method : str, default None
+            `dijkstra`, `astar` or `ch`, by default the contraction hierarchy
+            is used when it was built, and Dijkstra otherwise
+
+        Returns
+        -------
+        A list of nodes or None if there is no path
+        """
+        if method is None:
+            method = 'ch' if self.ch is not None else 'dijkstra'
+
+        i, j = self.index[source], self.index[target]
+        if method == 'ch':
+            if self.ch is None:
+                raise ValueError('Contraction hierarchy was not built, use build_ch first')
+            _, path = self.ch.query(i, j)
+        elif method == 'astar':
+            _, path = self.astar(i, j)
+        elif method == 'dijkstra':
+            _, path = self.dijkstra(i, j)
+        else:
+            raise ValueError(f'Unknown shortest path method: {method}')
+        return [self.nodes[k] for k in path] if path else None
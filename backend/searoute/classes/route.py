@@ -0,0 +1,104 @@
+import numpy as np
+
+from .. import geodesy
+from ..geodesy import conversions
+
+
+class Route:
+    """
+    A route line indexed by the distance along it, for position lookups.
+
+    The distance from the start to every point is computed once, a position
+    at a distance is then found by binary search and interpolated on the
+    great circle between the two points around it.
+
+    Parameters
+    ----------
+    coords : list of (lon, lat), the route line
+    units : str, default `km`
+        unit of the distances, see `geodesy.conversions`
+
+    """
+
+    def __init__(self, coords, units='km'):
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        if not len(self.coords):
+            raise ValueError('A route needs at least one point')
+        self.units = units
+        self.cumulative = geodesy.cumulative_lengths(self.coords, units)
+
+    @classmethod
+    def from_feature(cls, feature, units='km'):
+        """A route of a LineString Feature, ex. returned by `searoute`"""
+        return cls(feature['geometry']['coordinates'], units)
+
+    def __len__(self):
+        return len(self.coords)
+
+    @property
+    def length(self):
+        """Total length in `units`"""
+        return float(self.cumulative[-1])
+
+    def locate(self, distance):
+        """
+        Segments of distances along the route
+
+        Parameters
+        ----------
+        distance : a distance or an array of distances in `units`, clipped to the route
+
+        Returns
+        -------
+        A tuple of (index, fraction) arrays, the position is at `fraction` of
+        the segment from point `index` to point `index + 1`
+        """
+        d = np.clip(np.asarray(distance, dtype=np.float64).reshape(-1), 0, self.length)
+        if len(self.coords) < 2:
+            return np.zeros(len(d), dtype=np.int64), np.zeros(len(d))
+        index = np.clip(np.searchsorted(self.cumulative, d, side='right') - 1, 0, len(self.coords) - 2)
+        start, end = self.cumulative[index], self.cumulative[index + 1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = np.where(end > start, (d - start) / (end - start), 0.0)
+        return index, fraction
+
+    def position(self, distance):
+        """
+        Positions at distances along the route
+
+        Parameters
+        ----------
+        distance : a distance or an array of distances in `units`, clipped to the route
+
+        Returns
+        -------
+        A (lon, lat) tuple for a single distance, else an array of (lon, lat)
+        """
+        index, fraction = self.locate(distance)
+        if len(self.coords) < 2:
+            points = self.coords[index]
+        else:
+            points = geodesy.interpolate(self.coords[index], self.coords[index + 1], fraction)
+        if np.ndim(distance) == 0:
+            return tuple(points[0].tolist())
+        return points
+
+    def distance_at_time(self, hours, speed_knot):
+        """Distance in `units` sailed in `hours` at `speed_knot`, clipped to the route"""
+        sailed = np.asarray(hours, dtype=np.float64) * speed_knot / conversions['naut'] * conversions[self.units]
+        return np.minimum(sailed, self.length)
+
+    def position_at_time(self, hours, speed_knot):
+        """
+        Positions after sailing for some hours at a constant speed from the start
+
+        Parameters
+        ----------
+        hours : a time or an array of times in hours
+        speed_knot : speed of the boat in knots
+
+        Returns
+        -------
+        Like `position`, the end of the route once it is reached
+        """
+        return self.position(self.distance_at_time(hours, speed_knot))
@@ -0,0 +1,125 @@
+"""
+Great-circle distances on whole arrays of coordinates.
+
+Coordinates are (lon, lat) in degrees, lengths use the haversine formula on a
+sphere of the mean Earth radius, like `utils.distance`, and are converted
+with `conversions`.
+
+"""
+import numpy as np
+
+avg_earth_radius_km = 6371008.8
+conversions = {
+    "km": 0.001,
+    "m": 1.0,
+    "mi": 0.000621371192,
+    "ft": 3.28084,
+    "in": 39.370,
+    "deg": 1 / 111325,
+    "cen": 100,
+    "rad": 1 / avg_earth_radius_km,
+    "naut": 0.000539956803,
+    "yd": 0.914411119,
+    "nm": 0.00071506154
+}
+
+
+def _coords(coords):
+    return np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+
+
+def distances(coords1, coords2, units='km'):
+    """
+    Distances between two arrays of points, element by element
+
+    Parameters
+    ----------
+    coords1 : array-like of (lon, lat), from locations
+    coords2 : array-like of (lon, lat) of the same length, to locations
+    units : a unit, default is `km`
+
+    Returns
+    -------
+    An array of distances in `units`
+    """
+    c1, c2 = _coords(coords1), _coords(coords2)
+    lon1, lat1 = np.radians(c1[:, 0]), np.radians(c1[:, 1])
+    lon2, lat2 = np.radians(c2[:, 0]), np.radians(c2[:, 1])
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.sin((lon2 - lon1) / 2) ** 2 * np.cos(lat1) * np.cos(lat2)
+    a = np.clip(a, 0.0, 1.0)
+    return 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a)) * avg_earth_radius_km * conversions[units]
+
+
+def leg_lengths(coords, units='km'):
+    """
+    Length of every segment of a line
+
+    Parameters
+    ----------
+    coords : array-like of (lon, lat), the line
+    units : a unit, default is `km`
+
+    Returns
+    -------
+    An array of `len(coords) - 1` lengths in `units`
+    """
+    c = _coords(coords)
+    return distances(c[:-1], c[1:], units)
+
+
+def cumulative_lengths(coords, units='km'):
+    """
+    Distance along a line from its start to each of its points
+
+    Returns
+    -------
+    An array of `len(coords)` distances in `units`, starting at 0, empty for an empty line
+    """
+    c = _coords(coords)
+    if not len(c):
+        return np.zeros(0)
+    return np.concatenate(([0.0], np.cumsum(leg_lengths(c, units))))
+
+
+def line_length(coords, units='km'):
+    """Total length of a line in `units`, 0 for less than two points"""
+    if coords is None or len(coords) < 2:
+        return 0.0
+    return float(leg_lengths(coords, units).sum())
+
+
+def interpolate(coords1, coords2, fractions):
+    """
+    Points at fractions of the great circles between two arrays of points
+
+    Parameters
+    ----------
+    coords1 : array-like of (lon, lat), start points
+    coords2 : array-like of (lon, lat) of the same length, end points
+    fractions : array-like of fractions, 0 at the start points and 1 at the end points
+
+    Returns
+    -------
+    An array of (lon, lat), longitudes follow the start points, ex. beyond 180
+    when they do, so lines crossing the antimeridian stay continuous
+    """
+    c1, c2 = _coords(coords1), _coords(coords2)
+    f = np.asarray(fractions, dtype=np.float64).reshape(-1)[:, None]
+
+    def unit(c):
+        lon, lat = np.radians(c[:, 0]), np.radians(c[:, 1])
+        return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+    u1, u2 = unit(c1), unit(c2)
+    angle = np.arccos(np.clip(np.einsum('ij,ij->i', u1, u2), -1.0, 1.0))[:, None]
+    sin_angle = np.sin(angle)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slerp = (np.sin((1 - f) * angle) * u1 + np.sin(f * angle) * u2) / sin_angle
+    # on very short segments the linear interpolation is as good and stable
+    short = (sin_angle < 1e-12)[:, 0]
+    slerp[short] = (u1 + f * (u2 - u1))[short]
+
+    lon = np.degrees(np.arctan2(slerp[:, 1], slerp[:, 0]))
+    lat = np.degrees(np.arctan2(slerp[:, 2], np.hypot(slerp[:, 0], slerp[:, 1])))
+    lon += 360 * np.round((c1[:, 0] - lon) / 360)
+    return np.column_stack((lon, lat))
@@ -0,0 +1,175 @@
+"""
+Compact encoding of GeoJSON feature collections, ex. the precalculated isochrones.
+
+Coordinates are quantized and delta encoded as encoded polylines (the format of
+the Google Maps API: latitude then longitude, `precision` decimals). In a
+collection of contours most lines belong to several features, the lines of the
+farther days holding the ones of the closer days, so lines are stored once in
+groups with the indexes of the features they belong to, and merged into longer
+lines within a group. A compact collection looks like::
+
+    {"type": "CompactFeatureCollection", "encoding": "polyline", "precision": 5,
+     "features": [{"properties": {...}, "geometry": {"type": "MultiLineString"}}, ...],
+     "lines": [[[0, 1, 2], ["_p~iF~ps|U_ulLnnqC", ...]], ...]}
+
+Features of other geometries keep their coordinates, each list of positions
+replaced by its encoded polyline, points are left as they are. `expand` turns
+it back into GeoJSON, the same lines drawn with possibly fewer, longer line
+strings.
+
+"""
+import shapely
+
+COMPACT_TYPE = 'CompactFeatureCollection'
+
+
+def _encode_value(value, chunks):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+
+
+def encode(coords, precision=5):
+    """
+    Encoded polyline of a list of positions
+
+    Parameters
+    ----------
+    coords : list of (lon, lat)
+    precision : int, default 5
+        decimals kept, 5 is about a meter
+
+    Returns
+    -------
+    A str
+    """
+    factor = 10 ** precision
+    chunks = []
+    prev_lat = prev_lon = 0
+    for lon, lat in coords:
+        lat, lon = round(lat * factor), round(lon * factor)
+        _encode_value(lat - prev_lat, chunks)
+        _encode_value(lon - prev_lon, chunks)
+        prev_lat, prev_lon = lat, lon
+    return ''.join(chunks)
+
+
+def decode(text, precision=5):
+    """
+    Positions as [lon, lat] of an encoded polyline, see `encode`
+
+    Raises
+    ------
+    ValueError : the text is not an encoded polyline, ex. a character out of the
+        encoding, a value cut short or a latitude without its longitude
+    """
+    factor = 10 ** precision
+    coords = []
+    values = [0, 0]
+    index = k = 0
+    while index < len(text):
+        result = shift = 0
+        while True:
+            if index == len(text):
+                raise ValueError('Encoded polyline ends in the middle of a value')
+            byte = ord(text[index]) - 63
+            if not 0 <= byte < 0x40:
+                raise ValueError(f'Character {text[index]!r} is not in an encoded polyline')
+            index += 1
+            result |= (byte & 0x1f) << shift
+            shift += 5
+            if byte < 0x20:
+                break
+        values[k] += ~(result >> 1) if result & 1 else result >> 1
+        if k == 1:
+            coords.append([values[1] / factor, values[0] / factor])
+        k = 1 - k
+    if k == 1:
+        raise ValueError('Encoded polyline has an odd number of values')
+    return coords
+
+
+def _map_positions(coordinates, fn):
+    # applies fn to every list of positions of nested GeoJSON coordinates
+    if coordinates and isinstance(coordinates, str):
+        return fn(coordinates)
+    if coordinates and isinstance(coordinates[0][0], (int, float)):
+        return fn(coordinates)
+    return [_map_positions(c, fn) for c in coordinates]
+
+
+def is_compact(doc):
+    return isinstance(doc, dict) and doc.get('type') == COMPACT_TYPE
+
+
+def compact(geojson, precision=5, merge=True):
+    """
+    Compact form of a GeoJSON FeatureCollection
+
+    Parameters
+    ----------
+    geojson : a FeatureCollection dict
+    precision : int, default 5
+        decimals of the coordinates
+    merge : bool, default True
+        merge the lines of a group that touch end to end
+
+    Returns
+    -------
+    A dict, see the module documentation
+    """
+    features = []
+    groups = {}
+    line_members = {}
+    for i, feature in enumerate(geojson['features']):
+        geometry = feature['geometry']
+        if geometry['type'] in ('LineString', 'MultiLineString'):
+            lines = [geometry['coordinates']] if geometry['type'] == 'LineString' else geometry['coordinates']
+            for line in lines:
+                line_members.setdefault(tuple(map(tuple, line)), []).append(i)
+            features.append({'properties': feature['properties'], 'geometry': {'type': 'MultiLineString'}})
+        elif geometry['type'] == 'Point':
+            features.append({'properties': feature['properties'], 'geometry': geometry})
+        else:
+            coordinates = _map_positions(geometry['coordinates'], lambda c: encode(c, precision))
+            features.append({'properties': feature['properties'],
+                             'geometry': {'type': geometry['type'], 'coordinates': coordinates}})
+
+    # a line drawn twice in a feature is kept once
+    for line, members in line_members.items():
+        groups.setdefault(tuple(sorted(set(members))), []).append(line)
+
+    encoded = []
+    for members, lines in groups.items():
+        if merge:
+            merged = shapely.line_merge(shapely.MultiLineString([list(line) for line in lines]))
+            lines = [part.coords for part in shapely.get_parts(merged)]
+        encoded.append([list(members), [encode(line, precision) for line in lines]])
+
+    return {'type': COMPACT_TYPE, 'encoding': 'polyline', 'precision': precision,
+            'features': features, 'lines': encoded}
+
+
+def expand(doc):
+    """GeoJSON FeatureCollection of a compact collection, see `compact`"""
+    precision = doc.get('precision', 5)
+    lines = [[] for _ in doc['features']]
+    for members, encoded in doc.get('lines', []):
+        decoded = [decode(text, precision) for text in encoded]
+        for i in members:
+            lines[i].extend(decoded)
+
+    features = []
+    for feature, feature_lines in zip(doc['features'], lines):
+        geometry = feature['geometry']
+        if geometry['type'] == 'Point':
+            coordinates = geometry['coordinates']
+        elif 'coordinates' in geometry:
+            coordinates = _map_positions(geometry['coordinates'], lambda text: decode(text, precision))
+        else:
+            coordinates = feature_lines
+        features.append({'type': 'Feature', 'properties': feature['properties'],
+                         'geometry': {'type': geometry['type'], 'coordinates': coordinates}})
+    return {'type': 'FeatureCollection', 'features': features}
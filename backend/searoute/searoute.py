@@ -1,24 +1,52 @@
 
 from .classes import ports, marnet, passages
-from .utils import get_duration, distance_length, from_nodes_edges_set, process_route, validate_lon_lat
+from .classes.context import RoutingContext
+from .utils import get_duration, distance_length, from_nodes_edges_set, process_route, validate_lon_lat, conversions, order_waypoints
 from geojson import Feature, LineString
 
 from functools import lru_cache
-from copy import copy
+import os
+import warnings
+
+def _load_snapshot(kind):
+    # snapshots are optional, build them with `python -m searoute.snapshot`
+    from . import snapshot
+    name, loader = {
+        'marnet': (snapshot.MARNET_SNAPSHOT, snapshot.load_marnet),
+        'ports': (snapshot.PORTS_SNAPSHOT, snapshot.load_ports),
+    }[kind]
+    path = os.path.join(snapshot.default_dir(), name)
+    if not os.path.exists(path):
+        return None
+    try:
+        if not snapshot.is_current(path):
+            # the network data changed since the snapshot was built
+            warnings.warn(f'{path} is out of date, rebuilding it')
+            snapshot.ensure(os.path.dirname(path))
+        return loader(path)
+    except (OSError, ValueError) as e:
+        warnings.warn(f'{e}, loading the packaged dicts instead')
+        return None
 
 @lru_cache(maxsize=None)
 def setup_P():
+    P = _load_snapshot('ports')
+    if P is not None:
+        return P
     from .data.ports_dict import edge_list as port_e, node_list as port_n
     return from_nodes_edges_set(ports.Ports(), port_n, port_e)
 
 @lru_cache(maxsize=None)
 def setup_M():
+    M = _load_snapshot('marnet')
+    if M is not None:
+        return M
     from .data.marnet_dict import edge_list as marnet_e, node_list as marnet_n
     return from_nodes_edges_set(marnet.Marnet(), marnet_n, marnet_e)
 
 
 
-def searoute(origin, destination, units='km', speed_knot=24, append_orig_dest=False, restrictions=[passages.Passage.northwest], include_ports=False, port_params={}, M:marnet.Marnet=None, P:ports.Ports=None, return_passages:bool = False):
+def searoute(origin, destination, units='km', speed_knot=24, append_orig_dest=False, restrictions=[passages.Passage.northwest], include_ports=False, port_params={}, M:marnet.Marnet=None, P:ports.Ports=None, return_passages:bool = False, method:str = None):
     """
     Calculates the shortest sea route between two points on Earth.
 
@@ -44,6 +72,9 @@ def searoute(origin, destination, units='km', speed_knot=24, append_orig_dest=Fa
                             If there are many ports then the result will be a list of GeoJson Features, instead of an object of GeoJson Feature.
                             Preferred ports with share = 0 will be ignored.
     return_passages : boolean to return traversed passages (default is `False`)
+    method : shortest path method, `dijkstra`, `astar` or `ch`, default None which means
+        the contraction hierarchy when it was built and Dijkstra otherwise. All of them give
+        the same length of path, between paths of the same length they may choose another one
 
     Returns
     -------
@@ -51,9 +82,9 @@ def searoute(origin, destination, units='km', speed_knot=24, append_orig_dest=Fa
     """
 
     if M is None:
-        M = copy(setup_M())
+        M = setup_M()
     if P is None:
-        P = copy(setup_P())
+        P = setup_P()
     # Validate origin input
     validate_lon_lat(origin)
     # Validate destination input
@@ -69,9 +100,8 @@ def searoute(origin, destination, units='km', speed_knot=24, append_orig_dest=Fa
     o_origin = tuple(origin)
     o_destination = tuple(destination)
 
-    # updating restrictions
-    if restrictions is not None:
-        M.restrictions = restrictions
+    # the shared networks are never changed, restrictions only select a routing profile
+    context = RoutingContext(M, P, restrictions, method)
 
     # H = nx.subgraph_view(G, filter_edge=filter_edge)
 
@@ -94,8 +124,8 @@ def searoute(origin, destination, units='km', speed_knot=24, append_orig_dest=Fa
         to_cty = country_pod if country_restricted else None
        
         # set origin as closest port
-        closestPortOrigin = P.query(
-            terminals=only_terminals, cty=country_pol, to_cty=to_cty, strict=country_restricted_strict).kdtree.query(origin)
+        closestPortOrigin = context.closest_port(
+            origin, terminals=only_terminals, cty=country_pol, to_cty=to_cty, strict=country_restricted_strict)
         if closestPortOrigin:
             origin = closestPortOrigin
             port_origin = P.nodes[origin].copy()
@@ -103,8 +133,8 @@ def searoute(origin, destination, units='km', speed_knot=24, append_orig_dest=Fa
                 port_origin.pop(country_restricted_key)
 
         # set destination as closest port
-        closestPortDest = P.query(
-            terminals=only_terminals, cty=country_pod).kdtree.query(destination)
+        closestPortDest = context.closest_port(
+            destination, terminals=only_terminals, cty=country_pod)
         if closestPortDest:
             destination = closestPortDest
             port_dest = P.nodes[destination].copy()
@@ -113,7 +143,7 @@ def searoute(origin, destination, units='km', speed_knot=24, append_orig_dest=Fa
     
     # Get shortest route from the Marnet network 
     # if origin or destination is not present in M, searches from the closest one
-    shortest_route_by_distance = M.shortest_path(o_origin, o_destination)
+    shortest_route_by_distance = context.shortest_path(o_origin, o_destination)
 
     if shortest_route_by_distance is None:
         shortest_route_by_distance = []
@@ -162,3 +192,181 @@ def searoute(origin, destination, units='km', speed_knot=24, append_orig_dest=Fa
         feature.properties['traversed_passages'] = passages.Passage.filter_valid_passages(traversed_passages)
 
     return feature
+
+
+def matrix(origins, destinations=None, units='km', restrictions=[passages.Passage.northwest], M:marnet.Marnet=None):
+    """
+    Lengths of the shortest sea routes between many origins and destinations.
+
+    Points are snapped like `searoute` does, and one graph search is run per
+    unique snapped origin instead of one per pair.
+
+    Parameters
+    ----------
+    origins : a list of points as array lon, lat format ex. [[0.35156, 50.06419], ...]
+    destinations : a list of points, default None which means the origins
+    units : default is `km` = kilometers, see `searoute` for the others
+    restrictions : an list of restrictions of paths to avoid, default restricted ['northwest']
+
+    Returns
+    -------
+    A list of lists of lengths in `units`, `matrix[i][j]` from `origins[i]` to `destinations[j]`,
+    None when there is no route
+    """
+    if M is None:
+        M = setup_M()
+    if destinations is None:
+        destinations = origins
+    for point in list(origins) + list(destinations):
+        validate_lon_lat(point)
+
+    context = RoutingContext(M, restrictions=restrictions)
+    lengths = context.route_lengths([tuple(p) for p in origins], [tuple(p) for p in destinations])
+    scale = conversions[units] / conversions['km']
+    return [[length * scale if length != float('inf') else None for length in row] for row in lengths.tolist()]
+
+
+def waypoint_order(points, restrictions=[passages.Passage.northwest], M:marnet.Marnet=None):
+    """
+    Order of the waypoints of a sea route with the shortest total length,
+    the first and the last waypoints stay in place.
+
+    The lengths between the waypoints are computed like `matrix`, with one
+    graph search per waypoint, see `utils.order_waypoints` for the ordering.
+
+    Parameters
+    ----------
+    points : a list of points as array lon, lat format ex. [[0.35156, 50.06419], ...]
+    restrictions : an list of restrictions of paths to avoid, default restricted ['northwest']
+
+    Returns
+    -------
+    A list of the indexes of `points` in the order to visit them
+    """
+    if M is None:
+        M = setup_M()
+    for point in points:
+        validate_lon_lat(point)
+    if len(points) <= 3:
+        return list(range(len(points)))
+
+    points = [tuple(p) for p in points]
+    lengths = RoutingContext(M, restrictions=restrictions).route_lengths(points, points)
+    return order_waypoints(lengths.tolist())
+
+
+def waypoints(points, units='km', speed_knot=24, restrictions=[passages.Passage.northwest], optimize=False, M:marnet.Marnet=None, return_passages:bool = False):
+    """
+    Shortest sea route through a list of waypoints.
+
+    Legs are routed like `searoute` on one shared routing profile, a leg
+    repeated in the route, ex. in a port rotation, is searched once.
+
+    Parameters
+    ----------
+    points : a list of at least two points as array lon, lat format ex. [[0.35156, 50.06419], ...]
+    units : default is `km` = kilometers, see `searoute` for the others
+    speed_knot : speed of the boat, default is `24` knots
+    restrictions : an list of restrictions of paths to avoid, default restricted ['northwest']
+    optimize : boolean, default False
+        visit the intermediate waypoints in the order giving the shortest route, see `waypoint_order`
+    return_passages : boolean to return traversed passages (default is `False`)
+
+    Returns
+    -------
+    a Feature (geojson) of a LineString of the whole route with parameters : `units`, `length`, `duration_hours`,
+    `order` the indexes of `points` in the order they are visited and `legs` a list of objects
+    with `from`, `to` (indexes of `points`), `length` and `duration_hours` of every leg
+    """
+    if M is None:
+        M = setup_M()
+    if len(points) < 2:
+        raise ValueError('At least two points are needed to build a route')
+    for point in points:
+        validate_lon_lat(point)
+
+    order = waypoint_order(points, restrictions, M) if optimize else list(range(len(points)))
+    context = RoutingContext(M, restrictions=restrictions)
+
+    paths = {}
+    nodes = []
+    bounds = []
+    for a, b in zip(order[:-1], order[1:]):
+        leg = (tuple(points[a]), tuple(points[b]))
+        if leg not in paths:
+            paths[leg] = context.shortest_path(*leg) or []
+        path = paths[leg]
+        start = len(nodes)
+        # consecutive legs share the node of their waypoint
+        if nodes and path and nodes[-1] == path[0]:
+            start -= 1
+            path = path[1:]
+        nodes.extend(path)
+        bounds.append((start, len(nodes)))
+
+    ls, traversed_passages = process_route(nodes, M, return_passages)
+
+    legs = []
+    for a, b, (start, end) in zip(order[:-1], order[1:], bounds):
+        length = distance_length(ls[start:end], units=units)
+        legs.append({'from': a, 'to': b, 'length': length,
+                     'duration_hours': get_duration(speed_knot, length, units)})
+    total_length = sum(leg['length'] for leg in legs)
+
+    feature = Feature(geometry=LineString(ls), properties={
+                      'length': total_length, 'units': units,
+                      'duration_hours': get_duration(speed_knot, total_length, units),
+                      'order': order, 'legs': legs})
+
+    if return_passages:
+        feature.properties['traversed_passages'] = passages.Passage.filter_valid_passages(traversed_passages)
+
+    return feature
+
+
+@lru_cache(maxsize=4)
+def _wave_field(path, mtime):
+    from .wavefield import WaveField
+    return WaveField.load(path)
+
+
+def fastest_route(origin, destination, field, speed_knot=24, depart=None, units='km', restrictions=[passages.Passage.northwest], M:marnet.Marnet=None):
+    """
+    Fastest sea route through the waves of a forecast.
+
+    The time to sail an edge of the network depends on the wave heights where
+    and when it is sailed (see `wavefield.speed_factor`), so the route may go
+    around a storm or wait for it to pass instead of taking the shortest way.
+
+    Parameters
+    ----------
+    origin : origin location as array lon, lat format ex. [0.35156, 50.06419]
+    destination : destination location as array lon, lat format
+    field : a `WaveField` or the path of a wave field snapshot
+    speed_knot : speed of the boat in calm sea, default is `24` knots
+    depart : time of departure in seconds since the epoch, default the first time of the field
+    units : default is `km` = kilometers, see `searoute` for the others
+    restrictions : an list of restrictions of paths to avoid, default restricted ['northwest']
+
+    Returns
+    -------
+    a Feature (geojson) of a LineString of the route with parameters : `units`, `length`,
+    `duration_hours` including the waits, `departure` and `arrival` in seconds since the epoch
+    """
+    if M is None:
+        M = setup_M()
+    validate_lon_lat(origin)
+    validate_lon_lat(destination)
+    if isinstance(field, str):
+        field = _wave_field(field, os.path.getmtime(field))
+    depart = field.time0 if depart is None else depart
+
+    nodes, hours = M.fastest_path(tuple(origin), tuple(destination), field, speed_knot, depart, restrictions)
+    if nodes is None:
+        raise Exception(f'No route found between {origin} and {destination}')
+    ls, _ = process_route(nodes, M, False)
+    length = distance_length(ls, units=units)
+
+    return Feature(geometry=LineString(ls), properties={
+                   'length': length, 'units': units, 'duration_hours': hours,
+                   'departure': depart, 'arrival': depart + hours * 3600})
@@ -0,0 +1,308 @@
+"""
+Binary snapshots of the Marnet and Ports networks.
+
+A snapshot file is laid out as:
+
+- 8 bytes magic `SRGRAPH\\0`, then the format version and the header length as uint32
+- a JSON header with metadata and the dtype, shape and offset of each array
+- the raw arrays, each aligned on 64 bytes
+
+Arrays are read with `numpy.frombuffer` over a read-only memory map, so loading
+is zero-copy and the pages are shared by every process reading the same file.
+The header keeps the hash of the file the network was built from, a snapshot
+whose source changed since is out of date and rebuilt by `ensure`.
+
+Build the snapshots of the packaged data with::
+
+    python -m searoute.snapshot
+
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from .classes.csr import CSRGraph
+
+MAGIC = b'SRGRAPH\x00'
+FORMAT_VERSION = 1
+ALIGN = 64
+
+MARNET_SNAPSHOT = 'marnet.srg'
+PORTS_SNAPSHOT = 'ports.srg'
+
+PACKAGE_DIR = os.path.dirname(__file__)
+
+
+def default_dir():
+    """Folder of the snapshots, `SEAROUTE_SNAPSHOT_DIR` or the package data folder"""
+    return os.environ.get('SEAROUTE_SNAPSHOT_DIR') or os.path.join(PACKAGE_DIR, 'data')
+
+
+def _aligned(size):
+    return (size + ALIGN - 1) // ALIGN * ALIGN
+
+
+def write_snapshot(path, arrays, meta=None):
+    """
+    Write arrays and metadata to a snapshot file
+
+    Parameters
+    ----------
+    path : file to write
+    arrays : dict of name to numpy array
+    meta : dict of JSON serializable metadata
+    """
+    header = {'meta': meta or {}, 'arrays': {}}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = _aligned(offset + array.nbytes)
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _aligned(len(MAGIC) + 8 + len(header_bytes))
+
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    # unique per process, several workers may build the same snapshot
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<II', FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.write(b'\x00' * (data_start + header['arrays'][name]['offset'] - f.tell()))
+            f.write(array.tobytes())
+    # replace atomically, readers may have the previous file mapped
+    os.replace(tmp_path, path)
+
+
+def source_of(path):
+    """
+    Source of a network as stored in a snapshot header
+
+    Parameters
+    ----------
+    path : the file the network is built from, ex. `marnet_dict.py` or a geojson
+
+    Returns
+    -------
+    A dict of the path, relative to the package when it is in it, and the SHA-1 of the file
+    """
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    path = os.path.abspath(path)
+    if os.path.commonpath([path, os.path.abspath(PACKAGE_DIR)]) == os.path.abspath(PACKAGE_DIR):
+        path = os.path.relpath(path, PACKAGE_DIR)
+    return {'path': path, 'sha1': h.hexdigest()}
+
+
+def _source_path(source):
+    return os.path.join(PACKAGE_DIR, source['path'])
+
+
+def read_meta(path):
+    """Metadata of a snapshot file, read from its header only"""
+    with open(path, 'rb') as f:
+        head = f.read(len(MAGIC) + 8)
+        if head[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a searoute snapshot')
+        version, header_len = struct.unpack_from('<II', head, len(MAGIC))
+        if version != FORMAT_VERSION:
+            raise ValueError(f'Unsupported snapshot version {version} in {path}')
+        return json.loads(f.read(header_len).decode('utf-8'))['meta']
+
+
+def read_snapshot(path):
+    """
+    Map a snapshot file in memory
+
+    Returns
+    -------
+    A tuple of (dict of name to read-only numpy array, metadata dict)
+    """
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if mm[:len(MAGIC)] != MAGIC:
+        raise ValueError(f'{path} is not a searoute snapshot')
+    version, header_len = struct.unpack_from('<II', mm, len(MAGIC))
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported snapshot version {version} in {path}, rebuild it with `python -m searoute.snapshot`')
+
+    start = len(MAGIC) + 8
+    header = json.loads(bytes(mm[start:start + header_len]).decode('utf-8'))
+    data_start = _aligned(start + header_len)
+
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'], dtype=np.int64))
+        arrays[name] = np.frombuffer(
+            mm, dtype=dtype, count=count, offset=data_start + spec['offset']).reshape(spec['shape'])
+    return arrays, header['meta']
+
+
+def is_current(path):
+    """
+    Whether `path` is a snapshot of the current format version built from its
+    source as it is now. A snapshot whose source is not around, ex. shipped
+    without it, is taken as current.
+    """
+    try:
+        meta = read_meta(path)
+    except (OSError, ValueError):
+        return False
+    source = meta.get('source')
+    if not source:
+        return False
+    source_path = _source_path(source)
+    return not os.path.exists(source_path) or source_of(source_path)['sha1'] == source['sha1']
+
+
+def save_marnet(M, path, source=None):
+    """Write the CSR storage of a Marnet to a snapshot, `source` as given by `source_of`"""
+    csr = M.csr
+    write_snapshot(path, {
+        'coords': csr.coords,
+        'offsets': csr.offsets,
+        'targets': csr.targets,
+        'weights': csr.weights,
+        'passages': csr.passages,
+    }, {'kind': 'marnet', 'passage_names': csr.passage_names, 'crs': M.graph.get('crs'), 'source': source})
+
+
+def load_marnet(path):
+    """Load a Marnet from a snapshot, its arrays stay memory mapped"""
+    from .classes.marnet import Marnet
+
+    arrays, meta = read_snapshot(path)
+    if meta.get('kind') != 'marnet':
+        raise ValueError(f'{path} is not a Marnet snapshot')
+
+    M = Marnet()
+    if meta.get('crs'):
+        M.graph['crs'] = meta['crs']
+    return M.load_csr(CSRGraph(
+        arrays['coords'], arrays['offsets'], arrays['targets'],
+        arrays['weights'], arrays['passages'], meta['passage_names']))
+
+
+def save_ports(P, path, source=None):
+    """Write the Ports nodes to a snapshot, port attributes are kept in the header"""
+    nodes = list(P.nodes(data=True))
+    write_snapshot(path, {
+        'coords': np.asarray([n for n, _ in nodes], dtype=np.float64).reshape(-1, 2),
+    }, {'kind': 'ports', 'nodes': [data for _, data in nodes], 'crs': P.graph.get('crs'), 'source': source})
+
+
+def load_ports(path):
+    """Load Ports from a snapshot"""
+    from .classes.ports import Ports
+    from .utils import from_nodes_edges_set
+
+    arrays, meta = read_snapshot(path)
+    if meta.get('kind') != 'ports':
+        raise ValueError(f'{path} is not a Ports snapshot')
+
+    node_set = {tuple(c): data for c, data in zip(arrays['coords'].tolist(), meta['nodes'])}
+    P = from_nodes_edges_set(Ports(), node_set, None)
+    if meta.get('crs'):
+        P.graph['crs'] = meta['crs']
+    return P
+
+
+def build(folder=None, marnet_geojson=None, ports_geojson=None):
+    """
+    Build the Marnet and Ports snapshots
+
+    Parameters
+    ----------
+    folder : output folder, default is `default_dir()`
+    marnet_geojson : str, default None
+        build the Marnet from a geojson (ex. `marnet_searoute.geojson`) instead of `marnet_dict.py`
+    ports_geojson : str, default None
+        build the Ports from a geojson instead of `ports_dict.py`
+
+    Returns
+    -------
+    A tuple of the written (marnet, ports) paths
+    """
+    from .classes.marnet import Marnet
+    from .classes.ports import Ports
+    from .utils import from_nodes_edges_set
+
+    folder = folder or default_dir()
+
+    if marnet_geojson:
+        M = Marnet.from_geojson(marnet_geojson)
+    else:
+        from .data import marnet_dict
+        M = from_nodes_edges_set(Marnet(), marnet_dict.node_list, marnet_dict.edge_list)
+
+    if ports_geojson:
+        P = Ports.from_geojson(ports_geojson)
+    else:
+        from .data import ports_dict
+        P = from_nodes_edges_set(Ports(), ports_dict.node_list, ports_dict.edge_list)
+
+    marnet_path = os.path.join(folder, MARNET_SNAPSHOT)
+    ports_path = os.path.join(folder, PORTS_SNAPSHOT)
+    save_marnet(M, marnet_path, source_of(marnet_geojson or marnet_dict.__file__))
+    save_ports(P, ports_path, source_of(ports_geojson or ports_dict.__file__))
+    return marnet_path, ports_path
+
+
+def _geojson_source(path):
+    # the geojson a snapshot was built from, to be rebuilt from it again
+    try:
+        source = read_meta(path).get('source')
+    except (OSError, ValueError):
+        return None
+    if source and source['path'].endswith('.geojson') and os.path.exists(_source_path(source)):
+        return _source_path(source)
+    return None
+
+
+def ensure(folder=None):
+    """
+    Build the snapshots in `folder` unless they are already there and current,
+    see `is_current`. Out of date snapshots are rebuilt from the same sources.
+
+    Every process loading the networks maps the same read-only files, so the
+    pages of the graph arrays are shared by all of them, ex. uvicorn workers.
+    Routing profiles still build private copies, see `RoutingProfile`.
+
+    Returns
+    -------
+    The folder of the snapshots
+    """
+    folder = folder or default_dir()
+    paths = [os.path.join(folder, name) for name in (MARNET_SNAPSHOT, PORTS_SNAPSHOT)]
+    if not all(is_current(path) for path in paths):
+        build(folder, *[_geojson_source(path) for path in paths])
+    return folder
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the binary snapshots of the Marnet and Ports networks')
+    parser.add_argument('--out', default=None, help='output folder, default is the package data folder or SEAROUTE_SNAPSHOT_DIR')
+    parser.add_argument('--marnet-geojson', default=None, help='build the Marnet from a geojson instead of marnet_dict.py')
+    parser.add_argument('--ports-geojson', default=None, help='build the Ports from a geojson instead of ports_dict.py')
+    args = parser.parse_args(argv)
+
+    for path in build(args.out, args.marnet_geojson, args.ports_geojson):
+        print(f'Wrote {path} ({os.path.getsize(path)} bytes)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import gzip
+import os
+import threading
+import zipfile
+
+import pytest
+
+from searoute.archive import Archive, pack
+
+
+@pytest.fixture
+def folder(tmp_path):
+    folder = tmp_path / 'precalc'
+    folder.mkdir()
+    (folder / 'a.json').write_bytes(b'{"a": 1}' * 500)
+    (folder / 'b.json').write_bytes(os.urandom(3000))
+    return folder
+
+
+def test_members_and_gzip(folder, tmp_path):
+    path = str(tmp_path / 'data.zip')
+    assert pack(str(folder), path) == 2
+    archive = Archive(path)
+    assert len(archive) == 2 and 'precalc/a.json' in archive
+    member = archive.get('precalc/a.json')
+    content = (folder / 'a.json').read_bytes()
+    assert member.encodings == ('gzip',) and member.length() == len(content)
+
+    encoded = archive.read(member, 'gzip')
+    assert len(encoded) == member.length('gzip') < len(content)
+    assert gzip.decompress(encoded) == content
+    assert archive.read(member) == content
+    assert member.etag() != member.etag('gzip')
+    assert archive.get('missing') is None
+
+
+def test_ranges(folder, tmp_path):
+    path = str(tmp_path / 'data.zip')
+    pack(str(folder), path)
+    archive = Archive(path)
+    member = archive.get('precalc/a.json')
+    content = archive.read(member)
+    encoded = archive.read(member, 'gzip')
+    for start, end in [(0, 5), (3, 20), (5, 5), (100, 10 ** 6), (len(encoded) - 6, len(encoded))]:
+        assert archive.read(member, start=start, end=end) == content[start:end]
+        assert archive.read(member, 'gzip', start, end) == encoded[start:end]
+
+
+def test_stored_and_split(folder, tmp_path):
+    path = str(tmp_path / 'data.zip')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as zf:
+        zf.writestr('b.json', (folder / 'b.json').read_bytes())
+        zf.writestr('a.json', (folder / 'a.json').read_bytes(), zipfile.ZIP_DEFLATED)
+    data = open(path, 'rb').read()
+    parts = []
+    for k, start in enumerate(range(0, len(data), 1000)):
+        parts.append(str(tmp_path / f'data_part_{k:02d}'))
+        open(parts[-1], 'wb').write(data[start:start + 1000])
+
+    archive = Archive(*parts)
+    stored = archive.get('b.json')
+    assert stored.encodings == ()
+    assert archive.read(stored, start=900, end=2100) == (folder / 'b.json').read_bytes()[900:2100]
+
+    results = []
+    member = archive.get('a.json')
+    threads = [threading.Thread(target=lambda: results.append(archive.read(member))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [(folder / 'a.json').read_bytes()] * 8
+    archive.close()
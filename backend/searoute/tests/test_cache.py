@@ -0,0 +1,75 @@
+from searoute import cache
+from searoute.cache import RouteCache, SQLiteRouteCache, route_key
+from searoute.classes.passages import Passage
+from searoute.tests.test_utils import get_grid_marnet
+
+
+def test_lru_eviction_by_entries():
+    c = RouteCache(max_entries=2)
+    c.set('a', 1)
+    c.set('b', 2)
+    assert c.get('a') == 1
+    c.set('c', 3)
+    assert c.get('b') is None
+    assert c.get('a') == 1 and c.get('c') == 3
+    assert c.hits == 3 and c.misses == 1
+
+
+def test_eviction_by_bytes():
+    c = RouteCache(max_bytes=10)
+    c.set('a', 'xxxx')
+    c.set('b', 'yyyy')
+    assert len(c) == 1 and c.nbytes == 6
+    c.set('too big', 'z' * 20)
+    assert 'too big' not in c and 'b' in c
+
+
+def test_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    c = RouteCache(ttl=10)
+    c.set('a', 1)
+    now[0] += 5
+    assert c.get('a') == 1
+    now[0] += 6
+    assert c.get('a') is None
+    assert len(c) == 0 and c.nbytes == 0
+
+
+def test_route_key_on_snapped_nodes():
+    M = get_grid_marnet()
+    key = route_key(M, [(0.1, 0.1), (5.1, 4.9)], restrictions=[])
+    assert route_key(M, [(-0.1, 0.05), (4.9, 5.2)], restrictions=[]) == key
+    assert route_key(M, [(0.1, 0.1), (5.1, 4.9)], restrictions=[Passage.suez]) != key
+    assert route_key(M, [(0.1, 0.1), (5.1, 4.9)], restrictions=[], units='nm') != key
+    assert route_key(M, [(0.1, 0.1), (3, 3), (5.1, 4.9)], restrictions=[]) != key
+
+
+def test_sqlite_cache_persists(tmp_path):
+    path = str(tmp_path / 'routes.sqlite')
+    c = SQLiteRouteCache(path)
+    c.set('a', {'type': 'Feature', 'coordinates': [[0.5, 1.5]]})
+    assert c.get('a') == {'type': 'Feature', 'coordinates': [[0.5, 1.5]]}
+    assert c.get('b') is None
+
+    # another process or a restart opens the same file
+    assert SQLiteRouteCache(path).get('a') == {'type': 'Feature', 'coordinates': [[0.5, 1.5]]}
+
+
+def test_sqlite_cache_bounds(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'time', lambda: now[0])
+    c = SQLiteRouteCache(str(tmp_path / 'routes.sqlite'), max_entries=3, ttl=1000, check_every=1)
+    for i in range(3):
+        now[0] += SQLiteRouteCache.TOUCH_INTERVAL + 1
+        c.set(str(i), i)
+    now[0] += SQLiteRouteCache.TOUCH_INTERVAL + 1
+    assert c.get('0') == 0
+    c.set('3', 3)
+    # least recently used is evicted
+    assert len(c) == 3 and c.get('1') is None and c.get('0') == 0
+
+    now[0] += 2000
+    assert c.get('0') is None
+    c.compact()
+    assert len(c) == 0
@@ -0,0 +1,56 @@
+import random
+
+import networkx as nx
+import pytest
+from searoute.classes.ch import ContractionHierarchy
+from searoute.tests.test_utils import get_grid_marnet
+
+
+def test_ch_same_length_as_dijkstra():
+    M = get_grid_marnet()
+    M.restrictions = []
+    M.build_ch()
+    nodes = list(M.nodes)
+    for _ in range(100):
+        a, b = random.sample(nodes, 2)
+        path = M.shortest_path(a, b)
+        expected = nx.shortest_path_length(M, a, b, weight='weight')
+        assert path[0] == a and path[-1] == b
+        assert nx.path_weight(M, path, 'weight') == expected
+
+
+def test_ch_restrictions():
+    M = get_grid_marnet()
+    M.restrictions = ['suez']
+    M.build_ch()
+    path = M.shortest_path((0, 0), (11, 11))
+    assert len(path) > 2
+
+    M.restrictions = []
+    M.build_ch()
+    assert M.shortest_path((0, 0), (11, 11)) == [(0, 0), (11, 11)]
+
+
+def test_ch_persisted(tmp_path):
+    M = get_grid_marnet()
+    path = str(tmp_path / 'ch.npz')
+    ch = M.build_ch(path=path)
+    loaded = ContractionHierarchy.load(path)
+    assert loaded.rank == ch.rank
+    assert loaded.up == ch.up
+    assert loaded.signature == ch.signature
+
+    # a changed graph must not reuse the stored hierarchy
+    M.add_edge((0, 0), (5, 5), weight=1)
+    assert M.build_ch(path=path).signature != ch.signature
+
+
+def test_ch_damaged_file_rebuilt(tmp_path):
+    M = get_grid_marnet()
+    path = tmp_path / 'ch.npz'
+    # ex. a file another worker was still writing
+    path.write_bytes(b'PK\x03\x04 truncated')
+    with pytest.warns(UserWarning):
+        ch = M.build_ch(path=str(path))
+    assert ContractionHierarchy.load(str(path)).signature == ch.signature
+    assert not list(tmp_path.glob('*.tmp'))
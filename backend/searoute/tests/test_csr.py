@@ -0,0 +1,53 @@
+import searoute as sr
+from searoute.classes.csr import CSRGraph
+from searoute.classes.passages import Passage
+from searoute.tests.test_utils import get_grid_marnet
+
+
+def get_dicts():
+    nodes = {(0, 0): {'x': 0, 'y': 0}, (1, 0): {'x': 1, 'y': 0}, (1, 1): {'x': 1, 'y': 1}}
+    edges = {
+        (0, 0): {(1, 0): {'weight': 111.2}, (1, 1): {'weight': 100.5, 'passage': Passage.suez}},
+        (1, 0): {(0, 0): {'weight': 111.2}, (1, 1): {'weight': 0.1}},
+        (1, 1): {(1, 0): {'weight': 0.1}, (0, 0): {'weight': 100.5, 'passage': Passage.suez}},
+    }
+    return nodes, edges
+
+
+def test_from_dicts():
+    csr = CSRGraph.from_dicts(*get_dicts())
+    assert csr.n == 3 and csr.m == 6
+    assert csr.offsets.tolist() == [0, 2, 4, 6]
+    assert csr.targets.tolist() == [1, 2, 0, 2, 1, 0]
+    assert csr.passage_names == [None, Passage.suez]
+    assert csr.passages.tolist() == [0, 1, 0, 0, 0, 1]
+    assert csr.weights64().tolist() == [111.2, 100.5, 111.2, 0.1, 0.1, 100.5]
+
+
+def test_to_dicts():
+    nodes, edges = get_dicts()
+    node_set, adj = CSRGraph.from_dicts(nodes, edges).to_dicts()
+    assert node_set == nodes
+    assert adj == edges
+    # undirected edges share their data like NetworkX does
+    assert adj[(0, 0)][(1, 0)] is adj[(1, 0)][(0, 0)]
+
+
+def test_networkx_adapter_is_lazy():
+    M = sr.from_nodes_edges_set(sr.Marnet(), *get_dicts())
+    assert M.shortest_path((0, 0), (1, 1), restrictions=[]) == [(0, 0), (1, 1)]
+    assert M.shortest_path((0, 0), (1, 1), restrictions=[Passage.suez]) == [(0, 0), (1, 0), (1, 1)]
+    assert M.get_edge_data((0, 0), (1, 1)) == {'weight': 100.5, 'passage': Passage.suez}
+    assert '_adj' not in M.__dict__
+
+    assert M.number_of_edges() == 3
+    assert '_adj' in M.__dict__
+
+
+def test_networkx_changes_compiled_back():
+    M = get_grid_marnet()
+    n, m = M.csr.n, M.csr.m
+    M.remove_edge((0, 0), (1, 0))
+    assert M.csr.m == m - 2
+    M.add_edge((0, 0), (20, 20))
+    assert M.csr.n == n + 1
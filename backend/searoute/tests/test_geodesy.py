@@ -0,0 +1,37 @@
+import random
+
+import numpy as np
+
+from searoute import geodesy
+from searoute.utils import distance, distance_length
+
+
+def get_line(n=200, seed=5):
+    rng = random.Random(seed)
+    return [(rng.uniform(-180, 180), rng.uniform(-89, 89)) for _ in range(n)]
+
+
+def test_same_as_distance():
+    line = get_line()
+    for units in ('km', 'naut', 'mi'):
+        expected = [distance(a, b, units) for a, b in zip(line[:-1], line[1:])]
+        assert np.allclose(geodesy.leg_lengths(line, units), expected, rtol=1e-12)
+    assert geodesy.distances([(0, 0)], [(180, 0)])[0] == distance((0, 0), (180, 0))
+
+
+def test_cumulative_and_total():
+    line = get_line()
+    cumulative = geodesy.cumulative_lengths(line, 'naut')
+    assert len(cumulative) == len(line) and cumulative[0] == 0
+    assert np.all(np.diff(cumulative) >= 0)
+    assert abs(cumulative[-1] - geodesy.line_length(line, 'naut')) < 1e-6
+    assert abs(distance_length(line, 'naut') - sum(distance(a, b, 'naut') for a, b in zip(line[:-1], line[1:]))) < 1e-6
+
+
+def test_short_lines():
+    assert geodesy.line_length([]) == 0
+    assert geodesy.line_length([(1, 2)]) == 0
+    assert len(geodesy.cumulative_lengths([])) == 0
+    assert list(geodesy.cumulative_lengths([(1, 2)])) == [0]
+    assert len(geodesy.leg_lengths([(1, 2)])) == 0
+    assert distance_length([]) == 0 and distance_length(None) == 0
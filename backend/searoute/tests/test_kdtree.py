@@ -0,0 +1,52 @@
+import random
+
+import numpy as np
+
+from searoute.classes.kdtree import KDTree
+
+
+def get_points(n=500, seed=3):
+    random.seed(seed)
+    return [(random.uniform(-180, 180), random.uniform(-80, 80)) for _ in range(n)]
+
+
+def test_query_matches_brute_force():
+    points = get_points()
+    tree = KDTree(points)
+    queries = get_points(200, seed=4)
+    coords = np.asarray(points)
+    for q in queries:
+        expected = points[int(np.argmin(((coords - q) ** 2).sum(axis=1)))]
+        assert tree.query(q) == expected
+    assert tree.query_many(queries) == [tree.query(q) for q in queries]
+
+
+def test_knn_and_radius():
+    points = get_points()
+    tree = KDTree(points)
+    queries = np.asarray(get_points(50, seed=5))
+    brute = np.sqrt(((queries[:, None] - np.asarray(points)[None]) ** 2).sum(axis=2))
+
+    distances, indexes = tree.knn(queries, k=4)
+    assert np.allclose(distances, np.sort(brute, axis=1)[:, :4])
+    assert np.allclose(np.take_along_axis(brute, indexes, axis=1), distances)
+
+    for row, found in zip(brute, tree.radius(queries, 20)):
+        assert sorted(found.tolist()) == np.flatnonzero(row <= 20).tolist()
+
+
+def test_haversine_across_antimeridian():
+    tree = KDTree([(170.0, 0.0), (-179.9, 0.0), (0.0, 0.0)], metric='haversine')
+    assert tree.query((179.9, 0.0)) == (-179.9, 0.0)
+    distances, _ = tree.knn([(179.9, 0.0)], k=1)
+    assert abs(distances[0, 0] - 22.24) < 0.01
+    assert [i.tolist() for i in tree.radius([(179.9, 0.0)], 1200)] == [[1, 0]]
+
+
+def test_add_point():
+    tree = KDTree()
+    for point in [(0, 0), (10, 10)]:
+        tree.add_point(point)
+    assert tree.query((9, 8)) == (10, 10)
+    tree.add_point((8, 8))
+    assert tree.query((9, 8)) == (8, 8)
@@ -0,0 +1,51 @@
+import json
+
+import numpy as np
+import pytest
+
+from searoute import polyline
+
+
+def test_encode_decode():
+    # the example of the Google Maps documentation
+    coords = [(-120.2, 38.5), (-120.95, 40.7), (-126.453, 43.252)]
+    assert polyline.encode(coords) == '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+    assert polyline.decode('_p~iF~ps|U_ulLnnqC_mqNvxq`@') == [list(c) for c in coords]
+
+    rng = np.random.default_rng(0)
+    coords = np.column_stack([rng.uniform(-180, 180, 200), rng.uniform(-90, 90, 200)])
+    assert np.allclose(polyline.decode(polyline.encode(coords, 6), 6), coords, atol=5e-7)
+    assert polyline.decode(polyline.encode([])) == []
+
+
+@pytest.mark.parametrize('text', ['_p~iF~ps|U_', '_p~iF~ps|U_ulL', '_p~iF ~ps|U'])
+def test_decode_invalid(text):
+    with pytest.raises(ValueError):
+        polyline.decode(text)
+
+
+def segments(geometry):
+    return {tuple(sorted(map(tuple, np.round(line, 5).tolist()))) for line in geometry['coordinates']}
+
+
+def test_compact_shares_lines():
+    a, b, c, d = [0.1, 0.2], [1.3, 0.2], [1.3, 1.7], [-179.9, 5.0]
+    day1 = {'type': 'MultiLineString', 'coordinates': [[a, b]]}
+    day2 = {'type': 'MultiLineString', 'coordinates': [[a, b], [b, c], [c, d]]}
+    polygon = {'type': 'Polygon', 'coordinates': [[a, b, c, a]]}
+    geojson = {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'properties': {'day': 2}, 'geometry': day2},
+        {'type': 'Feature', 'properties': {'day': 1}, 'geometry': day1},
+        {'type': 'Feature', 'properties': {'day': 3}, 'geometry': polygon},
+    ]}
+    doc = json.loads(json.dumps(polyline.compact(geojson)))
+    assert polyline.is_compact(doc) and not polyline.is_compact(geojson)
+    # [a, b] stored once for both days, [b, c] and [c, d] merged
+    assert sorted((members, len(lines)) for members, lines in doc['lines']) == [([0], 1), ([0, 1], 1)]
+
+    expanded = polyline.expand(doc)
+    assert [f['properties'] for f in expanded['features']] == [{'day': 2}, {'day': 1}, {'day': 3}]
+    assert segments(expanded['features'][1]['geometry']) == segments(day1)
+    points = {tuple(p) for line in expanded['features'][0]['geometry']['coordinates'] for p in line}
+    assert points == {tuple(a), tuple(b), tuple(c), tuple(d)}
+    assert expanded['features'][2]['geometry'] == polygon
@@ -91,4 +91,8 @@ class TestPortProps(unittest.TestCase):
         self.assertNotEqual(chArea.properties['name'], result[0][3])
         self.assertEqual(eurArea.properties['name'], result[0][3])
         
-        
\ No newline at end of file
+        
+
+def test_query_is_cached():
+    P = sr.setup_P()
+    assert P.query(terminals=True, cty='FR') is P.query(terminals=True, cty='FR')
@@ -0,0 +1,127 @@
+import random
+
+import networkx as nx
+import numpy as np
+import searoute as sr
+from searoute.geodesy import distances
+from searoute.classes.passages import Passage
+from searoute.tests.test_utils import get_grid_marnet
+
+
+def test_profile_cached_by_restrictions():
+    M = get_grid_marnet()
+    profile = M.profile([Passage.suez, Passage.panama])
+    assert M.profile([Passage.panama, Passage.suez]) is profile
+    assert M.profile([Passage.suez]) is not profile
+
+    M.add_edge((0, 0), (3, 3), weight=1)
+    assert M.profile([Passage.suez, Passage.panama]) is not profile
+
+
+def test_profile_removes_restricted_edges():
+    M = get_grid_marnet()
+    restricted = M.profile([Passage.suez])
+    allowed = M.profile([])
+    assert len(list(allowed.edges())) == len(list(restricted.edges())) + 1
+
+    assert M.shortest_path((0, 0), (11, 11), restrictions=[]) == [(0, 0), (11, 11)]
+    assert len(M.shortest_path((0, 0), (11, 11), restrictions=[Passage.suez])) > 2
+
+
+def test_profile_same_path_as_networkx():
+    M = get_grid_marnet()
+    nodes = list(M.nodes)
+    restrictions = [Passage.suez]
+    weight = lambda u, v, d: d['weight'] if d.get('passage') not in restrictions else float('inf')
+    for _ in range(100):
+        a, b = random.sample(nodes, 2)
+        assert M.shortest_path(a, b, restrictions) == nx.shortest_path(M, a, b, weight=weight)
+
+
+def test_query_cached_subgraph():
+    M = get_grid_marnet()
+    H = M.query(restrictions=[Passage.suez])
+    assert M.query(restrictions=[Passage.suez]) is H
+    assert not H.has_edge((0, 0), (11, 11))
+    assert H.number_of_edges() == M.number_of_edges() - 1
+
+
+def test_astar_same_length_as_dijkstra():
+    M = sr.setup_M()
+    profile = M.profile([Passage.northwest])
+    routes = [
+        ([-5.6615, 43.5357], [-6.9508, 37.2614]),  # gijon - huelva
+        ([139.77, 35.62], [-122.42, 37.8]),  # tokyo - san francisco, over the antimeridian
+        ([0.35156, 50.06419], [117.42187, 39.36827]),
+    ]
+    for origin, destination in routes:
+        i = profile.index[M.kdtree.query(origin)]
+        j = profile.index[M.kdtree.query(destination)]
+        length, path = profile.astar(i, j)
+        expected, _ = profile.dijkstra(i, j)
+        assert path[0] == i and path[-1] == j
+        assert abs(length - expected) < 1e-6
+
+
+def test_fastest_path_calm_is_shortest():
+    M = get_grid_marnet()
+    profile = M.profile([Passage.suez])
+    factors = np.ones((len(profile.nodes), 1))
+    length = lambda u, v, d: distances([u], [v], 'naut')[0] if d.get('passage') is None else float('inf')
+    for _ in range(20):
+        a, b = random.sample(list(M.nodes), 2)
+        hours, path = profile.fastest_path(profile.index[a], profile.index[b], factors, 10)
+        expected = nx.shortest_path_length(M, a, b, weight=length)
+        assert abs(hours * 10 - expected) < 1e-6
+        assert path[0] == profile.index[a] and path[-1] == profile.index[b]
+
+
+def test_fastest_path_waits_and_fifo():
+    M = get_grid_marnet()
+    profile = M.profile([Passage.suez])
+    i, j = profile.index[(0, 0)], profile.index[(11, 11)]
+    calm, _ = profile.fastest_path(i, j, np.ones((len(profile.nodes), 1)), 10)
+    # a slow first hour is waited out
+    factors = np.ones((len(profile.nodes), 3))
+    factors[:, 0] = 0.1
+    hours, _ = profile.fastest_path(i, j, factors, 10)
+    assert abs(hours - (1 + calm)) < 1e-9
+
+    # leaving later never arrives earlier
+    rng = np.random.default_rng(1)
+    factors = rng.uniform(0.3, 1, (len(profile.nodes), 48))
+    arrivals = [profile.fastest_path(i, j, factors, 10, start=start, step=2)[0] for start in np.arange(0, 40, 0.5)]
+    assert all(b >= a - 1e-9 for a, b in zip(arrivals, arrivals[1:]))
+    assert all(a >= calm for a in arrivals)
+
+    M.add_edge((50, 50), (51, 51))
+    profile = M.profile([Passage.suez])
+    factors = np.ones((len(profile.nodes), 1))
+    assert profile.fastest_path(profile.index[(0, 0)], profile.index[(50, 50)], factors, 10) == (float('inf'), None)
+
+
+def test_snap_great_circle():
+    M = sr.Marnet()
+    M.add_edge((10, 80), (0, 78))
+    M.add_edge((178, 0), (-179.9, 0))
+    # planar distance picks (0, 78), the great-circle distance is shorter to (10, 80)
+    assert M.snap((0, 80)) == [(10, 80)]
+    assert M.snap((179.9, 0)) == [(-179.9, 0)]
+    assert M.snap((0, 80), k=2) == [(10, 80), (0, 78)]
+
+
+def test_snap_skips_nodes_cut_off_by_restrictions():
+    M = get_grid_marnet()
+    M.add_edge((20, 20), (21, 21), passage=Passage.suez)
+    M.add_edge((30, 30), (31, 30))
+    M.add_edge((31, 30), (31, 31))
+
+    labels, sizes = M.profile([Passage.suez]).components()
+    assert sorted(sizes.tolist()) == [1, 1, 3, 144]
+    assert M.snap((20.2, 20.2), restrictions=[Passage.suez]) == [(11, 11)]
+    assert M.snap((20.2, 20.2), restrictions=[]) == [(20, 20)]
+    assert M.snap((30.2, 30), restrictions=[Passage.suez], largest_component=True) == [(11, 11)]
+
+    # not connected, both ends are moved to the largest component
+    assert M.shortest_path((30.2, 30), (0, 0), restrictions=[Passage.suez])[0] == (11, 11)
+    assert M.shortest_path((30.2, 30), (31, 31.2), restrictions=[Passage.suez]) == [(30, 30), (31, 30), (31, 31)]
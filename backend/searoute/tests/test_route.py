@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+import searoute as sr
+from searoute import Route, geodesy
+
+
+def test_position_at_distance():
+    route = Route([(0, 0), (10, 0), (10, 10)], units='naut')
+    first = geodesy.distances([(0, 0)], [(10, 0)], 'naut')[0]
+    assert abs(route.length - geodesy.line_length(route.coords, 'naut')) < 1e-9
+    assert route.position(0) == (0, 0)
+    assert route.position(route.length) == (10, 10)
+    assert route.position(route.length * 2) == (10, 10)
+    assert np.allclose(route.position(first), (10, 0))
+    assert np.allclose(route.position(first / 2), (5, 0))
+    # on a meridian, great circle and linear interpolations agree
+    assert np.allclose(route.position(first + (route.length - first) / 4), (10, 2.5))
+
+
+def test_great_circle_interpolation():
+    route = Route([(-60, 50), (60, 50)])
+    middle = route.position(route.length / 2)
+    assert middle[0] == pytest.approx(0, abs=1e-9)
+    # the great circle goes north of the parallel
+    assert middle[1] > 60
+    points = route.position(np.linspace(0, route.length, 11))
+    assert np.allclose(np.diff(geodesy.cumulative_lengths(points)), route.length / 10)
+
+
+def test_antimeridian_and_time():
+    route = Route([(170, 0), (190, 0)], units='naut')
+    lon, lat = route.position(route.length / 2)
+    assert lon == pytest.approx(180) and lat == pytest.approx(0)
+    assert np.allclose(route.position_at_time(10, 12), route.position(120))
+    assert route.position_at_time([0, 1e6], 12).tolist() == [[170, 0], [190, 0]]
+
+
+def test_from_feature():
+    feature = sr.searoute([-3.7, 43.5], [-6.9, 37.2], units='naut')
+    route = Route.from_feature(feature, units='naut')
+    assert abs(route.length - feature['properties']['length']) < 1e-6
+    index, fraction = route.locate(route.length / 3)
+    assert route.cumulative[index[0]] <= route.length / 3 <= route.cumulative[index[0] + 1]
+    assert 0 <= fraction[0] <= 1
+    assert Route([(1, 2)]).position(5) == (1, 2)
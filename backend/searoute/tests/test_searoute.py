@@ -1,4 +1,12 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+from itertools import permutations
+
+import numpy as np
+
 import searoute as sr
+from searoute.wavefield import WaveField
+from searoute.utils import order_waypoints, path_length
 
 def test_passages():
     traj = sr.searoute([52.99, 25.01], [-61.87, 17.15], append_orig_dest=True, restrictions=['northwest', 'chili'], return_passages=True)
@@ -21,4 +29,123 @@ def test_rev_lat_lon_passages():
 
 
 
-    
\ No newline at end of file
+    
+
+
+def test_methods_same_route_length():
+    # tied paths may differ, their geometry is then measured a little differently
+    for origin, destination in [([0.35156, 50.06419], [117.42187, 39.36827]), ([52.99, 25.01], [-61.87, 17.15])]:
+        routes = [sr.searoute(origin, destination, units='naut', method=method, return_passages=True)
+                  for method in ('dijkstra', 'astar')]
+        lengths = [route['properties']['length'] for route in routes]
+        assert abs(lengths[0] - lengths[1]) < 1e-3 * lengths[0]
+        assert sorted(routes[0]['properties']['traversed_passages']) == sorted(routes[1]['properties']['traversed_passages'])
+
+
+def test_shared_networks_not_changed():
+    M = sr.setup_M()
+    restrictions = list(M.restrictions)
+    sr.searoute([52.99, 25.01], [-61.87, 17.15], restrictions=['suez'])
+    assert M.restrictions == restrictions
+
+
+def test_concurrent_restrictions():
+    queries = [(['suez'], ['ormuz', 'south_africa']), (['northwest', 'chili'], ['suez', 'ormuz', 'babalmandab', 'gibraltar'])] * 4
+
+    def passages(restrictions):
+        traj = sr.searoute([52.99, 25.01], [-61.87, 17.15], restrictions=restrictions, return_passages=True)
+        return sorted(traj['properties']['traversed_passages'])
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(passages, [r for r, _ in queries]))
+    assert results == [sorted(expected) for _, expected in queries]
+
+
+def test_matrix_same_lengths_as_searoute():
+    origins = [[52.99, 25.01], [140.02, 35.51]]
+    destinations = [[-61.87, 17.15], [-97.36, 27.81], [52.99, 25.01]]
+    lengths = sr.matrix(origins, destinations, units='naut', restrictions=['suez'])
+    for i, origin in enumerate(origins):
+        for j, destination in enumerate(destinations):
+            route = sr.searoute(origin, destination, units='naut', restrictions=['suez'])
+            assert abs(lengths[i][j] - route['properties']['length']) < 1e-6
+    assert lengths[0][2] == 0
+
+
+def test_matrix_one_search_per_origin_node():
+    M = sr.setup_M()
+    profile = M.profile(['northwest'])
+    calls = []
+    route_lengths = profile.route_lengths
+    profile.route_lengths = lambda source, targets: calls.append(source) or route_lengths(source, targets)
+    try:
+        sr.matrix([[52.99, 25.01], [52.9901, 25.0101], [140.02, 35.51]], [[-61.87, 17.15], [-97.36, 27.81]], M=M)
+    finally:
+        del profile.route_lengths
+    assert len(calls) == 2
+
+
+def test_waypoints_legs_like_searoute():
+    points = [[-3.7, 43.5], [-6.9, 37.2], [2.1, 41.3], [-6.9, 37.2]]
+    route = sr.waypoints(points, units='naut', speed_knot=12)
+    legs = route['properties']['legs']
+    assert [(leg['from'], leg['to']) for leg in legs] == [(0, 1), (1, 2), (2, 3)]
+    for leg in legs:
+        expected = sr.searoute(points[leg['from']], points[leg['to']], units='naut')
+        assert abs(leg['length'] - expected['properties']['length']) < 1e-6
+        assert abs(leg['duration_hours'] - leg['length'] / 12) < 1e-9
+    assert abs(route['properties']['length'] - sum(leg['length'] for leg in legs)) < 1e-6
+    coords = route['geometry']['coordinates']
+    assert coords[0] == sr.searoute(points[0], points[1])['geometry']['coordinates'][0]
+
+
+def test_waypoints_optimize():
+    points = [[-3.7, 43.5], [2.1, 41.3], [-9.1, 38.7], [-6.9, 37.2], [12.3, 45.4]]
+    route = sr.waypoints(points, units='naut', optimize=True)
+    assert route['properties']['order'] == [0, 2, 3, 1, 4]
+    assert route['properties']['length'] < sr.waypoints(points, units='naut')['properties']['length']
+    assert sr.waypoint_order(points[:3]) == [0, 1, 2]
+
+
+def test_order_waypoints():
+    rng = random.Random(3)
+    for n in range(4, 9):
+        pts = [(rng.random(), rng.random()) for _ in range(n)]
+        lengths = [[abs(a[0] - b[0]) + abs(a[1] - b[1]) for b in pts] for a in pts]
+        best = min(path_length([0, *p, n - 1], lengths) for p in permutations(range(1, n - 1)))
+        order = order_waypoints(lengths)
+        assert order[0] == 0 and order[-1] == n - 1
+        assert abs(path_length(order, lengths) - best) < 1e-12
+        heuristic = order_waypoints(lengths, exact_limit=0)
+        assert sorted(heuristic) == list(range(n)) and path_length(heuristic, lengths) >= best - 1e-12
+
+
+def test_order_waypoints_two_opt():
+    # 2-opt keeps reversing while it shortens the route, lengths not symmetric
+    rng = random.Random(5)
+    n = 30
+    lengths = [[0 if a == b else rng.random() for b in range(n)] for a in range(n)]
+    order = order_waypoints(lengths, exact_limit=0)
+    assert order[0] == 0 and order[-1] == n - 1 and sorted(order) == list(range(n))
+    length = path_length(order, lengths)
+    for i in range(1, n - 2):
+        for j in range(i + 1, n - 1):
+            assert path_length(order[:i] + order[i:j + 1][::-1] + order[j + 1:], lengths) >= length - 1e-9
+
+
+def test_fastest_route(tmp_path):
+    origin, destination = [-1.5, 46.5], [-9.5, 43.5]
+    shortest = sr.searoute(origin, destination, units='naut')['properties']['length']
+    calm = WaveField(np.zeros((2, 2, 2), dtype=np.float32), 30, -20, 30, 30, 1000, 3600)
+    route = sr.fastest_route(origin, destination, calm, speed_knot=12, units='naut')
+    assert abs(route['properties']['length'] - shortest) / shortest < 0.01
+    assert abs(route['properties']['duration_hours'] * 12 - route['properties']['length']) < 1
+    assert route['properties']['departure'] == 1000
+
+    # a storm on the way for two days, the route goes around it or waits
+    storm = lambda lat, lon, hour: 5.0 if 44 <= lat <= 47 and -8 <= lon <= -3 and hour < 48 else 0.5
+    WaveField.from_function(storm, -20, 30, 10, 55, 0.5, 1000, 96).save(str(tmp_path / 'waves.srg'))
+    stormy = sr.fastest_route(origin, destination, str(tmp_path / 'waves.srg'), speed_knot=12, depart=1000)
+    hours = stormy['properties']['duration_hours']
+    assert route['properties']['duration_hours'] < hours < route['properties']['duration_hours'] / 0.85
+    assert stormy['properties']['arrival'] == 1000 + hours * 3600
@@ -0,0 +1,82 @@
+import struct
+
+import pytest
+
+from searoute import snapshot
+from searoute.classes.passages import Passage
+from searoute.classes.ports import Ports
+from searoute.tests.test_utils import get_grid_marnet
+
+
+def test_marnet_snapshot_roundtrip(tmp_path):
+    M = get_grid_marnet()
+    path = str(tmp_path / snapshot.MARNET_SNAPSHOT)
+    snapshot.save_marnet(M, path)
+
+    loaded = snapshot.load_marnet(path)
+    for name in ('coords', 'offsets', 'targets', 'passages'):
+        assert getattr(loaded.csr, name).tolist() == getattr(M.csr, name).tolist()
+    assert loaded.csr.passage_names == M.csr.passage_names
+    # arrays are mapped read-only from the file
+    assert not loaded.csr.targets.flags.writeable
+
+    for restrictions in ([], [Passage.suez]):
+        assert loaded.shortest_path((0, 0), (11, 11), restrictions=restrictions) == \
+            M.shortest_path((0, 0), (11, 11), restrictions=restrictions)
+    assert loaded.get_edge_data((0, 0), (11, 11)) == {'weight': 1.0, 'passage': Passage.suez}
+
+
+def test_ports_snapshot_roundtrip(tmp_path):
+    P = Ports()
+    P.add_node((0.5, 1.5), x=0.5, y=1.5, port='AAAAA', name='A', cty='X', to_cty=['Y'], t=1.0)
+    P.add_node((2.25, -3.0), x=2.25, y=-3.0, port='BBBBB', name='B', cty='Y', to_cty=[], t=None)
+    path = str(tmp_path / snapshot.PORTS_SNAPSHOT)
+    snapshot.save_ports(P, path)
+
+    loaded = snapshot.load_ports(path)
+    assert dict(loaded.nodes(data=True)) == dict(P.nodes(data=True))
+    assert loaded.kdtree.query((2, -2)) == (2.25, -3.0)
+
+
+def test_snapshot_version_is_checked(tmp_path):
+    path = str(tmp_path / snapshot.MARNET_SNAPSHOT)
+    snapshot.save_marnet(get_grid_marnet(), path)
+    with open(path, 'r+b') as f:
+        f.seek(len(snapshot.MAGIC))
+        f.write(struct.pack('<I', snapshot.FORMAT_VERSION + 1))
+    with pytest.raises(ValueError):
+        snapshot.load_marnet(path)
+
+
+def test_ensure_builds_once(tmp_path):
+    folder = snapshot.ensure(str(tmp_path))
+    path = tmp_path / snapshot.MARNET_SNAPSHOT
+    assert snapshot.is_current(str(path)) and snapshot.is_current(str(tmp_path / snapshot.PORTS_SNAPSHOT))
+
+    mtime = path.stat().st_mtime_ns
+    assert snapshot.ensure(folder) == folder
+    assert path.stat().st_mtime_ns == mtime
+
+
+def test_unrestricted_profile_shares_mapped_arrays(tmp_path):
+    path = str(tmp_path / snapshot.MARNET_SNAPSHOT)
+    snapshot.save_marnet(get_grid_marnet(), path)
+    M = snapshot.load_marnet(path)
+    assert M.profile([]).targets is M.csr.targets
+    assert M.profile([Passage.suez]).csr.m == M.csr.m
+    assert len(M.profile([Passage.suez]).targets) == M.csr.m - 2
+
+
+def test_snapshot_out_of_date_when_source_changes(tmp_path):
+    source = tmp_path / 'network.geojson'
+    source.write_text('{"type": "FeatureCollection", "features": []}')
+    path = str(tmp_path / snapshot.MARNET_SNAPSHOT)
+    snapshot.save_marnet(get_grid_marnet(), path, snapshot.source_of(str(source)))
+    assert snapshot.read_meta(path)['source']['path'] == str(source)
+    assert snapshot.is_current(path)
+
+    source.write_text('{"type": "FeatureCollection", "features": [], "changed": true}')
+    assert not snapshot.is_current(path)
+    # snapshots without a source are rebuilt too, they predate the check
+    snapshot.save_marnet(get_grid_marnet(), path)
+    assert not snapshot.is_current(path)
@@ -1,6 +1,9 @@
 import random
 import string
 
+from searoute.classes.marnet import Marnet
+from searoute.classes.passages import Passage
+
 
 
 
@@ -15,4 +18,18 @@ def get_suisse_poly():
 
 def generate_random_word(length):
     letters = string.ascii_letters
-    return ''.join(random.choice(letters) for _ in range(length))
\ No newline at end of file
+    return ''.join(random.choice(letters) for _ in range(length))
+
+
+def get_grid_marnet(size=12, seed=7):
+    random.seed(seed)
+    M = Marnet()
+    for x in range(size):
+        for y in range(size):
+            if x + 1 < size:
+                M.add_edge((x, y), (x + 1, y), weight=random.randint(1, 20))
+            if y + 1 < size:
+                M.add_edge((x, y), (x, y + 1), weight=random.randint(1, 20))
+    # a restricted shortcut across the grid
+    M.add_edge((0, 0), (size - 1, size - 1), weight=1, passage=Passage.suez)
+    return M
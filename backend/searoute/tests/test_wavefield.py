@@ -0,0 +1,63 @@
+import asyncio
+
+import numpy as np
+
+from searoute import Route
+from searoute.weather import LocalProvider
+from searoute.wavefield import WaveField, speed_factor
+
+
+def linear(lat, lon, hour):
+    return 1 + 0.1 * lat + 0.02 * lon + 0.01 * hour
+
+
+def test_sample_interpolates_linear_fields():
+    field = WaveField.from_function(linear, -10, 30, 10, 50, 0.5, time0=1000, hours=12)
+    rng = np.random.default_rng(0)
+    lon, lat = rng.uniform(-10, 10, 50), rng.uniform(30, 50, 50)
+    hours = rng.uniform(0, 11, 50)
+    assert np.allclose(field.sample(lon, lat, 1000 + hours * 3600), linear(lat, lon, hours), atol=1e-5)
+    # out of the grid, the border values
+    assert np.isclose(field.sample(-30, 40, 1000), linear(40, -10, 0))
+    assert np.isclose(field.sample(0, 40, 1000 + 100 * 3600), linear(40, 0, 11))
+
+
+def test_sample_missing_and_global():
+    values = np.array([[[1.0, np.nan], [3.0, np.nan]]], dtype=np.float32)
+    field = WaveField(values, lat0=0, lon0=0, dlat=1, dlon=1, time0=0, dt=3600)
+    assert np.isclose(field.sample(0.5, 0.5, 0), 2.0)
+    assert np.isnan(WaveField(values[:, :, 1:], 0, 0, 1, 1, 0, 3600).sample(0, 0, 0))
+
+    values = np.arange(4, dtype=np.float32).reshape(1, 1, 4)
+    field = WaveField(values, lat0=0, lon0=-180, dlat=1, dlon=90, time0=0, dt=3600)
+    assert field.global_lons
+    assert np.isclose(field.sample(-45, 0, 0), 1.5)
+    # between the last column and the first one
+    assert np.allclose(field.sample([135, -225, 157.5], 0, 0), [1.5, 1.5, 0.75])
+
+
+def test_save_load(tmp_path):
+    field = WaveField.from_function(linear, 0, 0, 2, 2, 1, time0=0, hours=3)
+    field.save(str(tmp_path / 'waves.srg'))
+    loaded = WaveField.load(str(tmp_path / 'waves.srg'))
+    assert loaded.meta() == field.meta()
+    assert not loaded.values.flags.writeable
+    assert np.allclose(loaded.sample([0.5, 1.5], [1, 2], 3600), field.sample([0.5, 1.5], [1, 2], 3600))
+
+
+def test_sail():
+    route = Route([(0, 0), (0, 10)], units='naut')
+    calm = WaveField(np.zeros((1, 2, 2), dtype=np.float32), -1, -1, 20, 20, 0, 3600)
+    voyage = calm.sail(route, 12, step=10)
+    assert np.isclose(voyage['hours'][-1], route.length / 12)
+    assert len(voyage['distance']) == len(voyage['lon']) == int(np.ceil(route.length / 10)) + 1
+
+    rough = WaveField(np.full((1, 2, 2), 3.5, dtype=np.float32), -1, -1, 20, 20, 0, 3600)
+    assert np.isclose(rough.sail(route, 12)['hours'][-1], route.length / (12 * 0.85))
+    assert speed_factor([0, 2.5, 3.5, np.nan]).tolist() == [1, 0.95, 0.85, 1]
+
+
+def test_fetch():
+    field = asyncio.run(WaveField.fetch(LocalProvider(hours=24), 0, 40, 1, 41, 0.5))
+    assert field.shape == (24, 3, 3)
+    assert np.isclose(field.values[5, 1, 2], LocalProvider.default_wave_height(40.5, 1, 5))
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from searoute import weather
+from searoute.weather import LocalProvider, WeatherProvider, WeatherService
+
+
+class SlowProvider(LocalProvider):
+    """Counts the fetches running at the same time"""
+
+    def __init__(self, fail=False):
+        super().__init__(wave_height=lambda lat, lon, hour: lat + hour, hours=24)
+        self.fail = fail
+        self.running = 0
+        self.max_running = 0
+
+    async def hourly(self, lat, lon):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        if self.fail:
+            return None
+        return await super().hourly(lat, lon)
+
+
+def test_cells_and_cache():
+    provider = SlowProvider()
+    service = WeatherService(provider, resolution=0.5)
+    points = [(10.1, 40.1), (10.2, 40.2), (-170.0, 20.0), (190.0, 20.0), (12.0, 41.0)]
+
+    forecasts = asyncio.run(service.forecasts(points))
+    assert provider.calls == 3 and provider.max_running == 3
+    assert forecasts[0] is forecasts[1] and forecasts[2] is forecasts[3]
+    assert forecasts[0]['wave_height'][2] == 40.0 + 2
+
+    assert asyncio.run(service.value((10.0, 40.0), 5)) == 45.0
+    assert service.cached_value((12.1, 41.1), 1) == 42.0
+    assert service.cached_value((0, 0), 1) is None
+    assert asyncio.run(service.value((12.0, 41.0), 100, default=-1)) == -1
+    assert provider.calls == 3
+
+
+def test_concurrent_requests_share_fetches():
+    provider = SlowProvider()
+    service = WeatherService(provider)
+
+    async def main():
+        return await asyncio.gather(*[service.forecasts([(1, 2), (3, 4)]) for _ in range(5)])
+
+    results = asyncio.run(main())
+    assert provider.calls == 2
+    assert all(r[0] is results[0][0] for r in results)
+
+
+def test_failures_not_cached():
+    provider = SlowProvider(fail=True)
+    service = WeatherService(provider)
+    assert asyncio.run(service.forecasts([(1, 2)])) == [None]
+    assert asyncio.run(service.value((1, 2), 0, default=0.5)) == 0.5
+    assert len(service.cache) == 0
+
+
+def test_new_forecast_run(monkeypatch):
+    now = [6 * 3600 * 1000 + 10]
+    monkeypatch.setattr(weather.time, 'time', lambda: now[0])
+    provider = LocalProvider()
+    service = WeatherService(provider, run_hours=6)
+    asyncio.run(service.forecasts([(1, 2)]))
+    now[0] += 3600
+    asyncio.run(service.forecasts([(1, 2)]))
+    assert provider.calls == 1
+    now[0] += 6 * 3600
+    asyncio.run(service.forecasts([(1, 2)]))
+    assert provider.calls == 2
+
+
+def test_provider_interface():
+    assert LocalProvider().default_wave_height(0, 0, 0) >= 0
+    # a provider without a forecast can not be created
+    with pytest.raises(TypeError):
+        WeatherProvider()
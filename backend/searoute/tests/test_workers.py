@@ -0,0 +1,102 @@
+import asyncio
+import math
+import threading
+
+import pytest
+
+from searoute import workers
+from searoute.workers import PoolBusy, WorkerPool
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_coalescing():
+    calls = []
+    release = threading.Event()
+
+    def work(x):
+        calls.append(x)
+        release.wait(5)
+        return {'x': x}
+
+    async def main():
+        pool = WorkerPool(workers=0)
+        tasks = [asyncio.ensure_future(pool.run('a', work, 1)) for _ in range(3)]
+        tasks.append(asyncio.ensure_future(pool.run('b', work, 2)))
+        await asyncio.sleep(0.05)
+        assert pool.pending == 2
+        release.set()
+        results = await asyncio.gather(*tasks)
+        assert pool.pending == 0
+        return pool, results
+
+    pool, results = run(main())
+    assert sorted(calls) == [1, 2]
+    assert results[0] is results[1] is results[2]
+    assert results[3] == {'x': 2}
+    assert pool.coalesced == 2
+
+
+def test_backpressure():
+    release = threading.Event()
+
+    async def main():
+        pool = WorkerPool(workers=0, max_pending=2)
+        tasks = [asyncio.ensure_future(pool.run(k, release.wait, 5)) for k in 'ab']
+        await asyncio.sleep(0.05)
+        with pytest.raises(PoolBusy):
+            await pool.run('c', release.wait, 5)
+        # joining a computation in flight is always accepted
+        joined = asyncio.ensure_future(pool.run('a', release.wait, 5))
+        release.set()
+        await asyncio.gather(*tasks, joined)
+        assert await pool.run('c', release.wait, 5)
+
+    run(main())
+
+
+def test_errors_and_cancel():
+    release = threading.Event()
+
+    def fail():
+        raise ValueError('no route')
+
+    async def main():
+        pool = WorkerPool(workers=0)
+        with pytest.raises(ValueError):
+            await pool.run('x', fail)
+        assert pool.pending == 0
+
+        first = asyncio.ensure_future(pool.run('a', release.wait, 5))
+        second = asyncio.ensure_future(pool.run('a', release.wait, 5))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        release.set()
+        assert await second
+
+    run(main())
+
+
+def test_process_pool():
+    async def main():
+        pool = WorkerPool(workers=1, warm=False)
+        try:
+            return await asyncio.gather(pool.run(None, math.factorial, 20), pool.run(None, math.factorial, 20))
+        finally:
+            pool.shutdown()
+
+    assert run(main()) == [math.factorial(20)] * 2
+
+
+def test_ch_warmed_once(monkeypatch):
+    warmed = []
+    monkeypatch.setattr(workers, '_warm', lambda ch_path=None: warmed.append(ch_path))
+
+    async def main():
+        pool = WorkerPool(workers=0, ch_path='ch.npz')
+        return await asyncio.gather(pool.run('a', math.factorial, 5), pool.run('b', math.factorial, 6))
+
+    assert run(main()) == [120, 720]
+    assert warmed == ['ch.npz']
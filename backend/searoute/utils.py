@@ -1,6 +1,10 @@
 from math import atan2, cos,  pow, radians, sin, sqrt, tan
 import geojson
 import inspect
+from itertools import combinations
+
+from .classes.csr import CSRGraph
+from .geodesy import avg_earth_radius_km, conversions, line_length
 
 
 def get_unique_number(lon, lat):
@@ -62,20 +66,6 @@ def speed_coef(unit):
     return 1
 
 
-avg_earth_radius_km = 6371008.8
-conversions = {
-    "km": 0.001,
-    "m": 1.0,
-    "mi": 0.000621371192,
-    "ft": 3.28084,
-    "in": 39.370,
-    "deg": 1 / 111325,
-    "cen": 100,
-    "rad": 1 / avg_earth_radius_km,
-    "naut": 0.000539956803,
-    "yd": 0.914411119,
-    "nm": 0.00071506154
-}
 
 
 def distance(coordinates1, coordinates2, units: str = "km"):
@@ -123,14 +113,7 @@ def distance_length(line: list, units: str = "km"):
     if line is None:
         return 0
 
-    length = 0
-    coords = line
-    le = len(coords)-1
-    for i, point in enumerate(coords):
-        if i != le:
-            length += distance(point, coords[i+1], units)
-
-    return length
+    return line_length(line, units)
 
 
 def get_duration(speed_knot, length, units):
@@ -300,9 +283,13 @@ def from_nodes_edges_set(G, node_set, edge_set):
     if G is None:
         raise Exception('G should not be none or provide create_with')
     
-    G._node = node_set or {}
-    G._adj = edge_set or {}
-    G.update_kdtree(node_set)
+    if hasattr(G, 'load_csr'):
+        # Marnet keeps the network as compressed sparse rows
+        G.load_csr(CSRGraph.from_dicts(node_set, edge_set))
+    else:
+        G._node = node_set or {}
+        G._adj = edge_set or {}
+        G.update_kdtree(node_set)
 
     return G
 
@@ -506,4 +493,84 @@ def pnpoly(nvert: int, vertx: list, verty: list, testx :float, testy: float) ->b
         if ((verty[i] > testy) != (verty[j] > testy)) and \
                 (testx < (vertx[j] - vertx[i]) * (testy - verty[i]) / (verty[j] - verty[i]) + vertx[i]):
             c = not c
-    return c
\ No newline at end of file
+    return c
+
+
+def path_length(order, lengths):
+    """Total length of visiting points in `order`, given the matrix of `lengths` between them"""
+    return sum(lengths[a][b] for a, b in zip(order[:-1], order[1:]))
+
+
+def order_waypoints(lengths, exact_limit=8):
+    """
+    Order of the waypoints of a route with the shortest total length,
+    the first and the last waypoints stay in place.
+
+    Parameters
+    ----------
+    lengths : square matrix (list of lists) of the route lengths between the waypoints,
+        `lengths[i][j]` from `i` to `j`, inf where there is no route
+    exact_limit : int, default 8
+        up to this number of intermediate waypoints the order is exact (Held-Karp),
+        beyond it is built from nearest neighbours and improved with 2-opt
+
+    Returns
+    -------
+    A list of the waypoint indexes in the order to visit them
+    """
+    n = len(lengths)
+    last = n - 1
+    inner = list(range(1, last))
+    if len(inner) < 2:
+        return list(range(n))
+
+    if len(inner) <= exact_limit:
+        m = len(inner)
+        # best[mask, k] : shortest (length, previous) from the first waypoint through
+        # the intermediate waypoints in `mask`, ending at the k-th of them
+        best = {(1 << k, k): (lengths[0][inner[k]], None) for k in range(m)}
+        for size in range(2, m + 1):
+            for subset in combinations(range(m), size):
+                mask = sum(1 << k for k in subset)
+                for k in subset:
+                    rest = mask ^ (1 << k)
+                    best[mask, k] = min((best[rest, j][0] + lengths[inner[j]][inner[k]], j)
+                                        for j in subset if j != k)
+        mask = (1 << m) - 1
+        _, k = min((best[mask, k][0] + lengths[inner[k]][last], k) for k in range(m))
+        order = []
+        while k is not None:
+            order.append(inner[k])
+            mask, k = mask ^ (1 << k), best[mask, k][1]
+        return [0] + order[::-1] + [last]
+
+    order = [0]
+    remaining = set(inner)
+    while remaining:
+        nearest = min(remaining, key=lambda j: (lengths[order[-1]][j], j))
+        order.append(nearest)
+        remaining.discard(nearest)
+    order.append(last)
+
+    # 2-opt, reverse sections while it shortens the route. Lengths may not be symmetric,
+    # a reversed section is sailed backwards: with the running sums of the lengths along
+    # the order both ways, the change of a reversal is known without summing the route
+    improved = True
+    while improved:
+        improved = False
+        forward, backward = [0.0], [0.0]
+        for a, b in zip(order[:-1], order[1:]):
+            forward.append(forward[-1] + lengths[a][b])
+            backward.append(backward[-1] + lengths[b][a])
+        for i in range(1, n - 2):
+            for j in range(i + 1, n - 1):
+                before, first, last, after = order[i - 1], order[i], order[j], order[j + 1]
+                delta = (lengths[before][last] + (backward[j] - backward[i]) + lengths[first][after]
+                         - lengths[before][first] - (forward[j] - forward[i]) - lengths[last][after])
+                if delta < -1e-9:
+                    order = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                    improved = True
+                    break
+            if improved:
+                break
+    return order
@@ -0,0 +1,225 @@
+"""
+Wave height forecasts as gridded fields.
+
+A `WaveField` holds wave heights on a regular lat/lon grid for regular
+times, stored as a snapshot file (see `snapshot`) and memory mapped, so any
+number of locations and times is sampled at once without network access.
+
+"""
+import asyncio
+import time
+
+import numpy as np
+
+from . import snapshot
+from .geodesy import conversions
+
+# speed lost in waves higher than a height in meters, highest first
+SPEED_PENALTIES = ((3.0, 0.15), (2.0, 0.05))
+
+
+def speed_factor(wave_height):
+    """
+    Share of its speed a boat keeps in waves
+
+    Parameters
+    ----------
+    wave_height : a wave height or an array of them in meters, NaN counts as calm sea
+
+    Returns
+    -------
+    An array of factors between 0 and 1
+    """
+    wave_height = np.nan_to_num(np.asarray(wave_height, dtype=np.float64))
+    factor = np.ones_like(wave_height)
+    for height, penalty in reversed(SPEED_PENALTIES):
+        factor[wave_height > height] = 1.0 - penalty
+    return factor
+
+
+class WaveField:
+    """
+    Wave heights in meters on a regular grid, NaN where there is no data ex. on land.
+
+    Parameters
+    ----------
+    values : array of shape (times, lats, lons)
+    lat0, lon0 : latitude and longitude of the first grid point
+    dlat, dlon : spacing of the grid in degrees
+    time0 : time of the first grid in seconds since the epoch
+    dt : seconds between two grids
+
+    Longitudes wrap around when the grid covers the whole globe, locations and
+    times out of the grid take the values of its border.
+
+    """
+
+    def __init__(self, values, lat0, lon0, dlat, dlon, time0, dt):
+        self.values = values
+        self.lat0, self.lon0 = float(lat0), float(lon0)
+        self.dlat, self.dlon = float(dlat), float(dlon)
+        self.time0, self.dt = float(time0), float(dt)
+        self._factors = {}
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def global_lons(self):
+        return self.shape[2] * self.dlon >= 360 - 1e-9
+
+    def meta(self):
+        return {'lat0': self.lat0, 'lon0': self.lon0, 'dlat': self.dlat, 'dlon': self.dlon,
+                'time0': self.time0, 'dt': self.dt}
+
+    def save(self, path):
+        """Write the field to a snapshot file"""
+        snapshot.write_snapshot(path, {'wave_height': np.asarray(self.values, dtype=np.float32)},
+                                dict(self.meta(), kind='wavefield'))
+
+    @classmethod
+    def load(cls, path):
+        """Map a field from a snapshot file, its values stay on disk until sampled"""
+        arrays, meta = snapshot.read_snapshot(path)
+        if meta.get('kind') != 'wavefield':
+            raise ValueError(f'{path} is not a wave field snapshot')
+        meta = {k: v for k, v in meta.items() if k != 'kind'}
+        return cls(arrays['wave_height'], **meta)
+
+    @classmethod
+    def from_function(cls, wave_height, west, south, east, north, resolution, time0, hours, dt=3600):
+        """
+        A field of a function `wave_height(lat, lon, hour)`, ex. `LocalProvider.default_wave_height`,
+        with `hours` grids `dt` seconds apart over the bounds
+        """
+        lats = np.arange(south, north + resolution / 2, resolution)
+        lons = np.arange(west, east + resolution / 2, resolution)
+        steps = np.arange(hours) * dt / 3600
+        values = np.array([[[wave_height(lat, lon, hour) for lon in lons] for lat in lats] for hour in steps],
+                          dtype=np.float32)
+        return cls(values, south, west, resolution, resolution, time0, dt)
+
+    @classmethod
+    async def fetch(cls, provider, west, south, east, north, resolution, concurrency=16):
+        """
+        A field of the hourly forecasts of a provider (see `weather`) at every grid point,
+        from 00:00 UTC of the current day. Grid points without forecast are NaN.
+        """
+        lats = np.arange(south, north + resolution / 2, resolution)
+        lons = np.arange(west, east + resolution / 2, resolution)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(lat, lon):
+            async with semaphore:
+                forecast = await provider.hourly(float(lat), float(lon))
+            return ((forecast or {}).get('wave_height')) or []
+
+        series = await asyncio.gather(*[one(lat, lon) for lat in lats for lon in lons])
+        hours = max([len(s) for s in series] + [1])
+        values = np.full((hours, len(lats), len(lons)), np.nan, dtype=np.float32)
+        for k, s in enumerate(series):
+            values[:len(s), k // len(lons), k % len(lons)] = [np.nan if v is None else v for v in s]
+        day = time.time() // 86400 * 86400
+        return cls(values, south, west, resolution, resolution, day, 3600)
+
+    def _axis(self, position, size, wrap=False):
+        """Lower index, upper index and weight of the upper one along an axis"""
+        if wrap:
+            position = np.mod(position, size)
+            lower = np.floor(position).astype(np.int64)
+            return lower % size, (lower + 1) % size, position - lower
+        position = np.clip(position, 0, size - 1)
+        lower = np.minimum(np.floor(position).astype(np.int64), max(size - 2, 0))
+        return lower, np.minimum(lower + 1, size - 1), position - lower
+
+    def sample(self, lon, lat, t):
+        """
+        Wave heights at locations and times, interpolated linearly in space and time
+
+        Parameters
+        ----------
+        lon, lat : longitudes and latitudes, arrays or numbers
+        t : times in seconds since the epoch, broadcast with the locations
+
+        Returns
+        -------
+        An array of wave heights, corners without data are left out of the
+        interpolation, NaN where all of them are
+        """
+        lon, lat, t = np.broadcast_arrays(*[np.asarray(a, dtype=np.float64) for a in (lon, lat, t)])
+        nt, ny, nx = self.shape
+        t0, t1, wt = self._axis((t.ravel() - self.time0) / self.dt, nt)
+        y0, y1, wy = self._axis((lat.ravel() - self.lat0) / self.dlat, ny)
+        x0, x1, wx = self._axis((lon.ravel() - self.lon0) / self.dlon, nx, wrap=self.global_lons)
+
+        total = np.zeros(len(wt))
+        weights = np.zeros(len(wt))
+        for ti, tw in ((t0, 1 - wt), (t1, wt)):
+            for yi, yw in ((y0, 1 - wy), (y1, wy)):
+                for xi, xw in ((x0, 1 - wx), (x1, wx)):
+                    v = np.asarray(self.values[ti, yi, xi], dtype=np.float64)
+                    w = np.where(np.isnan(v), 0.0, tw * yw * xw)
+                    total += np.nan_to_num(v) * w
+                    weights += w
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = np.where(weights > 0, total / weights, np.nan)
+        return result.reshape(lon.shape)
+
+    def speed_factors(self, coords, key=None):
+        """
+        Speed factors (see `speed_factor`) at locations for every grid time
+
+        Parameters
+        ----------
+        coords : array of (lon, lat)
+        key : a hashable key of the locations, ex. a graph signature, to cache the result
+
+        Returns
+        -------
+        An array of shape (len(coords), times)
+        """
+        if key is not None and key in self._factors:
+            return self._factors[key]
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        times = self.time0 + np.arange(self.shape[0]) * self.dt
+        factors = speed_factor(self.sample(coords[:, :1], coords[:, 1:], times[None, :]))
+        if key is not None:
+            self._factors[key] = factors
+        return factors
+
+    def sail(self, route, speed_knot, depart=None, step=None, iterations=3):
+        """
+        Times along a route sailed at a speed slowed down by the waves, see `speed_factor`
+
+        The route is sampled at its points and every `step` in between, the speed
+        on a segment is the one at its start. Sample times start from the calm sea
+        times and are refined `iterations` times with the waves at those times.
+
+        Parameters
+        ----------
+        route : a `Route`
+        speed_knot : speed of the boat in calm sea
+        depart : time of departure in seconds since the epoch, default the first grid
+        step : distance between samples in the units of the route, default None
+            which means only the points of the route
+
+        Returns
+        -------
+        A dict of arrays, one value per sample : `distance` in the units of the route,
+        `hours` since the departure, `lon`, `lat`, `wave` in meters and `speed` in knots
+        """
+        depart = self.time0 if depart is None else depart
+        distance = route.cumulative
+        if step:
+            distance = np.union1d(distance, np.arange(0, route.length, step))
+        points = route.position(distance) if len(route) > 1 else np.repeat(route.coords, len(distance), axis=0)
+        lon, lat = points[:, 0], points[:, 1]
+        nm = np.diff(distance) / conversions[route.units] * conversions['naut']
+
+        hours = np.concatenate(([0.0], np.cumsum(nm / speed_knot)))
+        for _ in range(iterations):
+            wave = self.sample(lon, lat, depart + hours * 3600)
+            speed = speed_knot * speed_factor(wave)
+            hours = np.concatenate(([0.0], np.cumsum(nm / speed[:-1])))
+        return {'distance': distance, 'hours': hours, 'lon': lon, 'lat': lat, 'wave': wave, 'speed': speed}
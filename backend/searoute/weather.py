@@ -0,0 +1,224 @@
+"""
+Marine weather forecasts along routes.
+
+A provider fetches the hourly forecast of a location, `WeatherService` keeps
+the forecasts in a TTL cache keyed by grid cell and forecast run, and fetches
+the missing ones of many locations at the same time. `OpenMeteoProvider`
+queries the Open-Meteo marine API over one shared connection pool,
+`LocalProvider` makes up a deterministic sea state without network access,
+for tests and offline use.
+
+"""
+import abc
+import asyncio
+import math
+import time
+
+from .cache import RouteCache
+
+
+class WeatherProvider(abc.ABC):
+    """
+    Source of hourly marine forecasts, subclasses implement `hourly`
+    """
+
+    name = 'provider'
+
+    @abc.abstractmethod
+    async def hourly(self, lat, lon):
+        """
+        Hourly forecast of a location
+
+        Returns
+        -------
+        A dict of variable to its list of hourly values from 00:00 UTC of the
+        current day, ex. {'wave_height': [...]}, None if it is not available
+        """
+
+    async def aclose(self):
+        pass
+
+
+class OpenMeteoProvider(WeatherProvider):
+    """
+    Forecasts of the Open-Meteo marine API.
+
+    Parameters
+    ----------
+    timeout : float, default 10
+        seconds to wait for a response
+    max_connections : int, default 20
+        size of the connection pool shared by all requests
+
+    """
+
+    name = 'open-meteo'
+    URL = 'https://marine-api.open-meteo.com/v1/marine'
+
+    def __init__(self, timeout=10, max_connections=20):
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None
+
+    @property
+    def client(self):
+        # created on first use, inside the event loop serving the requests
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections))
+        return self._client
+
+    async def hourly(self, lat, lon):
+        params = {'latitude': lat, 'longitude': lon, 'hourly': 'wave_height', 'timezone': 'UTC'}
+        try:
+            resp = await self.client.get(self.URL, params=params)
+        except Exception:
+            return None
+        if resp.status_code != 200:
+            return None
+        return resp.json().get('hourly') or None
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class LocalProvider(WeatherProvider):
+    """
+    A stand-in provider without network access.
+
+    Parameters
+    ----------
+    wave_height : callable, default None
+        `wave_height(lat, lon, hour)` in meters, by default a smooth made up
+        sea state, calmer near the equator and changing over the days
+    hours : int, default 168
+        length of the forecasts
+
+    """
+
+    name = 'local'
+
+    def __init__(self, wave_height=None, hours=168):
+        self.wave_height = wave_height or self.default_wave_height
+        self.hours = hours
+        self.calls = 0
+
+    @staticmethod
+    def default_wave_height(lat, lon, hour):
+        swell = 1.0 + 2.0 * abs(math.sin(math.radians(lat)))
+        return round(max(0.0, swell + 0.8 * math.sin(math.radians(lon) * 3 + hour / 24)), 2)
+
+    async def hourly(self, lat, lon):
+        self.calls += 1
+        return {'wave_height': [self.wave_height(lat, lon, hour) for hour in range(self.hours)]}
+
+
+class WeatherService:
+    """
+    Cached forecasts of a provider.
+
+    Locations are rounded to the center of a grid cell, locations of the same
+    cell share one forecast. Forecasts are kept until their time to live runs
+    out or a new forecast run starts.
+
+    Parameters
+    ----------
+    provider : a `WeatherProvider`
+    resolution : float, default 0.25
+        size of the grid cells in degrees
+    ttl : float, default 3600
+        time to live of the forecasts in seconds
+    run_hours : int, default 6
+        hours between two forecast runs of the provider
+    max_entries : int, default 4096
+
+    """
+
+    def __init__(self, provider, resolution=0.25, ttl=3600, run_hours=6, max_entries=4096):
+        self.provider = provider
+        self.resolution = resolution
+        self.run_hours = run_hours
+        self.cache = RouteCache(max_entries=max_entries, ttl=ttl)
+        self._inflight = {}
+
+    def cell(self, lat, lon):
+        """Center of the grid cell of a location, as (lat, lon)"""
+        r = self.resolution
+        lon = (lon + 180) % 360 - 180
+        return round(round(lat / r) * r, 6), round(round(lon / r) * r, 6)
+
+    def run(self):
+        """Start of the current forecast run, in seconds since the epoch"""
+        period = self.run_hours * 3600
+        return int(time.time() // period * period)
+
+    def _key(self, cell):
+        return f'{self.provider.name}|{self.run()}|{cell[0]}|{cell[1]}'
+
+    async def _fetch(self, cell):
+        key = self._key(cell)
+        forecast = self.cache.get(key)
+        if forecast is not None:
+            return forecast
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.provider.hourly(*cell))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        forecast = await asyncio.shield(task)
+        if forecast is not None:
+            self.cache.set(key, forecast)
+        return forecast
+
+    async def forecasts(self, points):
+        """
+        Hourly forecasts of many locations, fetched at the same time
+
+        Parameters
+        ----------
+        points : list of (lon, lat)
+
+        Returns
+        -------
+        A list of forecasts, see `WeatherProvider.hourly`, None where there is none
+        """
+        cells = [self.cell(lat, lon) for lon, lat in points]
+        unique = list(dict.fromkeys(cells))
+        fetched = dict(zip(unique, await asyncio.gather(*[self._fetch(c) for c in unique])))
+        return [fetched[c] for c in cells]
+
+    @staticmethod
+    def _value(forecast, hour, variable, default):
+        values = (forecast or {}).get(variable) or []
+        if 0 <= hour < len(values) and values[hour] is not None:
+            return values[hour]
+        return default
+
+    async def value(self, point, hour, variable='wave_height', default=0.0):
+        """
+        Forecast of a variable at a location and an hour
+
+        Parameters
+        ----------
+        point : (lon, lat)
+        hour : hours since 00:00 UTC of the current day
+        variable : str, default `wave_height`
+        default : value when there is no forecast
+
+        """
+        forecast, = await self.forecasts([point])
+        return self._value(forecast, hour, variable, default)
+
+    def cached_value(self, point, hour, variable='wave_height', default=0.0):
+        """
+        Like `value` without fetching, None when the forecast of the location is not cached
+        """
+        forecast = self.cache.get(self._key(self.cell(point[1], point[0])))
+        if forecast is None:
+            return None
+        return self._value(forecast, hour, variable, default)
@@ -0,0 +1,132 @@
+"""
+Running CPU bound searches away from the event loop.
+
+Shortest paths and isochrones hold the GIL for their whole search, in a
+thread they still stall every other request of the process. `WorkerPool`
+sends them to a pool of processes, each loading the networks once, shares
+one computation between identical requests in flight and refuses new work
+once too many computations are pending.
+
+"""
+import asyncio
+import concurrent.futures
+import multiprocessing
+import os
+
+
+class PoolBusy(Exception):
+    """Raised when a pool already has its maximum of pending computations"""
+
+
+def _warm(ch_path=None):
+    # load the networks once per worker process, from the snapshots if there are any,
+    # and the contraction hierarchy of the default restrictions when there is a path for it
+    from .searoute import setup_M, setup_P
+    setup_M()
+    setup_P()
+    if ch_path:
+        setup_M().build_ch(path=ch_path)
+
+
+class WorkerPool:
+    """
+    A pool of worker processes for blocking calls made from asyncio.
+
+    Parameters
+    ----------
+    workers : int, default None
+        number of processes, None uses the number of CPUs up to 4,
+        0 runs the calls in the default thread pool of the event loop instead
+    max_pending : int, default 64
+        maximum number of computations queued or running, `run` raises
+        `PoolBusy` beyond it
+    warm : boolean, default True
+        load the networks in every process when it starts
+    ch_path : str, default None
+        a `.npz` file of the contraction hierarchy of the default restrictions,
+        built or loaded in every process when it starts (see `Marnet.build_ch`),
+        with 0 workers once in this process before the first call
+
+    Calls are coalesced on a key: while a call with the same key is in flight,
+    `run` waits for its result instead of computing it again. The result is
+    shared by all waiters, it must not be modified in place.
+
+    """
+
+    def __init__(self, workers=None, max_pending=64, warm=True, ch_path=None):
+        if workers is None:
+            workers = min(4, os.cpu_count() or 1)
+        self.workers = workers
+        self.max_pending = max_pending
+        self.warm = warm
+        self.ch_path = ch_path
+        self.coalesced = 0
+        self._executor = None
+        self._inflight = {}
+        self._warming = None
+
+    @classmethod
+    def from_env(cls):
+        """
+        A pool configured by `SEAROUTE_POOL_WORKERS`, `SEAROUTE_POOL_MAX_PENDING`
+        and `SEAROUTE_CH_PATH`
+        """
+        workers = os.environ.get('SEAROUTE_POOL_WORKERS')
+        return cls(workers=int(workers) if workers else None,
+                   max_pending=int(os.environ.get('SEAROUTE_POOL_MAX_PENDING', 64)),
+                   ch_path=os.environ.get('SEAROUTE_CH_PATH') or None)
+
+    @property
+    def pending(self):
+        """Number of computations queued or running"""
+        return len(self._inflight)
+
+    def _get_executor(self):
+        if self._executor is None and self.workers > 0:
+            # the server process is single threaded, forking from it is safe
+            # unlike forking the threaded web server process
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                self.workers, mp_context=context, initializer=_warm if self.warm else None,
+                initargs=(self.ch_path,) if self.warm else ())
+        return self._executor
+
+    async def run(self, key, fn, *args):
+        """
+        Result of `fn(*args)` computed in the pool
+
+        Parameters
+        ----------
+        key : a hashable key of the call, None never coalesces
+        fn : a picklable function, defined at module level
+        args : picklable arguments
+
+        Returns
+        -------
+        The result of the call, its exceptions are raised again
+        """
+        if self.workers == 0 and self.warm and self.ch_path:
+            # the calls run in this process, the hierarchy is built once before the first one
+            if self._warming is None:
+                self._warming = asyncio.get_running_loop().run_in_executor(None, _warm, self.ch_path)
+            await asyncio.shield(self._warming)
+
+        future = self._inflight.get(key) if key is not None else None
+        if future is not None:
+            self.coalesced += 1
+        else:
+            if self.pending >= self.max_pending:
+                raise PoolBusy(f'{self.pending} computations are pending, try again later')
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._get_executor(), fn, *args)
+            token = key if key is not None else object()
+            self._inflight[token] = future
+            future.add_done_callback(lambda _: self._inflight.pop(token, None))
+        # a cancelled request must not cancel the computation other requests wait for
+        return await asyncio.shield(future)
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='session')
+def main():
+    # searches in threads of the test process, made up sea state instead of Open-Meteo
+    os.environ.setdefault('SEAROUTE_POOL_WORKERS', '0')
+    os.environ.setdefault('WEATHER_PROVIDER', 'local')
+    cwd = os.getcwd()
+    # the server reads its files relative to the backend folder
+    os.chdir(BACKEND)
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    return main
+
+
+@pytest.fixture
+def client(main):
+    cwd = os.getcwd()
+    os.chdir(BACKEND)
+    with TestClient(main.app) as client:
+        yield client
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def grid(monkeypatch):
+    # a small made up network in place of the Marnet of the searches
+    import isochrone
+    import precalc
+    from searoute.tests.test_utils import get_grid_marnet
+    M = get_grid_marnet()
+    monkeypatch.setattr(isochrone, 'setup_M', lambda: M)
+    monkeypatch.setattr(precalc, 'setup_M', lambda: M)
+    return M
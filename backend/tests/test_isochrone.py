@@ -0,0 +1,58 @@
+from isochrone import calculate_isochrones, interpolate, reachable_lines, split_antimeridian
+
+
+def per_day_lines(profile, lengths, limit):
+    # the contour of one day as it was drawn before the single sweep, with
+    # its own search over every edge of the nodes within the limit
+    offsets, targets, weights = profile.lists()
+    nodes = profile.nodes
+    lines = []
+    visited = set()
+    for u, dist_u in lengths.items():
+        if dist_u > limit:
+            continue
+        for k in range(offsets[u], offsets[u + 1]):
+            v = targets[k]
+            if (min(u, v), max(u, v)) in visited:
+                continue
+            visited.add((min(u, v), max(u, v)))
+            if lengths.get(v, float('inf')) <= limit:
+                lines.extend(split_antimeridian(*nodes[u], *nodes[v]))
+            elif weights[k] > 0:
+                fraction = max(0.0, min(1.0, (limit - dist_u) / weights[k]))
+                lines.extend(split_antimeridian(*nodes[u], *interpolate(*nodes[u], *nodes[v], fraction)))
+    return lines
+
+
+def test_sweep_same_lines_as_per_day(grid):
+    profile = grid.profile([])
+    source = profile.index[(0, 0)]
+    lengths = profile.distances(source)
+    # limits on node distances, where an edge turns from cut to whole, and between them
+    at_nodes = sorted(set(lengths.values()))[1::7]
+    limits = sorted(set(at_nodes + [d + 0.5 for d in at_nodes]))
+    # the sweep gets the nodes within its largest limit only
+    within = profile.distances(source, cutoff=limits[-1])
+    for limit, lines in zip(limits, reachable_lines(profile, within, limits)):
+        assert lines == per_day_lines(profile, lengths, limit)
+
+
+def test_isochrones_of_several_speeds(grid):
+    # knots slow enough for the contours to stay within the grid
+    speeds, days = [0.1, 0.25, 0.3], 4
+    geojson = calculate_isochrones(0, 0, speeds, days)
+    profile = grid.profile([])
+    lengths = profile.distances(profile.index[(0, 0)])
+
+    features = geojson['features']
+    assert sorted((f['properties']['speed_knots'], f['properties']['day']) for f in features) == \
+        sorted((speed, day) for speed in speeds for day in range(1, days + 1))
+    distances = [f['properties']['distance_nm'] for f in features]
+    assert distances == sorted(distances, reverse=True)
+    for feature in features:
+        speed, day = feature['properties']['speed_knots'], feature['properties']['day']
+        assert feature['geometry']['coordinates'] == per_day_lines(profile, lengths, speed * 1.852 * 24 * day)
+
+    # one speed gives the features of that speed in the list
+    assert calculate_isochrones(0, 0, 0.25, days)['features'] == \
+        [f for f in features if f['properties']['speed_knots'] == 0.25]
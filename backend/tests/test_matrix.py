@@ -0,0 +1,30 @@
+import pytest
+
+
+def test_matrix_runs_in_pool(main, client, monkeypatch):
+    calls = []
+    run = main.POOL.run
+
+    async def spy(key, fn, *args):
+        calls.append(key)
+        return await run(key, fn, *args)
+
+    monkeypatch.setattr(main.POOL, 'run', spy)
+    response = client.post('/api/matrix', json={'origins': [[-5.6615, 43.5357], [-6.9508, 37.2614]], 'units': 'naut'})
+    assert response.status_code == 200
+    lengths = response.json()['lengths']
+    assert lengths[0][0] == 0 and lengths[0][1] == pytest.approx(lengths[1][0]) and lengths[0][1] > 0
+    assert len(calls) == 1
+
+
+def test_matrix_too_large(main, client):
+    side = int(main.MATRIX_MAX_CELLS ** 0.5) + 1
+    points = [[0.0, float(i % 80)] for i in range(side)]
+    response = client.post('/api/matrix', json={'origins': points})
+    assert response.status_code == 422
+
+
+def test_matrix_unknown_units(client):
+    response = client.post('/api/matrix', json={'origins': [[-5.6615, 43.5357], [-6.9508, 37.2614]], 'units': 'parsec'})
+    assert response.status_code == 422
+    assert client.post('/api/matrix', json={'origins': [[-5.6615, 43.5357]], 'units': 'km'}).status_code == 200
@@ -0,0 +1,104 @@
+import json
+import os
+
+import pytest
+
+import precalc
+from precalc import inputs_hash, precalc_filename, select_ports
+from searoute import polyline
+
+LOCATIONS = [
+    {'name': 'A', 'lat': 1.0, 'lng': 1.0, 'country': 'X', 'type': 'port'},
+    {'name': 'B', 'lat': 5.0, 'lng': 6.0, 'country': 'X', 'type': 'port'},
+    {'name': 'C', 'lat': 10.0, 'lng': 2.0, 'country': 'Y'},
+    {'name': 'A', 'lat': 9.0, 'lng': 9.0, 'country': 'X', 'type': 'port'},
+    {'name': 'V', 'lat': 3.0, 'lng': 3.0, 'country': 'X', 'type': 'vessel'},
+    {'name': 'Fiji', 'lat': -17.0, 'lng': 179.0, 'country': 'Z', 'type': 'port'},
+]
+SPEEDS = [0.2, 0.3]
+
+
+def names(ports):
+    return [port['name'] for port in ports]
+
+
+def test_select_ports():
+    assert names(select_ports(LOCATIONS)) == ['A', 'B', 'C', 'Fiji']
+    # the first of the ports of the same name
+    assert select_ports(LOCATIONS, names=['A'])[0]['lat'] == 1.0
+    assert names(select_ports(LOCATIONS, countries=['X'], exclude=['B'])) == ['A']
+    assert names(select_ports(LOCATIONS, bbox=(0, 0, 7, 7))) == ['A', 'B']
+    # a region across the antimeridian
+    assert names(select_ports(LOCATIONS, bbox=(170, -20, -170, 0))) == ['Fiji']
+
+
+def test_inputs_hash():
+    port = LOCATIONS[0]
+    digest = inputs_hash(port, SPEEDS, 3, {}, 'net')
+    assert digest == inputs_hash(dict(port), list(SPEEDS), 3, {}, 'net')
+    for changed in [inputs_hash(dict(port, lat=1.5), SPEEDS, 3, {}, 'net'),
+                    inputs_hash(port, SPEEDS + [0.4], 3, {}, 'net'),
+                    inputs_hash(port, SPEEDS, 4, {}, 'net'),
+                    inputs_hash(port, SPEEDS, 3, {'polygons': True}, 'net'),
+                    inputs_hash(port, SPEEDS, 3, {}, 'other')]:
+        assert changed != digest
+
+
+def test_second_run_skips_unchanged_ports(grid, tmp_path):
+    out = str(tmp_path)
+    ports = select_ports(LOCATIONS, countries=['X'])
+    built, current = precalc.precalc(ports, SPEEDS, 3, out, workers=0)
+    assert sorted(built) == ['A', 'B'] and current == []
+    files = sorted(precalc_filename(name, speed) for name in 'AB' for speed in SPEEDS)
+    assert sorted(set(os.listdir(out)) - {precalc.MANIFEST, precalc.INDEX}) == files
+    mtimes = {name: os.stat(os.path.join(out, name)).st_mtime_ns for name in files}
+
+    built, current = precalc.precalc(ports, SPEEDS, 3, out, workers=0)
+    assert built == [] and sorted(current) == ['A', 'B']
+    assert {name: os.stat(os.path.join(out, name)).st_mtime_ns for name in files} == mtimes
+
+    # a moved port, a missing file, then other options
+    moved = [dict(ports[0], lat=2.0), ports[1]]
+    assert precalc.precalc(moved, SPEEDS, 3, out, workers=0) == (['A'], ['B'])
+    os.remove(os.path.join(out, precalc_filename('B', SPEEDS[0])))
+    assert precalc.precalc(moved, SPEEDS, 3, out, workers=0) == (['B'], ['A'])
+    assert sorted(precalc.precalc(moved, SPEEDS, 3, out, workers=0, compact=True)[0]) == ['A', 'B']
+    assert precalc.precalc(moved, SPEEDS, 3, out, workers=0, compact=True)[0] == []
+    assert sorted(precalc.precalc(moved, SPEEDS, 3, out, workers=0, compact=True, force=True)[0]) == ['A', 'B']
+
+    with open(os.path.join(out, precalc_filename('A', 0.3)), encoding='utf-8') as f:
+        assert polyline.is_compact(json.load(f))
+    with open(os.path.join(out, precalc.INDEX), encoding='utf-8') as f:
+        index = json.load(f)
+    assert {port['name']: port['lat'] for port in index} == {'A': 2.0, 'B': 5.0}
+
+
+def test_run_resumes_after_interruption(grid, tmp_path, monkeypatch):
+    out = str(tmp_path)
+    ports = select_ports(LOCATIONS, countries=['X'])
+    build_port = precalc.build_port
+
+    def interrupted(port, *args):
+        if port['name'] == 'B':
+            raise KeyboardInterrupt
+        return build_port(port, *args)
+
+    monkeypatch.setattr(precalc, 'build_port', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        precalc.precalc(ports, SPEEDS, 3, out, workers=0)
+    monkeypatch.setattr(precalc, 'build_port', build_port)
+    # the manifest was saved after A
+    assert precalc.precalc(ports, SPEEDS, 3, out, workers=0) == (['B'], ['A'])
+
+
+def test_command_twice(grid, tmp_path, capsys):
+    locations = tmp_path / 'locations.json'
+    locations.write_text(json.dumps(LOCATIONS))
+    argv = ['--locations', str(locations), '--out', str(tmp_path / 'out'), '--country', 'X',
+            '--speeds', '0.2', '0.3', '0.1', '--days', '2', '--workers', '0']
+    precalc.main(argv)
+    assert 'Built 2 ports, 0 up to date' in capsys.readouterr().out
+    precalc.main(argv)
+    assert 'Built 0 ports, 2 up to date' in capsys.readouterr().out
+    precalc.main(argv + ['--days', '3'])
+    assert 'Built 2 ports, 0 up to date' in capsys.readouterr().out
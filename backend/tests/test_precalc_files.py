@@ -0,0 +1,64 @@
+import pytest
+
+from searoute.archive import Archive, pack
+
+
+@pytest.mark.parametrize('header, expected', [
+    (None, None),
+    ('bytes=0-99', (0, 100)),
+    ('bytes=10-', (10, 1000)),
+    ('bytes=990-2000', (990, 1000)),
+    ('bytes=-100', (900, 1000)),
+    ('bytes=-5000', (0, 1000)),
+    # invalid ones are ignored, the whole content is served
+    ('bytes=500-100', None),
+    ('bytes=a-b', None),
+    ('bytes=-', None),
+    ('bytes=--5', None),
+    ('bytes=0-1,5-9', None),
+    ('items=0-9', None),
+    # valid but without any byte of the content
+    ('bytes=1000-', 'unsatisfiable'),
+    ('bytes=1000-1010', 'unsatisfiable'),
+    ('bytes=-0', 'unsatisfiable'),
+])
+def test_parse_range(main, header, expected):
+    assert main.parse_range(header, 1000) == expected
+
+
+@pytest.fixture
+def archive(main, tmp_path, monkeypatch):
+    folder = tmp_path / 'precalc'
+    folder.mkdir()
+    (folder / 'Port_10.0.json').write_bytes(b'{"type": "FeatureCollection", "features": []}' * 40)
+    pack(str(folder), str(tmp_path / 'precalc_data.zip'))
+    archive = Archive(str(tmp_path / 'precalc_data.zip'))
+    monkeypatch.setattr(main, 'PRECALC_ARCHIVE', archive)
+    yield (folder / 'Port_10.0.json').read_bytes()
+    archive.close()
+
+
+def test_archive_ranges(client, archive):
+    identity = {'Accept-Encoding': 'identity'}
+    whole = client.get('/api/precalc/Port_10.0.json', headers=identity)
+    assert whole.status_code == 200 and whole.content == archive
+
+    part = client.get('/api/precalc/Port_10.0.json', headers=dict(identity, Range='bytes=10-19'))
+    assert part.status_code == 206 and part.content == archive[10:20]
+    assert part.headers['Content-Range'] == f'bytes 10-19/{len(archive)}'
+
+    ignored = client.get('/api/precalc/Port_10.0.json', headers=dict(identity, Range='bytes=19-10'))
+    assert ignored.status_code == 200 and ignored.content == archive
+
+    past = client.get('/api/precalc/Port_10.0.json', headers=dict(identity, Range=f'bytes={len(archive)}-'))
+    assert past.status_code == 416 and past.headers['Content-Range'] == f'bytes */{len(archive)}'
+
+
+def test_archive_gzip_and_etag(client, archive):
+    response = client.get('/api/precalc/Port_10.0.json', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    # decoded by the client
+    assert response.content == archive
+    etag = response.headers['ETag']
+    again = client.get('/api/precalc/Port_10.0.json', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert again.status_code == 304
@@ -0,0 +1,85 @@
+import math
+
+import pytest
+import shapely
+from shapely.geometry import Point, shape
+
+import isochrone
+from isochrone import FILL_DEGREES, LOD_ZOOMS, WORLD, lod_tolerance, lod_zoom, reach_polygon, reachable_lines
+
+
+def test_tolerance_per_zoom():
+    assert [lod_zoom(z) for z in (None, 0, 2, 3.9, 4, 7, 8, 18)] == [2, 2, 2, 2, 4, 6, 8, 8]
+    for zoom in LOD_ZOOMS:
+        # one pixel of a 256 px tile at the zoom
+        assert lod_tolerance(zoom) == 360 / (256 * 2 ** zoom)
+        assert lod_tolerance(zoom + 0.9) == lod_tolerance(zoom)
+    assert lod_tolerance(4) == lod_tolerance(2) / 4
+
+
+@pytest.mark.parametrize('zoom', LOD_ZOOMS)
+def test_reach_polygon_valid(grid, zoom):
+    profile = grid.profile([])
+    lengths = profile.distances(profile.index[(0, 0)])
+    lines = reachable_lines(profile, lengths, [40.0])[0]
+    tolerance = lod_tolerance(zoom)
+
+    geometry = reach_polygon(lines, tolerance)
+    area = shape(geometry)
+    assert geometry['type'] in ('Polygon', 'MultiPolygon')
+    assert area.is_valid and not area.is_empty
+    assert WORLD.covers(area)
+    # the reached network is inside, up to the simplification and the corners
+    # cut by the 4 segments per quarter circle of the buffers
+    reached = shapely.union_all(shapely.linestrings(lines))
+    assert area.buffer(2 * tolerance + 0.02 * FILL_DEGREES).covers(reached)
+    # coordinates on a decimal grid finer than the tolerance
+    decimals = math.ceil(-math.log10(tolerance / 4))
+    coords = shapely.get_coordinates(area)
+    assert (abs(coords - coords.round(decimals)) < 1e-9).all()
+
+def test_reach_polygon_over_antimeridian():
+    # a line cut at the antimeridian, and the edge joining its two sides
+    lines = [[(179.0, 10.0), (180.0, 10.5)], [(-180.0, 10.5), (-179.0, 11.0)], [(180.0, 10.5), (-180.0, 10.5)]]
+    area = shape(reach_polygon(lines, lod_tolerance(4), fill=0.2))
+    assert area.is_valid and area.geom_type == 'MultiPolygon'
+    # both sides, not the band around the globe between them
+    assert area.area < 2
+    assert area.contains(Point(179.5, 10.25)) and area.contains(Point(-179.5, 10.75))
+
+
+def test_reachability_cached_per_level_of_detail(main, client, grid, monkeypatch):
+    calls = []
+
+    def counted(*args):
+        calls.append(args)
+        return isochrone.calculate_isochrones(*args)
+
+    monkeypatch.setattr(main, 'calculate_isochrones', counted)
+    main.REACH_CACHE.clear()
+    body = {'lat': 0, 'lng': 0, 'speed': 0.3, 'days': 2, 'shape': 'polygons'}
+    first = client.post('/api/reachability', json=dict(body, zoom=4.2))
+    assert first.status_code == 200
+    assert [f['properties']['tolerance'] for f in first.json()['features']] == [lod_tolerance(4)] * 2
+
+    # another zoom of the same level of detail
+    assert client.post('/api/reachability', json=dict(body, zoom=5.9)).json() == first.json()
+    assert len(calls) == 1
+    client.post('/api/reachability', json=dict(body, zoom=6))
+    client.post('/api/reachability', json=dict(body, shape='lines'))
+    assert len(calls) == 3
+
+
+@pytest.mark.parametrize('field', [{'speed': 0}, {'speed': -1}, {'days': 0}, {'speeds': [0.3, -0.1]},
+                                   {'tolerance': 0}, {'tolerance': -0.1}])
+def test_reachability_parameters_positive(client, field):
+    body = {'lat': 0, 'lng': 0, 'speed': 0.3, 'days': 2, 'shape': 'polygons'}
+    assert client.post('/api/reachability', json=dict(body, **field)).status_code == 422
+
+
+def test_reachability_tolerance_replaces_zoom(main, client, grid):
+    main.REACH_CACHE.clear()
+    body = {'lat': 0, 'lng': 0, 'speed': 0.3, 'days': 2, 'shape': 'polygons', 'zoom': 4, 'tolerance': 0.01}
+    response = client.post('/api/reachability', json=body)
+    assert response.status_code == 200
+    assert [f['properties']['tolerance'] for f in response.json()['features']] == [0.01] * 2
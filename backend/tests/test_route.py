@@ -0,0 +1,62 @@
+import pytest
+
+import searoute as sr
+
+GIJON, HUELVA, LISBON = [-5.6615, 43.5357], [-6.9508, 37.2614], [-9.14, 38.7]
+
+
+def test_route_through_waypoints(client):
+    response = client.post('/api/route', json={'origin': GIJON, 'destination': HUELVA, 'waypoints': [LISBON], 'speed': 12})
+    assert response.status_code == 200
+    route = response.json()
+    expected = sr.waypoints([GIJON, LISBON, HUELVA], units='naut', speed_knot=12)
+    assert route['properties']['length'] == pytest.approx(expected['properties']['length'])
+    assert [leg['length'] for leg in route['properties']['legs']] == \
+        pytest.approx([leg['length'] for leg in expected['properties']['legs']])
+    assert route['properties']['duration_hours'] == pytest.approx(route['properties']['length'] / 12)
+    assert route['geometry']['coordinates'] == [list(c) for c in expected['geometry']['coordinates']]
+
+    # served from the cache
+    again = client.post('/api/route', json={'origin': GIJON, 'destination': HUELVA, 'waypoints': [LISBON], 'speed': 12})
+    assert again.json() == route
+
+
+@pytest.mark.parametrize('speed', [0, -5])
+def test_route_speed_must_be_positive(client, speed):
+    response = client.post('/api/route', json={'origin': GIJON, 'destination': HUELVA, 'speed': speed})
+    assert response.status_code == 422
+
+
+def test_route_points_validated(client):
+    response = client.post('/api/route', json={'origin': [-5.6615, 43.5357, 0], 'destination': HUELVA})
+    assert response.status_code == 422
+    assert 'two elements' in response.json()['detail']
+    assert client.post('/api/route', json={'origin': GIJON, 'destination': [0, 95]}).status_code == 422
+
+
+def test_route_snapped_in_pool(main, client, monkeypatch):
+    functions = []
+    run = main.POOL.run
+
+    async def spy(key, fn, *args):
+        functions.append(fn)
+        return await run(key, fn, *args)
+
+    monkeypatch.setattr(main.POOL, 'run', spy)
+    main.ROUTE_CACHE.clear()
+    assert client.post('/api/route', json={'origin': GIJON, 'destination': LISBON}).status_code == 200
+    assert functions == [main.route_key, main.waypoints]
+
+
+def test_route_stops_capped(main, client):
+    stops = [LISBON] * (main.ROUTE_MAX_STOPS - 1)
+    response = client.post('/api/route', json={'origin': GIJON, 'destination': HUELVA, 'waypoints': stops})
+    assert response.status_code == 422
+    assert f'at most {main.ROUTE_MAX_STOPS}' in response.json()['detail']
+
+
+def test_weather_routing_needs_wave_field(main, client):
+    assert main.WAVE_FIELD is None
+    response = client.post('/api/route', json={'origin': GIJON, 'destination': HUELVA, 'weather_routing': True})
+    assert response.status_code == 503
+    assert 'WAVE_FIELD_PATH' in response.json()['detail']
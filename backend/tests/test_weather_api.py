@@ -0,0 +1,56 @@
+import base64
+
+import numpy as np
+import pytest
+
+from searoute import polyline
+
+ROUTE = [[-5.6615, 43.5357], [-9.5, 43.0], [-9.6, 38.0], [-6.9508, 37.2614]]
+PARAMS = {'route': polyline.encode(ROUTE), 'speed': 12, 'base_fuel': 20, 'total_distance': 600}
+
+
+def test_weather_columns(client):
+    data = client.get('/api/weather', params=PARAMS).json()
+    days = data['days']
+    assert set(days) == {'day', 'lat', 'lon', 'wave', 'speed', 'dist'}
+    assert days['day'] == list(range(1, len(days['day']) + 1))
+    assert all(len(column) == len(days['day']) for column in days.values())
+    assert sum(days['dist']) == pytest.approx(600, rel=0.05)
+
+    typed = client.get('/api/weather', params=dict(PARAMS, encoding='typed')).json()['days']
+    assert typed['wave']['dtype'] == 'float32'
+    waves = np.frombuffer(base64.b64decode(typed['wave']['data']), dtype='<f4')
+    assert waves.round(2).tolist() == pytest.approx(days['wave'], abs=0.006)
+    assert np.frombuffer(base64.b64decode(typed['day']['data']), dtype='<u2').tolist() == days['day']
+
+
+def test_weather_etag_and_304(client):
+    first = client.get('/api/weather', params=PARAMS)
+    etag = first.headers['ETag']
+    assert etag.startswith('W/"')
+    assert client.get('/api/weather', params=PARAMS).headers['ETag'] == etag
+    assert client.get('/api/weather', params=dict(PARAMS, speed=14)).headers['ETag'] != etag
+
+    revalidated = client.get('/api/weather', params=PARAMS, headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['ETag'] == etag and not revalidated.content
+    # compared weakly, with or without the W/ prefix
+    assert client.get('/api/weather', params=PARAMS, headers={'If-None-Match': etag[2:]}).status_code == 304
+
+
+def test_weather_post_is_not_revalidated(client):
+    body = {'route_coords': polyline.decode(PARAMS['route']), 'speed': 12, 'base_fuel': 20, 'total_distance': 600}
+    posted = client.post('/api/weather', json=body)
+    assert posted.status_code == 200
+    etag = posted.headers['ETag']
+    # the same request as the GET
+    assert etag == client.get('/api/weather', params=PARAMS).headers['ETag']
+    assert client.post('/api/weather', json=body, headers={'If-None-Match': etag}).status_code == 412
+    assert client.post('/api/weather', json=body, headers={'If-None-Match': 'W/"other"'}).status_code == 200
+
+
+@pytest.mark.parametrize('route', ['_p~iF~ps|U_', '_p~iF~ps|U_ulL'])
+def test_weather_invalid_polyline(client, route):
+    response = client.get('/api/weather', params=dict(PARAMS, route=route))
+    assert response.status_code == 422
+    assert 'polyline' in response.json()['detail']
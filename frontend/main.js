@@ -747,35 +747,16 @@ calcBtn.addEventListener('click', async () => {
                 lat: waypoints.origin[0],
                 lng: waypoints.origin[1],
                 speed: speed,
-                days: days
+                days: days,
+                shape: 'polygons'
             };
 
-            const response = await fetch('/api/reachability', {
-                method: 'POST', headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(reqBody)
-            });
-            if (!response.ok) throw new Error('API Error');
-
-            const geojson = await response.json();
+            const lod = reachLod(map.getZoom());
+            const geojson = await fetchReachability(reqBody, lod);
             currentRouteCoords = null; // Can't check weather on isochrone
 
-            routeLayer = L.geoJSON(geojson, {
-                style: function (feature) {
-                    const day = feature.properties.day;
-                    const colors = ['#2563eb', '#3b82f6', '#60a5fa', '#93c5fd', '#bfdbfe'];
-                    const weights = [4, 3, 2, 2, 1];
-                    const opacities = [1.0, 0.8, 0.6, 0.5, 0.4];
-
-                    const idx = Math.min(day - 1, colors.length - 1);
-                    return {
-                        color: colors[idx],
-                        weight: weights[idx] || 1,
-                        opacity: opacities[idx] || 0.3
-                    };
-                }
-            }).bindTooltip(function (layer) {
-                return `Day ${layer.feature.properties.day} Reach < br > ${layer.feature.properties.distance_nm.toFixed(0)} NM`;
-            }).addTo(map);
+            routeLayer = reachLayer(geojson).addTo(map);
+            reachView = { body: reqBody, lod, layer: routeLayer };
 
             map.fitBounds(routeLayer.getBounds(), { padding: [50, 50] });
 
@@ -806,7 +787,7 @@ calcBtn.addEventListener('click', async () => {
             const response = await fetch(`/api/precalc/${filename}`);
             if (!response.ok) throw new Error('Could not find precalculated file for this configuration. Ensure the background processing has finished.');
 
-            const geojson = await response.json();
+            const geojson = expandCompact(await response.json());
             currentRouteCoords = null;
 
             routeLayer = L.geoJSON(geojson, {
@@ -842,7 +823,183 @@ calcBtn.addEventListener('click', async () => {
     }
 });
 
+// Reachability areas are simplified on the server for a level of detail of the
+// map zoom, the same levels as the server. They are reloaded when zooming to another one.
+const REACH_LOD_ZOOMS = [2, 4, 6, 8];
+let reachView = null; // { body, lod, layer } of the reachability areas on the map
+
+function reachLod(zoom) {
+    let lod = REACH_LOD_ZOOMS[0];
+    for (const z of REACH_LOD_ZOOMS) if (z <= zoom) lod = z;
+    return lod;
+}
+
+async function fetchReachability(reqBody, lod) {
+    const response = await fetch('/api/reachability', {
+        method: 'POST', headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ ...reqBody, zoom: lod })
+    });
+    if (!response.ok) throw new Error('API Error');
+    return response.json();
+}
+
+function reachLayer(geojson) {
+    return L.geoJSON(geojson, {
+        style: function (feature) {
+            const day = feature.properties.day;
+            const colors = ['#2563eb', '#3b82f6', '#60a5fa', '#93c5fd', '#bfdbfe'];
+            const weights = [4, 3, 2, 2, 1];
+            const opacities = [1.0, 0.8, 0.6, 0.5, 0.4];
+
+            const idx = Math.min(day - 1, colors.length - 1);
+            const filled = feature.geometry.type.endsWith('Polygon');
+            return {
+                color: colors[idx],
+                weight: filled ? 1 : (weights[idx] || 1),
+                opacity: opacities[idx] || 0.3,
+                fillColor: colors[idx],
+                fillOpacity: filled ? 0.15 : 0
+            };
+        }
+    }).bindTooltip(function (layer) {
+        return `Day ${layer.feature.properties.day} Reach < br > ${layer.feature.properties.distance_nm.toFixed(0)} NM`;
+    });
+}
+
+// Precalc files may be compact collections, lines stored once as encoded
+// polylines (latitude first) for all the features sharing them, see searoute/polyline.py
+function decodePolyline(text, precision) {
+    const factor = Math.pow(10, precision);
+    const coords = [];
+    const values = [0, 0];
+    let index = 0, k = 0;
+    while (index < text.length) {
+        let result = 0, shift = 0, byte;
+        do {
+            byte = text.charCodeAt(index++) - 63;
+            result |= (byte & 0x1f) << shift;
+            shift += 5;
+        } while (byte >= 0x20);
+        values[k] += (result & 1) ? ~(result >> 1) : (result >> 1);
+        if (k === 1) coords.push([values[1] / factor, values[0] / factor]);
+        k = 1 - k;
+    }
+    return coords;
+}
+
+function expandCompact(doc) {
+    if (doc.type !== 'CompactFeatureCollection') return doc;
+    const precision = doc.precision ?? 5;
+    const lines = doc.features.map(() => []);
+    for (const [members, encoded] of doc.lines || []) {
+        const decoded = encoded.map(text => decodePolyline(text, precision));
+        for (const i of members) {
+            for (const line of decoded) lines[i].push(line);
+        }
+    }
+    const positions = (c) => typeof c === 'string' ? decodePolyline(c, precision) : c.map(positions);
+    return {
+        type: 'FeatureCollection',
+        features: doc.features.map((feature, i) => {
+            const geometry = feature.geometry;
+            let coordinates = lines[i];
+            if (geometry.type === 'Point') coordinates = geometry.coordinates;
+            else if (geometry.coordinates) coordinates = positions(geometry.coordinates);
+            return { type: 'Feature', properties: feature.properties, geometry: { type: geometry.type, coordinates } };
+        })
+    };
+}
+
+map.on('zoomend', async () => {
+    const view = reachView;
+    if (!view || routeLayer !== view.layer) return;
+    const lod = reachLod(map.getZoom());
+    if (lod === view.lod) return;
+    view.lod = lod;
+    try {
+        const geojson = await fetchReachability(view.body, lod);
+        // a newer search or zoom replaced these areas meanwhile
+        if (routeLayer !== view.layer || view.lod !== lod) return;
+        map.removeLayer(routeLayer);
+        routeLayer = view.layer = reachLayer(geojson).addTo(map);
+    } catch (e) {
+        console.warn('Reachability reload failed', e);
+    }
+});
+
 // Get Weather Impact
+const weatherCache = new Map(); // request URL -> { etag, data }
+// Routes go in the URL as encoded polylines, so a check is revalidated with a
+// conditional GET, the ones too long for a URL are posted
+const WEATHER_URL_MAX = 6000;
+
+function encodePolyline(coords, precision) {
+    const factor = Math.pow(10, precision);
+    const chunks = [];
+    let prevLat = 0, prevLon = 0;
+    const push = (value) => {
+        value = value < 0 ? ~(value << 1) : value << 1;
+        while (value >= 0x20) {
+            chunks.push(String.fromCharCode((0x20 | (value & 0x1f)) + 63));
+            value >>= 5;
+        }
+        chunks.push(String.fromCharCode(value + 63));
+    };
+    for (const [lon, lat] of coords) {
+        const y = Math.round(lat * factor), x = Math.round(lon * factor);
+        push(y - prevLat);
+        push(x - prevLon);
+        prevLat = y; prevLon = x;
+    }
+    return chunks.join('');
+}
+
+function weatherColumn(column) {
+    // Typed columns are base64 little-endian arrays
+    if (Array.isArray(column)) return column;
+    const bytes = Uint8Array.from(atob(column.data), c => c.charCodeAt(0));
+    const view = new DataView(bytes.buffer);
+    const size = column.dtype === 'uint16' ? 2 : 4;
+    const values = [];
+    for (let i = 0; i < bytes.length; i += size) {
+        values.push(size === 2 ? view.getUint16(i, true) : view.getFloat32(i, true));
+    }
+    return values;
+}
+
+function renderWeatherDays(container, data) {
+    container.textContent = '';
+    if (data.message) {
+        container.textContent = data.message;
+        return;
+    }
+    const days = weatherColumn(data.days.day);
+    const waves = weatherColumn(data.days.wave);
+    const speeds = weatherColumn(data.days.speed);
+
+    const wrapper = document.createElement('div');
+    wrapper.className = 'weather-days';
+    const table = document.createElement('table');
+    const head = table.createTHead().insertRow();
+    for (const title of ['Day', 'Wave', 'Speed']) {
+        const th = document.createElement('th');
+        th.textContent = title;
+        head.appendChild(th);
+    }
+    const tbody = table.createTBody();
+    days.forEach((day, i) => {
+        const row = tbody.insertRow();
+        row.insertCell().textContent = day;
+        const wave = row.insertCell();
+        wave.textContent = `${waves[i].toFixed(1)}m`;
+        if (waves[i] > 3.0) wave.className = 'wave-high';
+        else if (waves[i] > 2.0) wave.className = 'wave-moderate';
+        row.insertCell().textContent = `${speeds[i].toFixed(1)}kn`;
+    });
+    wrapper.appendChild(table);
+    container.appendChild(wrapper);
+}
+
 weatherBtn.addEventListener('click', async () => {
     if (!currentRouteCoords) return;
     weatherBtn.textContent = 'Checking...'; weatherBtn.disabled = true;
@@ -857,15 +1014,40 @@ weatherBtn.addEventListener('click', async () => {
             base_fuel: fuelMt,
             total_distance: currentDistanceNm
         };
-        const response = await fetch('/api/weather', {
-            method: 'POST', headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(reqBody)
+        const params = new URLSearchParams({
+            route: encodePolyline(currentRouteCoords, 5),
+            speed: speedKts,
+            base_fuel: fuelMt,
+            total_distance: currentDistanceNm
         });
-        if (!response.ok) throw new Error('API Error');
+        const url = `/api/weather?${params}`;
+        let response, cached;
+        if (url.length <= WEATHER_URL_MAX) {
+            // The same check again is revalidated, the server answers 304 if it did not change
+            cached = weatherCache.get(url);
+            response = await fetch(url, { headers: cached ? { 'If-None-Match': cached.etag } : {} });
+        } else {
+            response = await fetch('/api/weather', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(reqBody)
+            });
+        }
 
-        const data = await response.json();
+        let data;
+        if (response.status === 304 && cached) {
+            data = cached.data;
+        } else {
+            if (!response.ok) throw new Error('API Error');
+            data = await response.json();
+            const etag = response.headers.get('ETag');
+            if (etag && url.length <= WEATHER_URL_MAX) {
+                if (weatherCache.size >= 20) weatherCache.delete(weatherCache.keys().next().value);
+                weatherCache.set(url, { etag, data });
+            }
+        }
 
-        document.getElementById('weather-status').innerHTML = data.weather_html;
+        renderWeatherDays(document.getElementById('weather-status'), data);
         document.getElementById('weather-wave').textContent = `${data.avg_wave_meters} m`;
 
         let pct = 0;
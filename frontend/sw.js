@@ -1,5 +1,5 @@
 // Cache name
-const CACHE_NAME = 'sea-distances-v1';
+const CACHE_NAME = 'sea-distances-v5';
 
 // Files to cache for offline viewing (we cache the shell, not the heavy data yet)
 const URLS_TO_CACHE = [